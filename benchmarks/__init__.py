@@ -0,0 +1 @@
+""" Speed benchmarks of the game engine and of the HTTP API, run with `make bench` """
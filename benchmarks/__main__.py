@@ -0,0 +1,87 @@
+from typing import Dict, List
+import argparse
+import datetime
+import json
+import platform
+import subprocess
+import sys
+
+import numpy as np
+
+from benchmarks import api, engine
+
+
+def _commit() -> str:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except Exception:
+        return "unknown"
+
+
+def _key(result: Dict) -> str:
+    # The benchmark and its parameters, the timings are left out
+    return json.dumps({k: v for k, v in result.items() if k in ("name", "dim", "robots", "dinosaurs", "concurrency")},
+                      sort_keys=True)
+
+
+def compare(results: Dict, baseline: Dict) -> List[Dict]:
+    """
+    :param results: the new results
+    :param baseline: the results to compare with, e.g. from the previous commit
+    :return: the ratio new / baseline of the median time or p50 latency of the benchmarks in both
+    """
+    ratios = []
+    for layer, metric in (("engine", "median_us"), ("api", "p50_ms")):
+        before = {_key(result): result for result in baseline.get(layer, [])}
+        for result in results.get(layer, []):
+            previous = before.get(_key(result))
+            if previous and previous[metric]:
+                ratios.append({"benchmark": _key(result), "ratio": result[metric] / previous[metric]})
+    return ratios
+
+
+def main(argv: List[str] = None) -> int:
+    parser = argparse.ArgumentParser(prog="python -m benchmarks", description="Benchmark the engine and the API")
+    parser.add_argument("--output", default="bench_results.json", help="the results file")
+    parser.add_argument("--baseline", help="the results of another run to compare with")
+    parser.add_argument("--threshold", type=float, default=1.25, help="fail when a ratio to the baseline exceeds it")
+    parser.add_argument("--quick", action="store_true", help="the small games and fewer requests")
+    parser.add_argument("--layer", choices=("engine", "api", "all"), default="all")
+    args = parser.parse_args(sys.argv[1:] if argv is None else argv)
+
+    results = {
+        "commit": _commit(),
+        "created": datetime.datetime.now(datetime.timezone.utc).isoformat(),
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "quick": args.quick,
+    }
+    if args.layer in ("engine", "all"):
+        results["engine"] = engine.run(quick=args.quick)
+        for result in results["engine"]:
+            print(f"{result['name']:<30} {result['dim']:>5} {result['robots']:>6} {result['dinosaurs']:>6} "
+                  f"{result['median_us']:>12.1f} us")
+    if args.layer in ("api", "all"):
+        results["api"] = api.run(quick=args.quick)
+        for result in results["api"]:
+            print(f"{result['name']:<30} x{result['concurrency']:<3} {result['throughput_rps']:>8.0f} req/s "
+                  f"p50 {result['p50_ms']:.2f} ms p99 {result['p99_ms']:.2f} ms")
+
+    with open(args.output, "w") as f:
+        json.dump(results, f, indent=2)
+    print(f"Saved {args.output}")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            ratios = compare(results, json.load(f))
+        slower = [ratio for ratio in ratios if ratio["ratio"] > args.threshold]
+        for ratio in slower:
+            print(f"Slower x{ratio['ratio']:.2f}: {ratio['benchmark']}")
+        return 1 if slower else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
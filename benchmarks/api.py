@@ -0,0 +1,66 @@
+from typing import Dict, List
+import asyncio
+import time
+
+import httpx
+
+from benchmarks.timing import latency_report
+
+
+async def _drive(client: httpx.AsyncClient, method: str, url: str, payload, requests: int,
+                 concurrency: int) -> Dict:
+    # Send the requests from concurrent clients, each one waits for its response before the next request
+    latencies = []
+
+    async def worker(count: int):
+        for _ in range(count):
+            started = time.perf_counter()
+            response = await client.request(method, url, json=payload)
+            latencies.append(time.perf_counter() - started)
+            if response.status_code >= 400:
+                raise Exception(f"{method} {url} failed with {response.status_code}: {response.text}")
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker(requests // concurrency) for _ in range(concurrency)))
+    return latency_report(latencies, time.perf_counter() - started)
+
+
+async def _run(requests: int, concurrency: int) -> List[Dict]:
+    # The app is served in-process, the figures leave out the network and the server loop
+    from main import app
+
+    results = []
+    transport = httpx.ASGITransport(app=app)
+    # The transport does not run the lifespan, the app is set up as in production: logging, journals, checkpoints
+    async with app.router.lifespan_context(app), \
+            httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        start = {"grid_dim": 50, "robots_count": 10, "dinosaurs_count": 50, "seed": 0}
+        report = await _drive(client, "POST", "/games/start", start, requests, concurrency)
+        results.append({"name": "start game 50x50", "concurrency": concurrency, **report})
+        # The started games fill the store, they would evict the game played below
+        await client.delete("/games")
+
+        res = await client.post("/games/start", json=start)
+        game_id = res.json()["game_id"]
+        batch = {"steps": [{"robot_id": 0, "command": 2}] * 100, "on_error": "skip"}
+        for name, method, url, payload in (
+            ("turn robot", "PUT", f"/games/{game_id}", {"robot_id": 0, "command": 2}),
+            ("batch of 100 turns", "PUT", f"/games/{game_id}/batch", batch),
+            ("display game 50x50", "GET", f"/games/{game_id}", None),
+        ):
+            report = await _drive(client, method, url, payload, requests, concurrency)
+            results.append({"name": name, "concurrency": concurrency, **report})
+        await client.delete("/games")
+    return results
+
+
+def run(quick: bool = False) -> List[Dict]:
+    """
+    :param quick: send fewer requests
+    :return: the throughput and latencies of every route
+    """
+    requests = 200 if quick else 2000
+    results = []
+    for concurrency in (1, 16):
+        results.extend(asyncio.run(_run(requests, concurrency)))
+    return results
@@ -0,0 +1,89 @@
+from typing import Dict, List
+import asyncio
+
+from models.game import Game
+from services.play import create_game, create_random_game, move_robot
+from services.render import create_html
+from services.utils import COMMANDS, STEPS
+from benchmarks.timing import measure
+
+# (grid dimension, robots, dinosaurs) of the benchmarked games
+SIZES = [(50, 1, 1), (50, 100, 500), (500, 1000, 5000), (2000, 10000, 50000)]
+QUICK_SIZES = [(50, 1, 1), (500, 1000, 5000)]
+
+# The largest board rendered to html
+RENDER_MAX_DIM = 500
+
+
+def _movable_robot(game: Game) -> str:
+    # A robot which can step forward and back, the moves are benchmarked without failures
+    for robot_id, robot in game.robots.items():
+        row_step, column_step = STEPS[robot.direction]
+        ahead = (robot.row + row_step, robot.column + column_step)
+        if game.is_in_grid(ahead) and game.validate_move(ahead):
+            return robot_id
+    raise Exception("No robot can move forward")
+
+
+def bench_game(dim: int, robots: int, dinosaurs: int, number: int) -> List[Dict]:
+    """
+    :param dim: grid dimension
+    :param robots: the number of robots
+    :param dinosaurs: the number of dinosaurs
+    :param number: the number of calls of the fast operations in a repeat
+    :return: the timings of the operations on a game of this size
+    """
+    params = {"dim": dim, "robots": robots, "dinosaurs": dinosaurs}
+    results = []
+
+    def record(name: str, timing: Dict):
+        results.append({"name": name, **params, **timing})
+
+    record("create_random_game", measure(
+        lambda: create_random_game(dim, robots_count=robots, dinosaurs_count=dinosaurs), number=1, repeat=3
+    ))
+    game = create_random_game(dim, seed=0, robots_count=robots, dinosaurs_count=dinosaurs)
+    placement = {
+        "robots": [robot.to_dict() for robot in game.robots.values()],
+        "dinosaurs": game.dinosaurs_position,
+    }
+    record("create_game", measure(lambda: create_game(dim, **placement), number=1, repeat=3))
+
+    robot_id = _movable_robot(game)
+    loop = asyncio.new_event_loop()
+    try:
+        # Forward then backward keeps the robot in place, every call is a successful move
+        for name, commands in (
+            ("move_robot forward+backward", (COMMANDS[0], COMMANDS[1])),
+            ("move_robot turn right+left", (COMMANDS[2], COMMANDS[3])),
+            ("attack", (COMMANDS[4],)),
+        ):
+            async def play():
+                for command in commands:
+                    await move_robot(game, robot_id, command)
+
+            timing = measure(lambda: loop.run_until_complete(play()), number=number)
+            timing["median_us"] /= len(commands)
+            timing["min_us"] /= len(commands)
+            record(name, timing)
+    finally:
+        loop.close()
+
+    if dim <= RENDER_MAX_DIM:
+        board = game.get_board()
+        record("create_html", measure(
+            lambda: create_html(str(game.game_id), board, dim, rows=(0, dim), columns=(0, dim)),
+            number=1, repeat=3,
+        ))
+    return results
+
+
+def run(quick: bool = False) -> List[Dict]:
+    """
+    :param quick: benchmark the small games only, with fewer calls
+    :return: the timings of every operation and game size
+    """
+    results = []
+    for dim, robots, dinosaurs in QUICK_SIZES if quick else SIZES:
+        results.extend(bench_game(dim, robots, dinosaurs, number=200 if quick else 1000))
+    return results
@@ -0,0 +1,39 @@
+from typing import Callable, Dict, List
+import time
+import numpy as np
+
+
+def measure(run: Callable[[], None], number: int, repeat: int = 5) -> Dict:
+    """
+    Time a function, the median of the repeats is the figure to compare
+    :param run: the function to time
+    :param number: the number of calls in a repeat
+    :param repeat: the number of repeats
+    :return: the median and the best time of a call, in microseconds
+    """
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        for _ in range(number):
+            run()
+        timings.append((time.perf_counter() - started) / number)
+    return {
+        "median_us": float(np.median(timings)) * 1e6,
+        "min_us": float(np.min(timings)) * 1e6,
+        "calls": number * repeat,
+    }
+
+
+def latency_report(latencies: List[float], seconds: float) -> Dict:
+    """
+    :param latencies: the latency of every request, in seconds
+    :param seconds: the wall time of all the requests
+    :return: the throughput and the p50 and p99 latencies in milliseconds
+    """
+    latencies = np.asarray(latencies) * 1e3
+    return {
+        "requests": len(latencies),
+        "throughput_rps": len(latencies) / seconds if seconds else 0.0,
+        "p50_ms": float(np.percentile(latencies, 50)),
+        "p99_ms": float(np.percentile(latencies, 99)),
+    }
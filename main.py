@@ -1,31 +1,123 @@
-from fastapi import FastAPI
-from fastapi.responses import JSONResponse, HTMLResponse, RedirectResponse
+from fastapi import FastAPI, Header, WebSocket, WebSocketDisconnect
+from fastapi.responses import JSONResponse, HTMLResponse, RedirectResponse, StreamingResponse, Response
+from starlette.concurrency import run_in_threadpool
+from typing import Optional
+from contextlib import asynccontextmanager
+import asyncio
 import logging
+import os
 
-from services.utils import COMMANDS, create_html
-from models.items import GamePayload, RobotPayload, StartResponse, ErrorMessage, PlayResponse, DeletionMessage
+from services.utils import COMMANDS
+from services.render import create_html, render_board_html, clamp_viewport
+from models.items import GamePayload, RobotPayload, BatchPayload, AutopilotPayload, TickPayload, StartResponse, \
+    ErrorMessage, PlayResponse, BatchResponse, AutopilotResponse, TickResponse, MemoryReport, SnapshotMessage, \
+    DeletionMessage, StoreStats
 from models.setting import get_app_settings
-from services.play import create_random_game, create_game, move_robot
+from services.play import create_random_game, create_game, move_robot, resolve_robot_id, run_commands, run_tick, \
+    game_changes, BATCH_ERROR_POLICIES, MOVE_HOOKS
 from models.game import Game
+from models.store import GameConflict, GameStore, create_game_store
+from services.logs import setup_logging, stop_logging, summarize
+from services.metrics import REGISTRY, ERRORS, CONTENT_TYPE, Gauge, MetricsMiddleware
+from services.profiling import ProfilingMiddleware, profiled
+from services.snapshot import save_snapshot, load_snapshot, load_snapshots, snapshot_path, checkpoint, \
+    run_checkpoints
+from services.autopilot import run_autopilot
+from services.channels import GameChannels, decode_command
+from services.journal import Journals
+from services.serialize import export_frames
 
-# Setting logging
-logging.basicConfig(filename='record.log',
-                    format='%(asctime)s %(levelname)-8s %(message)s',
-                    level=logging.INFO,
-                    datefmt='%Y-%m-%d %H:%M:%S')
+app_settings = get_app_settings()
 logger = logging.getLogger(__name__)
 
 # Caching the games by id
-GAMES = {}
+GAMES = create_game_store(app_settings)
+
+
+async def _get_game(game_id: str) -> Optional[Game]:
+    # The shared store reads and decodes the game over the network, outside of the event loop
+    if isinstance(GAMES, GameStore):
+        return GAMES.get(game_id)
+    return await run_in_threadpool(GAMES.get, game_id)
+
+
+async def _save_game(game_id: str, game: Game):
+    if isinstance(GAMES, GameStore):
+        GAMES.save(game_id, game)
+    else:
+        await run_in_threadpool(GAMES.save, game_id, game)
+
+
+# The size of the store is read when the metrics are collected
+REGISTRY.register(Gauge("rvd_games", "Games in the store of this worker", lambda: len(GAMES)))
+REGISTRY.register(Gauge("rvd_games_bytes", "Bytes held by the games in the store", lambda: GAMES.stats()["total_bytes"]))
+
+# The websocket subscribers of the moves of every game
+CHANNELS = GameChannels(app_settings.ws_queue_size)
+
+# Journaling the moves, replayed on top of the snapshots to recover the games
+JOURNALS = None
+if app_settings.journal_dir:
+    JOURNALS = Journals(app_settings.journal_dir, app_settings.journal_group_size, app_settings.journal_fsync)
+    MOVE_HOOKS.append(JOURNALS.append)
+    if isinstance(GAMES, GameStore):
+        # An evicted game is gone, so is its journal
+        GAMES.on_evict = JOURNALS.reset
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Setting logging once the server starts rather than at import time
+    setup_logging(app_settings)
+    if app_settings.restore_on_startup:
+        games = await run_in_threadpool(load_snapshots, app_settings.snapshot_dir)
+        for game in games:
+            if JOURNALS is not None:
+                JOURNALS.recover(game)
+            GAMES[str(game.game_id)] = game
+        logger.info("Restored %s games from %s", len(games), app_settings.snapshot_dir)
+
+    checkpoints = None
+    if app_settings.checkpoint_interval > 0:
+        checkpoints = asyncio.ensure_future(
+            run_checkpoints(GAMES, app_settings.snapshot_dir, app_settings.checkpoint_interval, JOURNALS)
+        )
+    if JOURNALS is not None:
+        JOURNALS.start(app_settings.journal_flush_interval)
+    yield
+    if checkpoints is not None:
+        checkpoints.cancel()
+        await checkpoint(GAMES, app_settings.snapshot_dir, JOURNALS)
+    if JOURNALS is not None:
+        JOURNALS.stop()
+    stop_logging()
 
-app_settings = get_app_settings()
 
 app = FastAPI(
     title=app_settings.title,
     description=app_settings.description,
     version=app_settings.version,
     debug=app_settings.debug,
+    lifespan=lifespan,
 )
+app.add_middleware(ProfilingMiddleware, settings=app_settings)
+app.add_middleware(MetricsMiddleware)
+
+
+def _positions(game: Game, since: Optional[int], robots: bool = True) -> dict:
+    # The positions in full, or only what changed after the move number the client knows of
+    res = {"dinosaurs": len(game.dinosaurs_position), "version": game.version}
+    changes = None if since is None else game_changes(game, since, app_settings.delta_max_moves)
+    if changes is not None:
+        res.update(since=since, changes=changes)
+        return res
+    res["dinosaurs_position"] = game.dinosaurs_position
+    if robots:
+        res["robots_position"] = [robot.to_dict() for robot in game.robots.values()]
+    if since is not None:
+        # The client is too far behind, it replaces its copy of the game
+        res["resync"] = True
+    return res
 
 
 @app.get("/")
@@ -37,6 +129,7 @@ def read_root() -> RedirectResponse:
     
     
 @app.post("/games/start", responses={200: {"model": StartResponse}, 400: {"model": ErrorMessage}})
+@profiled("start_game", app_settings)
 def start_game(item: GamePayload) -> JSONResponse:
     """
     Start a game
@@ -47,7 +140,7 @@ def start_game(item: GamePayload) -> JSONResponse:
         dim, robots, robots_count, dinosaurs, dinosaurs_count = \
             item.grid_dim, item.robots, item.robots_count, item.dinosaurs, item.dinosaurs_count
         if dim <= 2:
-            logger.debug(f"The dimension is not big enough: {dim}")
+            logger.debug("The dimension is not big enough: %s", dim)
             return JSONResponse(
                 status_code=400,
                 content={"status": False, "detail": "You must create a bigger grid"}
@@ -56,10 +149,17 @@ def start_game(item: GamePayload) -> JSONResponse:
         if robots and dinosaurs:
             match: Game = create_game(dim, robots=robots, dinosaurs=dinosaurs)
         else:
-            match: Game = create_random_game(dim, robots_count=robots_count, dinosaurs_count=dinosaurs_count)
+            match: Game = create_random_game(
+                dim, seed=item.seed, robots_count=robots_count, dinosaurs_count=dinosaurs_count
+            )
+        if item.history is not None:
+            match.keep_history = item.history
 
         GAMES[str(match.game_id)] = match
-        logger.info(f">>>>>     Game {match.game_id} started     <<<<<<")
+        if JOURNALS is not None:
+            # A new game may reuse the id of an older one
+            JOURNALS.reset(str(match.game_id))
+        logger.info(">>>>>     Game %s started     <<<<<<", match.game_id)
 
         res = {
             "game_id": str(match.game_id),
@@ -67,14 +167,16 @@ def start_game(item: GamePayload) -> JSONResponse:
             "dinosaurs": len(match.dinosaurs_position),
             "dinosaurs_position": match.dinosaurs_position,
             "robots": len(match.robots_position),
-            "robots_position": list(match.robots.values()),
+            "robots_position": [robot.to_dict() for robot in match.robots.values()],
+            "version": match.version,
         }
 
-        logger.info(f"{res}")
+        logger.info("Game started: %s", summarize(res, app_settings.log_summary_limit))
         return JSONResponse(status_code=200, content=res)
 
     except Exception as e:
-        logger.error(f"Exception: {e}")
+        logger.error("Exception: %s", e)
+        ERRORS.inc(type(e).__name__)
         return JSONResponse(
             status_code=400,
             content={"status": False, "detail": str(e)}
@@ -82,25 +184,266 @@ def start_game(item: GamePayload) -> JSONResponse:
 
 
 @app.get("/games/{game_id}", responses={400: {"model": ErrorMessage}, 404: {"model": ErrorMessage}})
-def display_game(game_id: str) -> HTMLResponse:
+@profiled("display_game", app_settings)
+async def display_game(game_id: str, row_start: Optional[int] = None, row_end: Optional[int] = None,
+                       col_start: Optional[int] = None, col_end: Optional[int] = None) -> HTMLResponse:
     """
-    Display the game board in html
+    Display the game board in html, large boards are streamed row by row
     :param game_id: a specified game id
+    :param row_start: the first row of the viewport, the default is 0
+    :param row_end: the row after the last one of the viewport, the default is the grid edge
+    :param col_start: the first column of the viewport, the default is 0
+    :param col_end: the column after the last one of the viewport, the default is the grid edge
     :return: html page
     """
     try:
-        if game_id not in GAMES:
-            logger.error(f"Game ID '{game_id}' does not exist")
+        game = await _get_game(game_id)
+        if game is None:
+            logger.error("Game ID '%s' does not exist", game_id)
             return JSONResponse(
                 status_code=404,
                 content={"status": False, "detail": f"Game ID '{game_id}' does not exist"}
             )
-        game = GAMES[game_id]
-        html = create_html(game_id, game.get_board(), game.dim)
-        return HTMLResponse(content=html, status_code=200)
+        rows = clamp_viewport(game.dim, row_start, row_end)
+        columns = clamp_viewport(game.dim, col_start, col_end)
+        cells = (rows[1] - rows[0]) * (columns[1] - columns[0])
+        if cells > app_settings.render_max_cells:
+            logger.error("The viewport of %s cells is too large", cells)
+            return JSONResponse(
+                status_code=400,
+                content={"status": False, "detail": "The board is too large, select a smaller viewport"}
+            )
+
+        # Copy the window while no move is applied, the copy is rendered outside of the event loop
+        async with game.lock:
+            window = game.get_board()[rows[0]:rows[1], columns[0]:columns[1]].copy()
+        return await _render_window(game_id, window, game.dim, rows, columns)
 
     except Exception as e:
-        logger.error(f"Exception: {e}")
+        logger.error("Exception: %s", e)
+        ERRORS.inc(type(e).__name__)
+        return JSONResponse(
+            status_code=400,
+            content={"status": False, "detail": str(e)}
+        )
+
+
+async def _render_window(game_id: str, window, dim: int, rows: (int, int), columns: (int, int)):
+    # Large windows are streamed row by row, the others are rendered outside of the event loop
+    origin = (rows[0], columns[0])
+    cells = (rows[1] - rows[0]) * (columns[1] - columns[0])
+    if cells > app_settings.render_stream_cells:
+        chunks = render_board_html(game_id, window, dim, rows=rows, columns=columns, origin=origin)
+        return StreamingResponse(chunks, status_code=200, media_type="text/html")
+
+    html = await run_in_threadpool(create_html, game_id, window, dim, rows=rows, columns=columns, origin=origin)
+    return HTMLResponse(content=html, status_code=200)
+
+
+def _no_history(game_id: str) -> JSONResponse:
+    logger.error("Game ID '%s' keeps no history", game_id)
+    return JSONResponse(
+        status_code=400,
+        content={"status": False, "detail": "The game keeps no history, start it with history enabled"}
+    )
+
+
+@app.get("/games/{game_id}/history", responses={400: {"model": ErrorMessage}, 404: {"model": ErrorMessage}})
+async def display_history(game_id: str, at: Optional[int] = None, row_start: Optional[int] = None,
+                          row_end: Optional[int] = None, col_start: Optional[int] = None,
+                          col_end: Optional[int] = None) -> HTMLResponse:
+    """
+    Display the game board in html as it was after a move
+    :param game_id: a specified game id
+    :param at: the number of moves, the default is the current one
+    :param row_start: the first row of the viewport, the default is 0
+    :param row_end: the row after the last one of the viewport, the default is the grid edge
+    :param col_start: the first column of the viewport, the default is 0
+    :param col_end: the column after the last one of the viewport, the default is the grid edge
+    :return: html page
+    """
+    try:
+        game = await _get_game(game_id)
+        if game is None:
+            logger.error("Game ID '%s' does not exist", game_id)
+            return JSONResponse(
+                status_code=404,
+                content={"status": False, "detail": f"Game ID '{game_id}' does not exist"}
+            )
+        if game.history is None:
+            return _no_history(game_id)
+        rows = clamp_viewport(game.dim, row_start, row_end)
+        columns = clamp_viewport(game.dim, col_start, col_end)
+        cells = (rows[1] - rows[0]) * (columns[1] - columns[0])
+        if cells > app_settings.render_max_cells:
+            logger.error("The viewport of %s cells is too large", cells)
+            return JSONResponse(
+                status_code=400,
+                content={"status": False, "detail": "The board is too large, select a smaller viewport"}
+            )
+
+        async with game.lock:
+            move = game.get_number_of_moves() if at is None else at
+            window = game.history.board_at(
+                move, rows, columns, game.get_board().dtype, game._dinosaur_life, game._robot_power
+            )
+        return await _render_window(game_id, window, game.dim, rows, columns)
+
+    except Exception as e:
+        logger.error("Exception: %s", e)
+        ERRORS.inc(type(e).__name__)
+        return JSONResponse(
+            status_code=400,
+            content={"status": False, "detail": str(e)}
+        )
+
+
+@app.get("/games/{game_id}/history/export", responses={400: {"model": ErrorMessage}, 404: {"model": ErrorMessage}})
+async def export_history(game_id: str) -> StreamingResponse:
+    """
+    Export every board of the game history as a numpy array of shape (moves, dim, dim)
+    :param game_id: a specified game id
+    :return: a .npy file, the first board is the one at the start of the history
+    """
+    try:
+        game = await _get_game(game_id)
+        if game is None:
+            logger.error("Game ID '%s' does not exist", game_id)
+            return JSONResponse(
+                status_code=404,
+                content={"status": False, "detail": f"Game ID '{game_id}' does not exist"}
+            )
+        if game.history is None:
+            return _no_history(game_id)
+        async with game.lock:
+            history = game.history
+            dtype = game.get_board().dtype
+            count = len(history) + 1
+            cells = count * game.dim * game.dim
+            if cells > app_settings.history_export_max_cells:
+                logger.error("The export of %s cells is too large", cells)
+                return JSONResponse(
+                    status_code=400,
+                    content={"status": False, "detail": "The history is too large to export"}
+                )
+            frames = history.frames(game.dim, dtype, game._dinosaur_life, game._robot_power)
+            start = history.start
+
+        headers = {
+            "Content-Disposition": f'attachment; filename="game-{game_id}-history.npy"',
+            "X-History-Start": str(start),
+        }
+        return StreamingResponse(
+            export_frames(frames, (count, game.dim, game.dim), dtype),
+            status_code=200, media_type="application/octet-stream", headers=headers,
+        )
+
+    except Exception as e:
+        logger.error("Exception: %s", e)
+        ERRORS.inc(type(e).__name__)
+        return JSONResponse(
+            status_code=400,
+            content={"status": False, "detail": str(e)}
+        )
+
+
+@app.get("/games/{game_id}/memory",
+         responses={200: {"model": MemoryReport}, 400: {"model": ErrorMessage}, 404: {"model": ErrorMessage}})
+def game_memory(game_id: str) -> JSONResponse:
+    """
+    Report the memory held by a game
+    :param game_id: a specified game id
+    :return: the size in bytes of the board and the indexes of the game
+    """
+    try:
+        game = GAMES.get(game_id)
+        if game is None:
+            logger.error("Game ID '%s' does not exist", game_id)
+            return JSONResponse(
+                status_code=404,
+                content={"status": False, "detail": f"Game ID '{game_id}' does not exist"}
+            )
+        res = {"game_id": game_id, **game.memory_report()}
+        return JSONResponse(status_code=200, content=res)
+
+    except Exception as e:
+        logger.error("Exception: %s", e)
+        ERRORS.inc(type(e).__name__)
+        return JSONResponse(
+            status_code=400,
+            content={"status": False, "detail": str(e)}
+        )
+
+
+@app.post("/games/{game_id}/snapshot",
+          responses={200: {"model": SnapshotMessage}, 400: {"model": ErrorMessage}, 404: {"model": ErrorMessage}})
+async def snapshot_game(game_id: str) -> JSONResponse:
+    """
+    Save a binary snapshot of a game to disk
+    :param game_id: a specified game id
+    :return: the path and size of the snapshot
+    """
+    try:
+        game = await _get_game(game_id)
+        if game is None:
+            logger.error("Game ID '%s' does not exist", game_id)
+            return JSONResponse(
+                status_code=404,
+                content={"status": False, "detail": f"Game ID '{game_id}' does not exist"}
+            )
+        async with game.lock:
+            path = await run_in_threadpool(save_snapshot, game, app_settings.snapshot_dir)
+            if JOURNALS is not None:
+                JOURNALS.reset(game_id)
+        res = {"game_id": game_id, "path": path, "bytes": os.path.getsize(path)}
+        logger.info("Game snapshot: %s", res)
+        return JSONResponse(status_code=200, content=res)
+
+    except Exception as e:
+        logger.error("Exception: %s", e)
+        ERRORS.inc(type(e).__name__)
+        return JSONResponse(
+            status_code=400,
+            content={"status": False, "detail": str(e)}
+        )
+
+
+@app.post("/games/{game_id}/restore",
+          responses={200: {"model": StartResponse}, 400: {"model": ErrorMessage}, 404: {"model": ErrorMessage}})
+def restore_game(game_id: str) -> JSONResponse:
+    """
+    Load a game from its snapshot on disk and replay its journal, the game in the cache is replaced
+    :param game_id: a specified game id
+    :return: the game information
+    """
+    try:
+        path = snapshot_path(app_settings.snapshot_dir, game_id)
+        if not os.path.exists(path):
+            logger.error("Snapshot of game ID '%s' does not exist", game_id)
+            return JSONResponse(
+                status_code=404,
+                content={"status": False, "detail": f"Snapshot of game ID '{game_id}' does not exist"}
+            )
+        game = load_snapshot(path)
+        if JOURNALS is not None:
+            replayed = JOURNALS.recover(game)
+            logger.info("Replayed %s moves of game %s", replayed, game_id)
+        GAMES.pop(game_id, None)
+        GAMES[game_id] = game
+        res = {
+            "game_id": game_id,
+            "grid": f"{game.dim}*{game.dim}",
+            "dinosaurs": len(game.dinosaurs_position),
+            "dinosaurs_position": game.dinosaurs_position,
+            "robots": len(game.robots),
+            "robots_position": [robot.to_dict() for robot in game.robots.values()],
+        }
+        logger.info("Game restored: %s", summarize(res, app_settings.log_summary_limit))
+        return JSONResponse(status_code=200, content=res)
+
+    except Exception as e:
+        logger.error("Exception: %s", e)
+        ERRORS.inc(type(e).__name__)
         return JSONResponse(
             status_code=400,
             content={"status": False, "detail": str(e)}
@@ -108,31 +451,33 @@ def display_game(game_id: str) -> HTMLResponse:
 
 
 @app.put("/games/{game_id}",
-         responses={200: {"model": PlayResponse}, 400: {"model": ErrorMessage}, 404: {"model": ErrorMessage}})
-async def play_robots(game_id: str, item: RobotPayload) -> JSONResponse:
+         responses={200: {"model": PlayResponse}, 400: {"model": ErrorMessage}, 404: {"model": ErrorMessage},
+                    409: {"model": ErrorMessage}})
+@profiled("play_robots", app_settings)
+async def play_robots(game_id: str, item: RobotPayload, since: Optional[int] = None,
+                      x_since_move: Optional[int] = Header(None)) -> JSONResponse:
     """
     Operate specified robot to move forward and backward, turn right and left, and attack
     :param game_id: a specified game id
     :param item: parameters to operate the robot
+    :param since: the number of moves the client knows of, only the changes after it are returned
+    :param x_since_move: the same as `since`, as a header
     :return: the state of current game
     """
     try:
-        if game_id not in GAMES:
-            logger.error(f"Game ID '{game_id}' does not exist")
+        game: Game = await _get_game(game_id)
+        if game is None:
+            logger.error("Game ID '%s' does not exist", game_id)
             return JSONResponse(
                 status_code=404,
                 content={"status": False, "detail": f"Game ID '{game_id}' does not exist"}
             )
-
-        game: Game = GAMES[game_id]
-        robots_list = list(game.robots.keys())
-        chose_robot = str(item.robot_id)
-        if chose_robot not in robots_list:
-            chose_robot = list(game.robots.keys())[0]
-            logger.info(f"Moved robot id: {chose_robot}")
+        chose_robot = resolve_robot_id(game, item.robot_id)
+        if chose_robot != str(item.robot_id):
+            logger.info("Moved robot id: %s", chose_robot)
         
         if item.command not in range(5):
-            logger.error(f"Invalid command: {item.command}")
+            logger.error("Invalid command: %s", item.command)
             return JSONResponse(
                 status_code=400,
                 content={
@@ -144,29 +489,283 @@ async def play_robots(game_id: str, item: RobotPayload) -> JSONResponse:
 
         command = COMMANDS[item.command]
         game = await move_robot(game, chose_robot, command)
+        # Record the move, a shared store publishes the game to the other workers
+        await _save_game(game_id, game)
         res = {
             "game_id": game_id,
             "robot_id": chose_robot,
             "command": command,
-            "new_position": game.robots[chose_robot],
-            "dinosaurs": len(game.dinosaurs_position),
-            "dinosaurs_position": game.dinosaurs_position,
+            "new_position": game.robots[chose_robot].to_dict(),
+            **_positions(game, since if since is not None else x_since_move, robots=False),
             "number_of_moves": game.get_number_of_moves(),
             "all_dinosaurs_has_been_terminated": not bool(game.dinosaurs_position),
         }
-        logger.info(f"{res}")
+        logger.info("Robot moved: %s", summarize(res, app_settings.log_summary_limit))
         if res["all_dinosaurs_has_been_terminated"]:
-            logger.info(f">>>>>     Game {game_id} completed     <<<<<<")
+            logger.info(">>>>>     Game %s completed     <<<<<<", game_id)
         return JSONResponse(status_code=200, content=res)
 
+    except GameConflict as e:
+        ERRORS.inc(type(e).__name__)
+        return JSONResponse(
+            status_code=409,
+            content={"status": False, "detail": str(e)}
+        )
+
     except Exception as e:
-        logger.error(f"Exception: {e}")
+        logger.error("Exception: %s", e)
+        ERRORS.inc(type(e).__name__)
         return JSONResponse(
             status_code=400,
             content={"status": False, "detail": str(e)}
         )
 
 
+@app.put("/games/{game_id}/batch",
+         responses={200: {"model": BatchResponse}, 400: {"model": ErrorMessage}, 404: {"model": ErrorMessage},
+                    409: {"model": ErrorMessage}})
+async def play_robots_batch(game_id: str, item: BatchPayload, since: Optional[int] = None,
+                            x_since_move: Optional[int] = Header(None)) -> JSONResponse:
+    """
+    Operate robots following an ordered script of commands in one request
+    :param game_id: a specified game id
+    :param item: the steps to run and how a failed step is handled, "stop" or "skip"
+    :param since: the number of moves the client knows of, only the changes after it are returned
+    :param x_since_move: the same as `since`, as a header
+    :return: the state of the game after the script and the per-step results
+    """
+    try:
+        game: Game = await _get_game(game_id)
+        if game is None:
+            logger.error("Game ID '%s' does not exist", game_id)
+            return JSONResponse(
+                status_code=404,
+                content={"status": False, "detail": f"Game ID '{game_id}' does not exist"}
+            )
+
+        if item.on_error not in BATCH_ERROR_POLICIES:
+            logger.error("Invalid error policy: %s", item.on_error)
+            return JSONResponse(
+                status_code=400,
+                content={"status": False, "detail": f"on_error must be one of {', '.join(BATCH_ERROR_POLICIES)}"}
+            )
+
+        steps = [(step.robot_id, step.command) for step in item.steps]
+        results = await run_commands(game, steps, on_error=item.on_error)
+        failed = [result for result in results if not result["ok"]]
+        if len(failed) < len(results):
+            await _save_game(game_id, game)
+        stopped_at = failed[-1]["step"] if failed and item.on_error == "stop" else None
+
+        res = {
+            "game_id": game_id,
+            "applied": len(results) - len(failed),
+            "failed": len(failed),
+            "stopped_at": stopped_at,
+            "results": results if item.verbose else failed,
+            **_positions(game, since if since is not None else x_since_move),
+            "number_of_moves": game.get_number_of_moves(),
+            "all_dinosaurs_has_been_terminated": not bool(game.dinosaurs_position),
+        }
+        logger.info("Game %s ran %s steps: %s applied, %s failed", game_id, len(steps), res["applied"], res["failed"])
+        if res["all_dinosaurs_has_been_terminated"]:
+            logger.info(">>>>>     Game %s completed     <<<<<<", game_id)
+        return JSONResponse(status_code=200, content=res)
+
+    except GameConflict as e:
+        ERRORS.inc(type(e).__name__)
+        return JSONResponse(
+            status_code=409,
+            content={"status": False, "detail": str(e)}
+        )
+
+    except Exception as e:
+        logger.error("Exception: %s", e)
+        ERRORS.inc(type(e).__name__)
+        return JSONResponse(
+            status_code=400,
+            content={"status": False, "detail": str(e)}
+        )
+
+
+@app.post("/games/{game_id}/tick",
+          responses={200: {"model": TickResponse}, 400: {"model": ErrorMessage}, 404: {"model": ErrorMessage},
+                     409: {"model": ErrorMessage}})
+async def tick_robots(game_id: str, item: TickPayload, since: Optional[int] = None,
+                      x_since_move: Optional[int] = Header(None)) -> JSONResponse:
+    """
+    Operate every robot at once: the attacks first, then the moves, then the turns
+    :param game_id: a specified game id
+    :param item: one command for all robots, or one command per robot in the order they were created, -1 to skip
+    :param since: the number of moves the client knows of, only the changes after it are returned
+    :param x_since_move: the same as `since`, as a header
+    :return: the number of applied and blocked commands and the state of the game
+    """
+    try:
+        game: Game = await _get_game(game_id)
+        if game is None:
+            logger.error("Game ID '%s' does not exist", game_id)
+            return JSONResponse(
+                status_code=404,
+                content={"status": False, "detail": f"Game ID '{game_id}' does not exist"}
+            )
+
+        commands = item.command if item.commands is None else item.commands
+        if commands is None or (item.commands is not None and len(item.commands) != len(game.robots)):
+            logger.error("Invalid tick commands for %s robots", len(game.robots))
+            return JSONResponse(
+                status_code=400,
+                content={
+                    "status": False,
+                    "detail": f"Set one command, or one command for each of the {len(game.robots)} robots"
+                }
+            )
+
+        applied = await run_tick(game, commands)
+        if applied.any():
+            await _save_game(game_id, game)
+        skipped = item.commands.count(-1) if item.commands is not None else len(applied) * (item.command == -1)
+        res = {
+            "game_id": game_id,
+            "applied": int(applied.sum()),
+            "blocked": len(applied) - int(applied.sum()) - skipped,
+            **_positions(game, since if since is not None else x_since_move),
+            "number_of_moves": game.get_number_of_moves(),
+            "all_dinosaurs_has_been_terminated": not bool(game.dinosaurs_position),
+        }
+        logger.info("Game %s ticked: %s applied, %s blocked", game_id, res["applied"], res["blocked"])
+        if res["all_dinosaurs_has_been_terminated"]:
+            logger.info(">>>>>     Game %s completed     <<<<<<", game_id)
+        return JSONResponse(status_code=200, content=res)
+
+    except GameConflict as e:
+        ERRORS.inc(type(e).__name__)
+        return JSONResponse(
+            status_code=409,
+            content={"status": False, "detail": str(e)}
+        )
+
+    except Exception as e:
+        logger.error("Exception: %s", e)
+        ERRORS.inc(type(e).__name__)
+        return JSONResponse(
+            status_code=400,
+            content={"status": False, "detail": str(e)}
+        )
+
+
+@app.post("/games/{game_id}/autopilot",
+          responses={200: {"model": AutopilotResponse}, 400: {"model": ErrorMessage}, 404: {"model": ErrorMessage},
+                     409: {"model": ErrorMessage}})
+async def autopilot(game_id: str, item: AutopilotPayload, since: Optional[int] = None,
+                    x_since_move: Optional[int] = Header(None)) -> JSONResponse:
+    """
+    Drive every robot along its shortest path to the nearest reachable dinosaur, attacking once next to it
+    :param game_id: a specified game id
+    :param item: the number of rounds, every robot gets at most one command per round
+    :param since: the number of moves the client knows of, only the changes after it are returned
+    :param x_since_move: the same as `since`, as a header
+    :return: the state of the game after the rounds
+    """
+    try:
+        game: Game = await _get_game(game_id)
+        if game is None:
+            logger.error("Game ID '%s' does not exist", game_id)
+            return JSONResponse(
+                status_code=404,
+                content={"status": False, "detail": f"Game ID '{game_id}' does not exist"}
+            )
+
+        if not 0 < item.rounds <= app_settings.autopilot_max_rounds:
+            logger.error("Invalid number of rounds: %s", item.rounds)
+            return JSONResponse(
+                status_code=400,
+                content={"status": False, "detail": f"rounds must be between 1 and {app_settings.autopilot_max_rounds}"}
+            )
+
+        result = await run_autopilot(game, item.rounds)
+        if result["applied"]:
+            await _save_game(game_id, game)
+        res = {
+            "game_id": game_id,
+            **result,
+            **_positions(game, since if since is not None else x_since_move),
+            "number_of_moves": game.get_number_of_moves(),
+            "all_dinosaurs_has_been_terminated": not bool(game.dinosaurs_position),
+        }
+        logger.info("Game %s autopilot ran %s rounds: %s applied", game_id, res["rounds"], res["applied"])
+        if res["all_dinosaurs_has_been_terminated"]:
+            logger.info(">>>>>     Game %s completed     <<<<<<", game_id)
+        return JSONResponse(status_code=200, content=res)
+
+    except GameConflict as e:
+        ERRORS.inc(type(e).__name__)
+        return JSONResponse(
+            status_code=409,
+            content={"status": False, "detail": str(e)}
+        )
+
+    except Exception as e:
+        logger.error("Exception: %s", e)
+        ERRORS.inc(type(e).__name__)
+        return JSONResponse(
+            status_code=400,
+            content={"status": False, "detail": str(e)}
+        )
+
+
+@app.websocket("/games/{game_id}/ws")
+async def play_channel(websocket: WebSocket, game_id: str):
+    """
+    Operate robots with [robot_id, command] frames, as JSON text or packed in binary, and receive the moves of the
+    game as small deltas, a client which sends nothing is a spectator
+    :param websocket: the connection
+    :param game_id: a specified game id
+    """
+    if await _get_game(game_id) is None:
+        logger.error("Game ID '%s' does not exist", game_id)
+        await websocket.close(code=4404)
+        return
+    await websocket.accept()
+    subscriber = CHANNELS.subscribe(game_id)
+
+    async def forward():
+        # The only writer of the connection, the deltas and the errors are queued for it
+        while True:
+            await websocket.send_json(await subscriber.get())
+
+    writer = asyncio.ensure_future(forward())
+    try:
+        while True:
+            message = await websocket.receive()
+            if message["type"] == "websocket.disconnect":
+                raise WebSocketDisconnect(message.get("code", 1000))
+            try:
+                robot_id, command = decode_command(message)
+                game: Game = await _get_game(game_id)
+                if game is None:
+                    raise Exception(f"Game ID '{game_id}' does not exist")
+                game = await move_robot(game, resolve_robot_id(game, robot_id), COMMANDS[command])
+                await _save_game(game_id, game)
+            except Exception as e:
+                ERRORS.inc(type(e).__name__)
+                subscriber.push({"error": str(e)})
+
+    except WebSocketDisconnect:
+        pass
+
+    finally:
+        writer.cancel()
+        CHANNELS.unsubscribe(subscriber)
+        # Retrieve the end of the writer, a send fails once the client is gone
+        try:
+            await writer
+        except asyncio.CancelledError:
+            pass
+        except Exception as e:
+            logger.info("The play channel of game %s stopped sending: %s", game_id, e)
+
+
 @app.delete("/games/{game_id}",
             responses={200: {"model": DeletionMessage}, 400: {"model": ErrorMessage}, 404: {"model": ErrorMessage}})
 def remove_game(game_id: str) -> JSONResponse:
@@ -177,27 +776,46 @@ def remove_game(game_id: str) -> JSONResponse:
     """
     try:
         if game_id not in GAMES:
-            logger.error(f"Game ID '{game_id}' does not exist")
+            logger.error("Game ID '%s' does not exist", game_id)
             return JSONResponse(
                 status_code=404,
                 content={"status": False, "detail": f"Game ID '{game_id}' does not exist"}
             )
         GAMES.pop(game_id)
+        if JOURNALS is not None:
+            JOURNALS.reset(game_id)
         res = {
             "game_id": game_id,
             "is_deleted": game_id not in GAMES,
         }
-        logger.info(f"{res}")
+        logger.info("Game removed: %s", res)
         return JSONResponse(status_code=200, content=res)
 
     except Exception as e:
-        logger.error(f"Exception: {e}")
+        logger.error("Exception: %s", e)
+        ERRORS.inc(type(e).__name__)
         return JSONResponse(
             status_code=400,
             content={"status": False, "detail": str(e)}
         )
 
 
+@app.get("/metrics")
+def metrics() -> Response:
+
+    """ The metrics of this worker in the Prometheus text format """
+
+    return Response(content=REGISTRY.render(), media_type=CONTENT_TYPE)
+
+
+@app.get("/store/stats", responses={200: {"model": StoreStats}})
+def store_stats() -> JSONResponse:
+
+    """ The usage and the hit, miss and eviction counters of the game store """
+
+    return JSONResponse(status_code=200, content=GAMES.stats())
+
+
 @app.delete("/games", responses={400: {"model": ErrorMessage}})
 def remove_games() -> JSONResponse:
 
@@ -205,12 +823,17 @@ def remove_games() -> JSONResponse:
 
     logger.info("Delete all games")
     try:
-        [GAMES.pop(game) for game in GAMES.copy()]
+        game_ids = list(GAMES)
+        GAMES.clear()
+        if JOURNALS is not None:
+            for game_id in game_ids:
+                JOURNALS.reset(game_id)
         logger.info("all games deleted")
         return JSONResponse(status_code=204, content={})
 
     except Exception as e:
-        logger.error(f"Exception: {e}")
+        logger.error("Exception: %s", e)
+        ERRORS.inc(type(e).__name__)
         return JSONResponse(
             status_code=400,
             content={"status": False, "detail": str(e)}
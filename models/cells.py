@@ -0,0 +1,73 @@
+import random
+import numpy as np
+
+
+class FreeCells:
+
+    """ Index of the empty cells of a board, supports O(1) random pick, occupy and release """
+
+    def __init__(self, board: np.ndarray):
+        self.dim = board.shape[1]
+        dtype = np.int32 if board.size < np.iinfo(np.int32).max else np.int64
+
+        # The flat indices of empty cells are packed in the front of `_cells`,
+        # `_slots` maps a flat index back to its slot in `_cells`, -1 if the cell is occupied
+        empty = np.flatnonzero(board.ravel() == 0)
+        self._cells = np.zeros(board.size, dtype=dtype)
+        self._cells[:len(empty)] = empty
+        self._slots = np.full(board.size, -1, dtype=dtype)
+        self._slots[empty] = np.arange(len(empty), dtype=dtype)
+        self._count = len(empty)
+
+    def __len__(self):
+        return self._count
+
+    @property
+    def nbytes(self) -> int:
+        return self._cells.nbytes + self._slots.nbytes
+
+    def __contains__(self, position: (int, int)):
+        return self._slots[self._flat(position)] != -1
+
+    def _flat(self, position: (int, int)) -> int:
+        return position[0] * self.dim + position[1]
+
+    def pick(self) -> (int, int):
+        """
+        Randomly pick an empty cell and mark it as occupied
+        :return: the position of the cell
+        """
+        if not self._count:
+            raise Exception("All positions in the grid have been occupied")
+        cell = int(self._cells[random.randrange(self._count)])
+        self._remove(cell)
+        return divmod(cell, self.dim)
+
+    def occupy(self, position: (int, int)):
+        """
+        Mark a cell as occupied, nothing happens if it is occupied already
+        :param position: the position of the cell
+        """
+        cell = self._flat(position)
+        if self._slots[cell] != -1:
+            self._remove(cell)
+
+    def release(self, position: (int, int)):
+        """
+        Mark a cell as empty, nothing happens if it is empty already
+        :param position: the position of the cell
+        """
+        cell = self._flat(position)
+        if self._slots[cell] == -1:
+            self._cells[self._count] = cell
+            self._slots[cell] = self._count
+            self._count += 1
+
+    def _remove(self, cell: int):
+        # Swap the last empty cell into the freed slot
+        slot = self._slots[cell]
+        last = self._cells[self._count - 1]
+        self._cells[slot] = last
+        self._slots[last] = slot
+        self._slots[cell] = -1
+        self._count -= 1
@@ -0,0 +1,122 @@
+from typing import Dict, List, Iterable, Optional
+import sys
+from services.utils import DIRECTIONS, DIRECTION_CODES
+
+
+class Robot:
+
+    """ A robot on the board, the direction is encoded as its index in DIRECTIONS """
+
+    __slots__ = ("row", "column", "direction")
+
+    def __init__(self, row: int, column: int, direction: int):
+        self.row = row
+        self.column = column
+        self.direction = direction
+
+    @property
+    def coordinate(self) -> (int, int):
+        return self.row, self.column
+
+    @property
+    def facing(self) -> str:
+        return DIRECTIONS[self.direction]
+
+    def __getitem__(self, key: str):
+        # Keep the read access of the former {"coordinate": ..., "direction": ...} dict
+        if key == "coordinate":
+            return self.coordinate
+        if key == "direction":
+            return self.facing
+        raise KeyError(key)
+
+    def __eq__(self, other):
+        if not isinstance(other, Robot):
+            return NotImplemented
+        return (self.row, self.column, self.direction) == (other.row, other.column, other.direction)
+
+    def __repr__(self):
+        return f"Robot(coordinate={self.coordinate}, direction={self.facing!r})"
+
+    def to_dict(self) -> dict:
+        return {"coordinate": self.coordinate, "direction": self.facing}
+
+
+class EntityStore:
+
+    """ Index of the roles on a board, robots and dinosaurs can be looked up by id and by position in O(1) """
+
+    def __init__(self):
+        # Dinosaurs are numbered in placement order
+        self._dinosaurs: Dict[int, tuple] = {}
+        self._dinosaur_at: Dict[tuple, int] = {}
+        self._next_dinosaur_id = 0
+
+        self.robots: Dict[str, Robot] = {}
+        self._robot_at: Dict[tuple, str] = {}
+
+        # The lists served to the API, rebuilt on demand after a change
+        self._dinosaurs_view: Optional[List[tuple]] = None
+
+    def __len__(self):
+        return len(self._dinosaurs) + len(self.robots)
+
+    @property
+    def nbytes(self) -> int:
+        """ An estimate of the memory held by the index, the dicts plus one position tuple and robot each """
+        position = sys.getsizeof((0, 0))
+        robot = sys.getsizeof(Robot(0, 0, 0))
+        dicts = sum(map(sys.getsizeof, (self._dinosaurs, self._dinosaur_at, self.robots, self._robot_at)))
+        return dicts + position * (len(self._dinosaurs) + len(self.robots)) + robot * len(self.robots)
+
+    def add_dinosaur(self, position: (int, int)) -> int:
+        dinosaur_id = self._next_dinosaur_id
+        self._next_dinosaur_id += 1
+        self._dinosaurs[dinosaur_id] = position
+        self._dinosaur_at[position] = dinosaur_id
+        self._dinosaurs_view = None
+        return dinosaur_id
+
+    def add_dinosaurs(self, positions: Iterable[tuple]):
+        for position in positions:
+            self.add_dinosaur(position)
+
+    def remove_dinosaur(self, position: (int, int)) -> int:
+        dinosaur_id = self._dinosaur_at.pop(position)
+        del self._dinosaurs[dinosaur_id]
+        self._dinosaurs_view = None
+        return dinosaur_id
+
+    def dinosaur_at(self, position: (int, int)) -> Optional[int]:
+        return self._dinosaur_at.get(position)
+
+    def get_dinosaur(self, dinosaur_id: int) -> Optional[tuple]:
+        return self._dinosaurs.get(dinosaur_id)
+
+    @property
+    def dinosaurs_position(self) -> List[tuple]:
+        if self._dinosaurs_view is None:
+            self._dinosaurs_view = list(self._dinosaurs.values())
+        return self._dinosaurs_view
+
+    def add_robot(self, robot_id: str, position: (int, int), direction: str):
+        if direction not in DIRECTION_CODES:
+            raise Exception(f"The direction must be one of {DIRECTIONS}")
+        self.robots[robot_id] = Robot(position[0], position[1], DIRECTION_CODES[direction])
+        self._robot_at[position] = robot_id
+
+    def move_robot(self, robot_id: str, position: (int, int)):
+        robot = self.robots[robot_id]
+        del self._robot_at[robot.row, robot.column]
+        robot.row, robot.column = position
+        self._robot_at[position] = robot_id
+
+    def turn_robot(self, robot_id: str, direction: int):
+        self.robots[robot_id].direction = direction
+
+    def robot_at(self, position: (int, int)) -> Optional[str]:
+        return self._robot_at.get(position)
+
+    @property
+    def robots_position(self) -> List[tuple]:
+        return [(robot.row, robot.column) for robot in self.robots.values()]
@@ -1,29 +1,132 @@
-from typing import List
-from services.utils import DIRECTIONS, DIRECTION_BASED_INDEX, MOVING_VECTOR, create_new_board, select_empty_position
-
+from typing import List, NamedTuple, Optional, Tuple
+from services.utils import COMMANDS, STEPS, TURN_RIGHT, TURN_LEFT, create_new_board, smallest_dtype, use_sparse_board
+from models.cells import FreeCells
+from models.sparse import SparseBoard
+from models.entities import EntityStore
+from models.history import History
+from models.setting import get_app_settings
+
+from collections import deque
+from itertools import islice
+import numpy as np
+import asyncio
 import pprint
 import random
+import sys
+import time
 import logging
 
 logger = logging.getLogger(__name__)
 
+# The last time a board was dumped by the debug render, shared by all games to bound the log volume
+_last_board_dump = 0.0
+
+
+class MoveRecord(NamedTuple):
+
+    """ The outcome of a successful command, enough to replay it on the game as it was before """
+
+    # The number of moves of the game once this one is applied
+    move: int
+    robot_id: str
+    # The index of the command in COMMANDS
+    command: int
+    # The robot placement after the command, the direction is an index in DIRECTIONS
+    row: int
+    column: int
+    direction: int
+    # The positions of the dinosaurs destroyed by an attack
+    kills: Tuple[Tuple[int, int], ...] = ()
+
 
 class Board:
 
     """ Initialize the size of the game board and the number of roles in each camp. """
 
-    def __init__(self, dim: int):
+    def __init__(self, dim: int, sparse: bool = None, entities: int = None):
+        """
+        :param dim: dimension of the grid
+        :param sparse: store the grid as a map from cell to value, chosen from the density when not specified
+        :param entities: the expected number of roles, to choose the grid storage, the grid is dense when unknown
+        """
         self.dim = dim
+        if sparse is None and entities is None:
+            sparse = False
+        elif sparse is None:
+            settings = get_app_settings()
+            sparse = use_sparse_board(dim, entities, settings.sparse_min_cells, settings.sparse_max_density)
+        self.sparse = sparse
         self._board = []
         self._robots_count = 0
         self._dinosaurs_count = 0
+
+        # Indicate each dinosaur has 1 life point
+        self._dinosaur_life = 1
+
+        # Indicate each robot has 1 attack power
+        self._robot_power = -1
         self._create_new_board()
 
     def _create_new_board(self):
-        self._board = create_new_board(self.dim)
-        self.dinosaurs_position = []
-        self.robots_position = []
-        self.robots = {}
+        # A cell holds 0, a robot, a dinosaur, or what is left of a dinosaur after an attack
+        dtype = smallest_dtype(0, self._dinosaur_life, self._robot_power, self._dinosaur_life + self._robot_power)
+        if self.sparse:
+            self._board = SparseBoard(self.dim, dtype=dtype)
+        else:
+            self._board = create_new_board(self.dim, dtype=dtype)
+        # The index of empty cells is only built once a random position is requested
+        self._free_cells = None
+        self.entities = EntityStore()
+
+    @property
+    def dinosaurs_position(self) -> List[tuple]:
+        return self.entities.dinosaurs_position
+
+    @property
+    def robots_position(self) -> List[tuple]:
+        return self.entities.robots_position
+
+    @property
+    def robots(self) -> dict:
+        return self.entities.robots
+
+    def _select_empty_position(self) -> (int, int):
+        if self.sparse:
+            # A sparse board is mostly empty, a few random draws find an empty cell
+            if len(self.entities) >= self.dim * self.dim:
+                raise Exception("All positions in the grid have been occupied")
+            position = (random.randrange(self.dim), random.randrange(self.dim))
+            while self._board[position] != 0:
+                position = (random.randrange(self.dim), random.randrange(self.dim))
+            return position
+
+        if self._free_cells is None:
+            self._free_cells = FreeCells(self._board)
+        position = self._free_cells.pick()
+        return position
+
+    def _set_cell(self, position: (int, int), value: int):
+        # Write a cell and keep the index of empty cells up to date
+        self._board[position] = value
+        if self._free_cells is not None:
+            if value == 0:
+                self._free_cells.release(position)
+            else:
+                self._free_cells.occupy(position)
+
+    def _get_cells(self, rows: np.ndarray, columns: np.ndarray) -> np.ndarray:
+        # Read many cells at once
+        if self.sparse:
+            return np.array([self._board[cell] for cell in zip(rows.tolist(), columns.tolist())], dtype=np.int64)
+        return self._board[rows, columns]
+
+    def _set_cells(self, rows: np.ndarray, columns: np.ndarray, value: int):
+        # Write many cells at once and keep the index of empty cells up to date
+        self._board[rows, columns] = value
+        if self._free_cells is not None:
+            update = self._free_cells.release if value == 0 else self._free_cells.occupy
+            for cell in zip(rows.tolist(), columns.tolist()):
+                update(cell)
 
     def set_dinosaurs(self, row: int = None, column: int = None):
         """
@@ -42,16 +145,20 @@ class Board:
         position = (row, column)
         # Randomly select in available positions if the position not specified or specified wrong
         if row is None or column is None:
-            available = select_empty_position(self._board)
-            position = random.choice(available)
+            position = self._select_empty_position()
 
         if not self.is_in_grid(position):
-            logger.error(f"The position {position} is out of grid")
+            logger.error("The position %s is out of grid", position)
             raise Exception("The dinosaurs placement is out of grid scope")
 
+        if not self.validate_move(position):
+            logger.error("The position %s is occupied", position)
+            raise Exception("The dinosaurs placement has been occupied")
+
         # Record the position of a new role
-        logger.info(f"Set a dinosaur at {position}")
-        self.dinosaurs_position.append(position)
+        logger.info("Set a dinosaur at %s", position)
+        self.entities.add_dinosaur(position)
+        self._set_cell(position, self._dinosaur_life)
 
     def set_robots(self, row: int = None, column: int = None, direction: str = "E"):
         """
@@ -70,22 +177,107 @@ class Board:
 
         # Create robots
         # Define a random id for robot
-        robot_id = str(random.getrandbits(16))
+        robot_id = self._new_robot_id()
 
         position = (row, column)
         # Randomly select in available positions if the position not specified or specified wrong
         if row is None or column is None:
-            available = select_empty_position(self._board)
-            position = random.choice(available)
+            position = self._select_empty_position()
 
         if not self.is_in_grid(position):
-            logger.error(f"The position {position} is out of grid")
-            raise Exception("The dinosaurs placement is out of grid scope")
+            logger.error("The position %s is out of grid", position)
+            raise Exception("The robots placement is out of grid scope")
+
+        if not self.validate_move(position):
+            logger.error("The position %s is occupied", position)
+            raise Exception("The robots placement has been occupied")
 
         # Record the position of a new role
-        logger.info(f"Set a robot at {position}, facing {direction}")
-        self.robots_position.append(position)
-        self.robots.update(**{robot_id: {"coordinate": position, "direction": direction}})
+        logger.info("Set a robot at %s, facing %s", position, direction)
+        self.entities.add_robot(robot_id, position, direction)
+        self._set_cell(position, self._robot_power)
+
+    def set_random_roles(self, robots_count: int, dinosaurs_count: int, seed: int = None):
+        """
+        Set robots and dinosaurs in random empty positions with one vectorized draw
+        :param robots_count: the number of robots to set
+        :param dinosaurs_count: the number of dinosaurs to set
+        :param seed: the seed of the random generator, for reproducible games
+        """
+        rng = np.random.default_rng(seed)
+        total = robots_count + dinosaurs_count
+        if len(self.entities) and self.sparse:
+            if total > self.dim * self.dim - len(self.entities):
+                logger.error("No vacancy for new roles on the game board")
+                raise Exception(
+                    "All positions in the grid have been occupied or you set too many robots/dinosaurs in the grid"
+                )
+            cells = self._draw_empty_cells(total, rng)
+        elif len(self.entities):
+            empty = np.flatnonzero(self._board.reshape(-1) == 0)
+            if total > len(empty):
+                logger.error("No vacancy for new roles on the game board")
+                raise Exception(
+                    "All positions in the grid have been occupied or you set too many robots/dinosaurs in the grid"
+                )
+            cells = empty[rng.choice(len(empty), total, replace=False)]
+        else:
+            if total > self.dim * self.dim:
+                logger.error("No vacancy for new roles on the game board")
+                raise Exception(
+                    "All positions in the grid have been occupied or you set too many robots/dinosaurs in the grid"
+                )
+            cells = rng.choice(self.dim * self.dim, total, replace=False)
+
+        dinosaur_cells, robot_cells = cells[:dinosaurs_count], cells[dinosaurs_count:]
+        if self.sparse:
+            self._board.set_flat(dinosaur_cells, self._dinosaur_life)
+            self._board.set_flat(robot_cells, self._robot_power)
+        else:
+            flat_board = self._board.reshape(-1)
+            flat_board[dinosaur_cells] = self._dinosaur_life
+            flat_board[robot_cells] = self._robot_power
+
+        rows, columns = np.divmod(dinosaur_cells, self.dim)
+        self.entities.add_dinosaurs(zip(rows.tolist(), columns.tolist()))
+        rows, columns = np.divmod(robot_cells, self.dim)
+        robot_ids = self._new_robot_ids(robots_count, rng)
+        for robot_id, position in zip(robot_ids, zip(rows.tolist(), columns.tolist())):
+            self.entities.add_robot(robot_id, position, "E")
+        self._dinosaurs_count += dinosaurs_count
+        self._robots_count += robots_count
+
+        # The board was written in bulk, rebuild the index of empty cells on demand
+        self._free_cells = None
+        logger.info("Set %s dinosaurs and %s robots at random, seed %s", dinosaurs_count, robots_count, seed)
+
+    def _draw_empty_cells(self, count: int, rng: np.random.Generator) -> np.ndarray:
+        # Draw random flat cells and drop the occupied and repeated ones until there are enough
+        cells = {}
+        while len(cells) < count:
+            for cell in rng.integers(0, self.dim * self.dim, count - len(cells)).tolist():
+                if self._board[divmod(cell, self.dim)] == 0:
+                    cells[cell] = None
+        return np.fromiter(cells, dtype=np.int64, count=count)
+
+    def _new_robot_id(self) -> str:
+        # Widen the id space once the 16-bit ids get crowded
+        bits = max(16, (4 * len(self.robots)).bit_length())
+        robot_id = str(random.getrandbits(bits))
+        while robot_id in self.robots:
+            robot_id = str(random.getrandbits(bits))
+        return robot_id
+
+    def _new_robot_ids(self, count: int, rng: np.random.Generator) -> List[str]:
+        bits = max(16, (4 * (len(self.robots) + count)).bit_length())
+        # Use a dict as an ordered set, so the ids only depend on the generator state
+        robot_ids = {}
+        while len(robot_ids) < count:
+            for candidate in rng.integers(0, 2 ** bits, count - len(robot_ids)).tolist():
+                robot_id = str(candidate)
+                if robot_id not in self.robots:
+                    robot_ids[robot_id] = None
+        return list(robot_ids)
 
     def validate_move(self, position: (int, int)):
         # Check the next move is an empty space
@@ -93,6 +285,9 @@ class Board:
             return False
         return True
 
+    def _in_grid(self, rows: np.ndarray, columns: np.ndarray) -> np.ndarray:
+        return (rows >= 0) & (rows < self.dim) & (columns >= 0) & (columns < self.dim)
+
     def is_in_grid(self, position: (int, int)):
         # Check the next move is within boundaries
         if 0 <= position[0] < self.dim and 0 <= position[1] < self.dim:
@@ -102,45 +297,150 @@ class Board:
     def get_board(self):
         return self._board
 
+    @property
+    def nbytes(self) -> int:
+        # The memory held by the board grid
+        return self._board.nbytes
+
+    def memory_report(self) -> dict:
+        """
+        Report the memory held by the game
+        :return: the size in bytes of the board, the entity index and the free-cell index
+        """
+        free_cells = self._free_cells.nbytes if self._free_cells is not None else 0
+        entities = self.entities.nbytes
+        return {
+            "board_dtype": str(self._board.dtype),
+            "board_cells": int(self._board.size),
+            "board_bytes": int(self._board.nbytes),
+            "entities_bytes": entities,
+            "free_cells_bytes": free_cells,
+            "total_bytes": int(self._board.nbytes) + entities + free_cells,
+        }
+
     def delete_board(self):
         self._board = []
 
     def print_board(self):
         pprint.pprint(self._board)
 
+    def dump_board(self):
+        """
+        Debug render of the board after a mutation, enabled by the `board_dump` setting
+        and limited to one dump per `board_dump_interval` seconds
+        """
+        global _last_board_dump
+        settings = get_app_settings()
+        if not settings.board_dump:
+            return
+        now = time.monotonic()
+        if now - _last_board_dump < settings.board_dump_interval:
+            return
+        _last_board_dump = now
+        logger.debug("Game board %s:\n%s", getattr(self, "game_id", None), self._board)
+
 
 class Game(Board):
 
     """ Inherit the Board instance and begin a game"""
 
-    def __init__(self, dim):
-        super().__init__(dim)
+    def __init__(self, dim, sparse: bool = None, entities: int = None):
+        super().__init__(dim, sparse=sparse, entities=entities)
         self.game_id = random.randint(1, 9999)
 
         # The total number of move in a game
         self._moves = 0
 
-        # Indicate each dinosaur has 1 life point
-        self._dinosaur_life = 1
+        # Serialize the moves of the game, created on first use to bind to the running event loop
+        self._lock = None
+        # The recorded moves, kept when enabled and started on first use from the state of the game at that time
+        self.keep_history = get_app_settings().history_enabled
+        self._history = None
+        # The last moves, with or without history, they describe the changes to the clients a few moves behind
+        self._recent = deque(maxlen=get_app_settings().delta_max_moves)
+
+    @property
+    def lock(self) -> asyncio.Lock:
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+        return self._lock
+
+    @property
+    def history(self) -> Optional[History]:
+        # Read it before applying a move, so the history starts from the state before that move
+        if self._history is None and self.keep_history:
+            settings = get_app_settings()
+            self._history = History(
+                self._moves, self.entities, settings.history_keyframe_interval, settings.history_max_moves,
+                settings.history_max_keyframes,
+            )
+        return self._history
 
-        # Indicate each robot has 1 attack power
-        self._robot_power = -1
+    def remember_moves(self, records: List[MoveRecord]):
+        # The records follow each other, a move applied without a record breaks the chain
+        if records and self._recent and self._recent[-1].move != records[0].move - 1:
+            self._recent.clear()
+        self._recent.extend(records)
+
+    def recent_moves(self, move: int) -> Optional[List[MoveRecord]]:
+        """
+        :param move: the number of moves a client knows of
+        :return: the records of the moves after it, None when they are no longer kept
+        """
+        if move == self._moves:
+            return []
+        if not self._recent or self._recent[-1].move != self._moves:
+            return None
+        start = self._recent[0].move - 1
+        if not start <= move <= self._moves:
+            return None
+        return list(islice(self._recent, move - start, None))
+
+    @property
+    def _recent_nbytes(self) -> int:
+        return len(self._recent) * sys.getsizeof(self._recent[0]) if self._recent else 0
+
+    @property
+    def nbytes(self) -> int:
+        # The board, the recent moves and the history, which the board size does not bound
+        return super().nbytes + self._recent_nbytes + (self._history.nbytes if self._history is not None else 0)
+
+    def memory_report(self) -> dict:
+        """
+        Report the memory held by the game
+        :return: the size in bytes of the board, the entity index, the free-cell index, the recent moves and the history
+        """
+        report = super().memory_report()
+        report["recent_moves_bytes"] = self._recent_nbytes
+        report["history_bytes"] = self._history.nbytes if self._history is not None else 0
+        report["total_bytes"] += report["recent_moves_bytes"] + report["history_bytes"]
+        return report
+
+    @property
+    def version(self) -> int:
+        # Every change of the game is a move, the number of moves identifies the state
+        return self._moves
 
     def initial_placement(self):
         # Place all roles to the board
-        for dinosaur in self.dinosaurs_position:
-            self._board[dinosaur] = self._dinosaur_life
+        if self.dinosaurs_position:
+            rows, columns = zip(*self.dinosaurs_position)
+            self._board[rows, columns] = self._dinosaur_life
+
+        if self.robots_position:
+            rows, columns = zip(*self.robots_position)
+            self._board[rows, columns] = self._robot_power
 
-        for robot in self.robots_position:
-            self._board[robot] = self._robot_power
+        self._free_cells = None
 
-        self.print_board()
+        self.dump_board()
 
-    def set_random_game(self, robots_count: int = 1, dinosaurs_count: int = 1):
+    def set_random_game(self, robots_count: int = 1, dinosaurs_count: int = 1, seed: int = None):
         """
         Set a random-placement game, define the number of roles in each camp
         :param robots_count: the total number of robots, the default is 1
         :param dinosaurs_count: the total number of dinosaurs, the default is 1
+        :param seed: the seed of the random placement, the default is a fresh random game
         """
         # The default is an 1 vs 1 game
         if not robots_count:
@@ -148,139 +448,87 @@ class Game(Board):
         if not dinosaurs_count:
             dinosaurs_count = 1
 
-        while dinosaurs_count != self._dinosaurs_count:
-            self.set_dinosaurs()
-            self._dinosaurs_count += 1
-
-        while robots_count != self._robots_count:
-            self.set_robots()
-            self._robots_count += 1
-
-        self.initial_placement()
+        self.set_random_roles(robots_count, dinosaurs_count, seed=seed)
+        self.dump_board()
 
     async def move_robot_forward(self, robot_id: str):
         """
         Move a specified robot forward
         :param robot_id: the robot id
         """
-        # Retrieve robot's detailed placement
-        position = self.robots[robot_id]["coordinate"]
-        direction = self.robots[robot_id]["direction"]
-
-        # Convert position tuple to a list in order to update coordinate
-        assert isinstance(position[0], int), "position must be a tuple of 2 integers"
-        assert isinstance(position[1], int), "position must be a tuple of 2 integers"
-        assert isinstance(direction, str), "direction must be a string of 'E', 'S', 'W', 'N'"
-        position_to_list = list(position)
-
-        # heading east or west -> move between columns, index 1
-        # heading north or south -> move between rows, index 0
-        position_to_list[DIRECTION_BASED_INDEX[direction]] += MOVING_VECTOR[direction]
-
-        # Convert new position back to a tuple in order to update
-        new_position = tuple(position_to_list)
-
-        if not self.is_in_grid(new_position):
-            logger.error(f"The new position {new_position} is out of grid")
-            raise Exception("The move is invalid, the robot has reached the grid edge")
-
-        if not self.validate_move(new_position):
-            logger.error(f"The new position {new_position} is occupied")
-            raise Exception("The new position has been occupied")
-
-        logger.info(f"The robot moves forward from {position} to {new_position}, facing {direction} ")
-        self.robots[robot_id].update({"coordinate": new_position})
-
-        # Remove origin record on the board
-        self._board[position] = 0
-
-        # Set robot in the new position
-        self._board[new_position] = self._robot_power
-        self._moves += 1
-        self.print_board()
+        self._move_robot(robot_id, 1)
 
     async def move_robot_backward(self, robot_id: str):
         """
         Move a specified robot backward
         :param robot_id: the robot id
         """
-        # Retrieve robot's detailed placement
-        position = self.robots[robot_id]["coordinate"]
-        direction = self.robots[robot_id]["direction"]
-
-        # Convert position tuple to a list in order to update coordinate
-        assert isinstance(position[0], int), "position must be a tuple of 2 integers"
-        assert isinstance(position[1], int), "position must be a tuple of 2 integers"
-        assert isinstance(direction, str), "direction must be a string of 'E', 'S', 'W', 'N'"
-        position_to_list = list(position)
+        self._move_robot(robot_id, -1)
 
-        # heading east or west -> move between columns, index 1
-        # heading north or south -> move between rows, index 0
-        position_to_list[DIRECTION_BASED_INDEX[direction]] -= MOVING_VECTOR[direction]
+    def _move_robot(self, robot_id: str, sign: int):
+        # Retrieve robot's detailed placement
+        robot = self.robots[robot_id]
+        position = robot.coordinate
 
-        # Convert new position back to a tuple in order to update
-        new_position = tuple(position_to_list)
+        # Step along the facing direction, forward (sign 1) or backward (sign -1)
+        row_step, column_step = STEPS[robot.direction]
+        new_position = (robot.row + sign * row_step, robot.column + sign * column_step)
 
         if not self.is_in_grid(new_position):
-            logger.error(f"The new position {new_position} is out of grid")
+            logger.error("The new position %s is out of grid", new_position)
             raise Exception("The move is invalid, the robot has reached the grid edge")
 
         if not self.validate_move(new_position):
-            logger.error(f"The new position {new_position} is occupied")
+            logger.error("The new position %s is occupied", new_position)
             raise Exception("The new position has been occupied")
 
-        logger.info(f"The robot moves backward from {position} to {new_position}, facing {direction}")
-        self.robots[robot_id].update({"coordinate": new_position})
+        logger.info(
+            "The robot moves %s from %s to %s, facing %s",
+            "forward" if sign > 0 else "backward", position, new_position, robot.facing
+        )
+        self.entities.move_robot(robot_id, new_position)
 
         # Remove origin record on the board
-        self._board[position] = 0
+        self._set_cell(position, 0)
 
         # Set robot in the new position
-        self._board[new_position] = self._robot_power
+        self._set_cell(new_position, self._robot_power)
         self._moves += 1
-        self.print_board()
+        self.dump_board()
 
     async def turn_robot_right(self, robot_id: str):
         """
         Turn a specified robot right
         :param robot_id: the robot id
         """
-        # Retrieve robot's direction
-        direction = self.robots[robot_id]["direction"]
-
-        # Directions order is clockwise, i.e. DIRECTION = ["E", "S", "W", "N"]
-        new_direction = DIRECTIONS[(DIRECTIONS.index(direction) + 1) % len(DIRECTIONS)]
-
-        # Update new direction
-        logger.info(f"The robot turns right from facing {direction} to {new_direction}")
-        self.robots[robot_id].update({"direction": new_direction})
-        self._moves += 1
-        self.print_board()
+        self._turn_robot(robot_id, TURN_RIGHT, "right")
 
     async def turn_robot_left(self, robot_id: str):
         """
         Turn a specified robot left
         :param robot_id: the robot id
         """
-        # Retrieve robot's direction
-        direction = self.robots[robot_id]["direction"]
+        self._turn_robot(robot_id, TURN_LEFT, "left")
 
-        # Directions order is clockwise, i.e. DIRECTION = ["E", "S", "W", "N"]
-        new_direction = DIRECTIONS[(DIRECTIONS.index(direction) - 1) % len(DIRECTIONS)]
+    def _turn_robot(self, robot_id: str, turn: List[int], side: str):
+        # Directions order is clockwise, the turn table maps a direction code to the next one
+        robot = self.robots[robot_id]
+        direction = robot.facing
+        self.entities.turn_robot(robot_id, turn[robot.direction])
 
         # Update new direction
-        logger.info(f"The robot turns left from facing {direction} to {new_direction}")
-        self.robots[robot_id].update({"direction": new_direction})
+        logger.info("The robot turns %s from facing %s to %s", side, direction, robot.facing)
         self._moves += 1
-        self.print_board()
+        self.dump_board()
 
     async def attack(self, robot_id: str):
         """
         Attack opponents in four directions around the robot
         :param robot_id: the robot id
+        :return: the positions of the defeated dinosaurs
         """
         # Retrieve robot's coordinate
-        position = self.robots[robot_id]["coordinate"]
+        position = self.robots[robot_id].coordinate
 
         # The list of positions that can be attacked
         opponents: List[(int, int)] = [
@@ -289,7 +537,7 @@ class Game(Board):
             (position[0], position[1]+1),
             (position[0], position[1]-1)
         ]
-        _defeated = 0
+        defeated = []
         for opponent in opponents:
             # Pass the location which is out of grid
             if not self.is_in_grid(opponent):
@@ -297,13 +545,128 @@ class Game(Board):
 
             # Attack if the position in opponents list is occupied by dinosaurs
             if self._board[opponent] not in (0, -1):
-                self._board[opponent] = self._board[opponent] + self._board[position]
-                self.dinosaurs_position.remove(opponent)
-                _defeated += 1
+                self._set_cell(opponent, self._board[opponent] + self._board[position])
+                self.entities.remove_dinosaur(opponent)
+                defeated.append(opponent)
 
-        logger.info(f"{_defeated} opponents were defeated")
+        logger.info("%s opponents were defeated", len(defeated))
         self._moves += 1
-        self.print_board()
+        self.dump_board()
+        return defeated
+
+    def apply_record(self, record: MoveRecord):
+        """
+        Replay a recorded move, the robot is put where the record says and the killed dinosaurs are removed
+        :param record: the outcome of a move played on this game in the same state
+        """
+        history = self.history
+        robot = self.robots[record.robot_id]
+        position, new_position = robot.coordinate, (record.row, record.column)
+        if new_position != position:
+            self.entities.move_robot(record.robot_id, new_position)
+            self._set_cell(position, 0)
+            self._set_cell(new_position, self._robot_power)
+        self.entities.turn_robot(record.robot_id, record.direction)
+        for opponent in record.kills:
+            self._set_cell(tuple(opponent), self._board[opponent] + self._robot_power)
+            self.entities.remove_dinosaur(tuple(opponent))
+        self._moves = record.move
+        if history is not None:
+            history.append(record, self.entities)
+        self.remember_moves([record])
+
+    def tick(self, commands, records: bool = False) -> (np.ndarray, List[MoveRecord]):
+        """
+        Apply a command to every robot at once: the attacks first, then the moves, then the turns.
+        A move is blocked when its target is out of the grid, occupied, or targeted by another robot
+        :param commands: a command index for all robots, or one per robot in the order of `robots`, -1 skips a robot
+        :param records: return the records of the applied commands, e.g. for the move hooks, they are also built
+            when the game keeps a history, otherwise only the last `delta_max_moves` ones are built
+        :return: the mask of the robots whose command was applied, and the records in the order they were applied
+        """
+        # Read before the commands are applied, None unless the game keeps a history
+        history = self.history
+        ids = list(self.robots)
+        count = len(ids)
+        commands = np.broadcast_to(np.asarray(commands, dtype=np.int64), (count,))
+        if ((commands < -1) | (commands >= len(COMMANDS))).any():
+            raise Exception("Unsupported command")
+        robots = self.robots.values()
+        rows = np.fromiter((robot.row for robot in robots), dtype=np.int64, count=count)
+        columns = np.fromiter((robot.column for robot in robots), dtype=np.int64, count=count)
+        directions = np.fromiter((robot.direction for robot in robots), dtype=np.int64, count=count)
+        steps = np.array(STEPS, dtype=np.int64).reshape(-1, 2)
+
+        # Attack the four neighbours of every attacking robot, a dinosaur is credited to the first robot next to it
+        attackers = np.flatnonzero(commands == 4)
+        owners = np.repeat(attackers, len(steps))
+        opponent_rows = (rows[attackers, None] + steps[:, 0]).ravel()
+        opponent_columns = (columns[attackers, None] + steps[:, 1]).ravel()
+        inside = self._in_grid(opponent_rows, opponent_columns)
+        owners, opponent_rows, opponent_columns = owners[inside], opponent_rows[inside], opponent_columns[inside]
+        hit = self._get_cells(opponent_rows, opponent_columns) > 0
+        owners, opponent_rows, opponent_columns = owners[hit], opponent_rows[hit], opponent_columns[hit]
+        _, first = np.unique(opponent_rows * self.dim + opponent_columns, return_index=True)
+        owners, opponent_rows, opponent_columns = owners[first], opponent_rows[first], opponent_columns[first]
+        self._set_cells(opponent_rows, opponent_columns, self._dinosaur_life + self._robot_power)
+        kills = {}
+        for owner, opponent in zip(owners.tolist(), zip(opponent_rows.tolist(), opponent_columns.tolist())):
+            self.entities.remove_dinosaur(opponent)
+            kills.setdefault(owner, []).append(opponent)
+
+        # Move the robots whose target is free once the attacks are done and claimed by no other robot
+        movers = np.flatnonzero((commands == 0) | (commands == 1))
+        signs = np.where(commands[movers] == 0, 1, -1)
+        target_rows = rows[movers] + signs * steps[directions[movers], 0]
+        target_columns = columns[movers] + signs * steps[directions[movers], 1]
+        free = self._in_grid(target_rows, target_columns)
+        free[free] = self._get_cells(target_rows[free], target_columns[free]) == 0
+        # Only the targets inside the grid are flattened, an off-grid target would alias a cell of the grid
+        _, inverse, claims = np.unique(
+            target_rows[free] * self.dim + target_columns[free], return_inverse=True, return_counts=True
+        )
+        free[free] = claims[inverse] == 1
+        movers, target_rows, target_columns = movers[free], target_rows[free], target_columns[free]
+        self._set_cells(rows[movers], columns[movers], 0)
+        self._set_cells(target_rows, target_columns, self._robot_power)
+        for mover, target in zip(movers.tolist(), zip(target_rows.tolist(), target_columns.tolist())):
+            self.entities.move_robot(ids[mover], target)
+        rows[movers], columns[movers] = target_rows, target_columns
+
+        # Turn the others
+        turners = np.flatnonzero((commands == 2) | (commands == 3))
+        directions[turners] = np.where(
+            commands[turners] == 2, np.array(TURN_RIGHT)[directions[turners]], np.array(TURN_LEFT)[directions[turners]]
+        )
+        for turner, direction in zip(turners.tolist(), directions[turners].tolist()):
+            self.entities.turn_robot(ids[turner], direction)
+
+        order = np.concatenate([attackers, movers, turners])
+        applied = np.zeros(count, dtype=bool)
+        applied[order] = True
+        logger.info("%s robots ticked, %s opponents were defeated", len(order), len(owners))
+
+        def build(first: int) -> List[MoveRecord]:
+            return [
+                MoveRecord(
+                    self._moves + number, ids[robot], int(commands[robot]), int(rows[robot]), int(columns[robot]),
+                    int(directions[robot]), tuple(kills.get(robot, ())),
+                )
+                for number, robot in enumerate(order[first:].tolist(), start=first + 1)
+            ]
+
+        tick_records = []
+        if records or history is not None:
+            recent = tick_records = build(0)
+        else:
+            # Only the last moves are remembered, a large tick stays vectorized
+            recent = build(max(len(order) - self._recent.maxlen, 0))
+        self._moves += len(order)
+        if history is not None:
+            history.extend(tick_records, self.entities)
+        self.remember_moves(recent)
+        self.dump_board()
+        return applied, tick_records
 
     def get_number_of_moves(self):
         return self._moves
@@ -0,0 +1,176 @@
+from typing import Dict, Iterator, List, NamedTuple, Optional, Tuple
+from bisect import bisect_right
+import sys
+import numpy as np
+
+from models.entities import EntityStore
+
+
+class Keyframe(NamedTuple):
+
+    """ The roles of a game after a move, robots are mapped to (row, column, direction) """
+
+    move: int
+    dinosaurs: Tuple[Tuple[int, int], ...]
+    robots: Dict[str, Tuple[int, int, int]]
+
+
+class History:
+
+    """ The moves of a game as periodic keyframes plus the records in between, any move can be rebuilt """
+
+    def __init__(self, move: int, entities: EntityStore, interval: int = 256, max_moves: int = 100000,
+                 max_keyframes: int = 64):
+        """
+        :param move: the number of moves of the game, the history starts here
+        :param entities: the roles of the game at this move
+        :param interval: the number of moves between two keyframes
+        :param max_moves: the number of moves kept, the oldest keyframes are dropped beyond it
+        :param max_keyframes: the number of keyframes kept, each one copies every role of the game
+        """
+        self.interval = interval
+        self.max_moves = max_moves
+        self.max_keyframes = max_keyframes
+        self._reset(move, entities)
+
+    def _reset(self, move: int, entities: EntityStore):
+        self.start = move
+        self._keyframes: List[Keyframe] = [self._keyframe(move, entities)]
+        self._moves: List[int] = [move]
+        self._sizes: List[int] = [self._keyframe_bytes(self._keyframes[0])]
+        self._records = []
+
+    @staticmethod
+    def _keyframe(move: int, entities: EntityStore) -> Keyframe:
+        robots = {robot_id: (robot.row, robot.column, robot.direction) for robot_id, robot in entities.robots.items()}
+        return Keyframe(move, tuple(entities.dinosaurs_position), robots)
+
+    @staticmethod
+    def _keyframe_bytes(keyframe: Keyframe) -> int:
+        # An estimate, the containers and one tuple per role
+        return (
+            sys.getsizeof(keyframe.dinosaurs) + len(keyframe.dinosaurs) * sys.getsizeof((0, 0))
+            + sys.getsizeof(keyframe.robots) + len(keyframe.robots) * sys.getsizeof((0, 0, 0))
+        )
+
+    @property
+    def nbytes(self) -> int:
+        # The estimated memory held by the keyframes and the records
+        records = len(self._records) * sys.getsizeof(self._records[0]) if self._records else 0
+        return sum(self._sizes) + sys.getsizeof(self._records) + records
+
+    @property
+    def end(self) -> int:
+        return self.start + len(self._records)
+
+    def __len__(self):
+        return len(self._records)
+
+    def append(self, record, entities: EntityStore):
+        """
+        Record a move applied on the game
+        :param record: the outcome of the move
+        :param entities: the roles of the game once the move is applied
+        """
+        self.extend([record], entities)
+
+    def extend(self, records: List, entities: EntityStore):
+        """
+        Record consecutive moves applied on the game at once
+        :param records: the outcomes of the moves in order
+        :param entities: the roles of the game once the last move is applied
+        """
+        if not records:
+            return
+        if records[0].move != self.end + 1:
+            # The game changed without a record, start over from its current state
+            self._reset(records[-1].move, entities)
+            return
+        self._records.extend(records)
+        if records[-1].move - self._moves[-1] >= self.interval:
+            self._keyframes.append(self._keyframe(records[-1].move, entities))
+            self._moves.append(records[-1].move)
+            self._sizes.append(self._keyframe_bytes(self._keyframes[-1]))
+
+        # Drop whole keyframe intervals so the history always starts on a keyframe
+        while (len(self._records) > self.max_moves or len(self._keyframes) > self.max_keyframes) \
+                and len(self._keyframes) > 1:
+            start = self._moves[1]
+            del self._records[:start - self.start]
+            del self._keyframes[0], self._moves[0], self._sizes[0]
+            self.start = start
+
+    def since(self, move: int) -> Optional[List]:
+        """
+        :param move: the number of moves a client knows of
+        :return: the records of the moves after it, None when the history does not hold them
+        """
+        if not self.start <= move <= self.end:
+            return None
+        return self._records[move - self.start:]
+
+    def state_at(self, move: int) -> Keyframe:
+        """
+        Rebuild the roles at a move from the closest keyframe before it
+        :param move: the number of moves
+        :return: the roles after this move
+        """
+        if not self.start <= move <= self.end:
+            raise ValueError(f"The history holds the moves {self.start} to {self.end}")
+        keyframe = self._keyframes[bisect_right(self._moves, move) - 1]
+        dinosaurs = dict.fromkeys(keyframe.dinosaurs)
+        robots = dict(keyframe.robots)
+        for record in self._records[keyframe.move - self.start:move - self.start]:
+            robots[record.robot_id] = (record.row, record.column, record.direction)
+            for kill in record.kills:
+                dinosaurs.pop(tuple(kill), None)
+        return Keyframe(move, tuple(dinosaurs), robots)
+
+    def board_at(self, move: int, rows: (int, int), columns: (int, int), dtype, life: int, power: int) -> np.ndarray:
+        """
+        Rebuild a window of the board at a move
+        :param move: the number of moves
+        :param rows: the first row and the row after the last one
+        :param columns: the first column and the column after the last one
+        :param dtype: the dtype of the board
+        :param life: the cell value of a dinosaur
+        :param power: the cell value of a robot
+        :return: the window of the board
+        """
+        state = self.state_at(move)
+        window = np.zeros((rows[1] - rows[0], columns[1] - columns[0]), dtype=dtype)
+        for value, positions in ((life, state.dinosaurs), (power, [robot[:2] for robot in state.robots.values()])):
+            for row, column in positions:
+                if rows[0] <= row < rows[1] and columns[0] <= column < columns[1]:
+                    window[row - rows[0], column - columns[0]] = value
+        return window
+
+    def frames(self, dim: int, dtype, life: int, power: int) -> Iterator[np.ndarray]:
+        """
+        Every board of the history in order, the records are captured when called
+        :param dim: dimension of the grid
+        :param dtype: the dtype of the board
+        :param life: the cell value of a dinosaur
+        :param power: the cell value of a robot
+        :return: the boards from the start of the history, the same buffer is updated between two frames
+        """
+        keyframe, records = self._keyframes[0], list(self._records)
+
+        def generate():
+            board = np.zeros((dim, dim), dtype=dtype)
+            robots = dict(keyframe.robots)
+            if keyframe.dinosaurs:
+                board[tuple(zip(*keyframe.dinosaurs))] = life
+            for row, column, _ in robots.values():
+                board[row, column] = power
+            yield board
+            for record in records:
+                row, column, _ = robots[record.robot_id]
+                board[row, column] = 0
+                board[record.row, record.column] = power
+                robots[record.robot_id] = (record.row, record.column, record.direction)
+                for kill in record.kills:
+                    board[tuple(kill)] += power
+                yield board
+
+        return generate()
@@ -11,6 +11,9 @@ class GamePayload(BaseModel):
     robots: List[Dict] = []
     dinosaurs_count: Optional[int] = None
     dinosaurs: Optional[List[tuple]] = []
+    seed: Optional[int] = None
+    # Keep the moves to rebuild past boards and answer with changes, the default is the app setting
+    history: Optional[bool] = None
 
 
 class RobotPayload(BaseModel):
@@ -21,6 +24,30 @@ class RobotPayload(BaseModel):
     command: int
 
 
+class BatchPayload(BaseModel):
+
+    """ The data model for operating robots with a script of commands """
+
+    steps: List[RobotPayload]
+    on_error: str = "stop"
+    verbose: bool = False
+
+
+class AutopilotPayload(BaseModel):
+
+    """ The data model for driving every robot toward the nearest dinosaur """
+
+    rounds: int = 1
+
+
+class TickPayload(BaseModel):
+
+    """ The data model for applying a command to every robot at once """
+
+    command: Optional[int] = None
+    commands: Optional[List[int]] = None
+
+
 class StartResponse(BaseModel):
 
     """ The response model of starting games """
@@ -31,6 +58,15 @@ class StartResponse(BaseModel):
     dinosaurs_position: List[tuple]
     robots: int
     robots_position: List[Dict]
+    version: int = 0
+
+
+class Changes(BaseModel):
+
+    """ The data model for what changed after a move number: the new placement of the robots, the destroyed dinosaurs """
+
+    robots: Dict[str, Dict]
+    killed: List[tuple]
 
 
 class PlayResponse(BaseModel):
@@ -42,11 +78,93 @@ class PlayResponse(BaseModel):
     command: int
     new_position: Dict[tuple, str]
     dinosaurs: int
-    dinosaurs_position: List[tuple]
+    version: int
+    dinosaurs_position: Optional[List[tuple]] = None
+    since: Optional[int] = None
+    changes: Optional[Changes] = None
+    resync: Optional[bool] = None
+    number_of_moves: int
+    all_dinosaurs_has_been_terminated: bool
+
+
+class BatchResponse(BaseModel):
+
+    """ The response model of operating robots in batch """
+
+    game_id: str
+    applied: int
+    failed: int
+    stopped_at: Optional[int]
+    results: List[Dict]
+    dinosaurs: int
+    version: int
+    dinosaurs_position: Optional[List[tuple]] = None
+    robots_position: Optional[List[Dict]] = None
+    since: Optional[int] = None
+    changes: Optional[Changes] = None
+    resync: Optional[bool] = None
     number_of_moves: int
     all_dinosaurs_has_been_terminated: bool
 
 
+class AutopilotResponse(BaseModel):
+
+    """ The data model for the response of the autopilot """
+
+    game_id: str
+    rounds: int
+    applied: int
+    dinosaurs: int
+    version: int
+    dinosaurs_position: Optional[List[tuple]] = None
+    robots_position: Optional[List[Dict]] = None
+    since: Optional[int] = None
+    changes: Optional[Changes] = None
+    resync: Optional[bool] = None
+    number_of_moves: int
+    all_dinosaurs_has_been_terminated: bool
+
+
+class TickResponse(BaseModel):
+
+    """ The data model for the response of a tick """
+
+    game_id: str
+    applied: int
+    blocked: int
+    dinosaurs: int
+    version: int
+    dinosaurs_position: Optional[List[tuple]] = None
+    robots_position: Optional[List[Dict]] = None
+    since: Optional[int] = None
+    changes: Optional[Changes] = None
+    resync: Optional[bool] = None
+    number_of_moves: int
+    all_dinosaurs_has_been_terminated: bool
+
+
+class MemoryReport(BaseModel):
+
+    """ The response model of the memory held by a game """
+
+    game_id: str
+    board_dtype: str
+    board_cells: int
+    board_bytes: int
+    entities_bytes: int
+    free_cells_bytes: int
+    total_bytes: int
+
+
+class SnapshotMessage(BaseModel):
+
+    """ The response model of saving a snapshot """
+
+    game_id: str
+    path: str
+    bytes: int
+
+
 class ErrorMessage(BaseModel):
 
     """ The response model of error """
@@ -61,3 +179,19 @@ class DeletionMessage(BaseModel):
 
     game_id: str
     is_deleted: bool
+
+
+class StoreStats(BaseModel):
+
+    """ The response model of the game store statistics """
+
+    games: int
+    total_bytes: int
+    hits: int
+    misses: int
+    evictions: int
+    max_games: Optional[int]
+    max_bytes: Optional[int]
+    ttl: Optional[float]
+    conflicts: Optional[int] = None
+    cached_games: Optional[int] = None
@@ -1,3 +1,4 @@
+from typing import Optional
 from functools import lru_cache
 from pydantic import BaseSettings
 
@@ -13,6 +14,84 @@ class APPSettings(BaseSettings):
 
     debug: bool = False
 
+    # Debug render of the board after every mutation, off by default as it formats the whole grid
+    board_dump: bool = False
+    # The minimum number of seconds between two board dumps
+    board_dump_interval: float = 1.0
+
+    # "memory" keeps the games in the process, "redis" shares them between workers through `redis_url`
+    store_backend: str = "memory"
+    redis_url: str = "redis://localhost:6379/0"
+    # The number of games a worker keeps decoded when the store is shared
+    store_cache_size: int = 128
+
+    # The limits of the in-memory game store, the least recently used games are evicted beyond them
+    store_max_games: Optional[int] = 1000
+    store_max_bytes: Optional[int] = 512 * 1024 * 1024
+    # The number of seconds an idle game is kept
+    store_ttl: Optional[float] = 24 * 60 * 60
+
+    # Grids with at least `sparse_min_cells` cells and at most `sparse_max_density` of them occupied
+    # are stored as a map from cell to value instead of a dense array
+    sparse_min_cells: int = 1000000
+    sparse_max_density: float = 0.005
+
+    # Binary snapshots of the games, one file per game
+    snapshot_dir: str = "snapshots"
+    # The number of seconds between two checkpoints of every game, 0 to disable
+    checkpoint_interval: float = 0
+    # Load the snapshots when the server starts, the boards are memory mapped
+    restore_on_startup: bool = False
+
+    # Journal every move to `journal_dir`, replayed on top of the snapshots, empty to disable
+    journal_dir: str = ""
+    # The pending records are written once there are `journal_group_size` or every `journal_flush_interval` seconds
+    journal_group_size: int = 64
+    journal_flush_interval: float = 1.0
+    journal_fsync: bool = False
+
+    # Keep the moves of the games to rebuild past boards, a game can also enable it when it starts,
+    # with a keyframe every `history_keyframe_interval` moves
+    history_enabled: bool = False
+    history_keyframe_interval: int = 256
+    history_max_moves: int = 100000
+    history_max_keyframes: int = 64
+    # The largest export of the history, in cells over all the boards
+    history_export_max_cells: int = 100000000
+
+    # The largest number of rounds of one autopilot request
+    autopilot_max_rounds: int = 10000
+
+    # The number of move messages waiting for a websocket client, the oldest are dropped beyond it
+    ws_queue_size: int = 256
+
+    # Every game keeps this many recent moves, the responses describe them as changes, a client further behind
+    # reloads the game
+    delta_max_moves: int = 1000
+
+    # Boards with more cells in the rendered window are streamed row by row
+    render_stream_cells: int = 250000
+    # The largest window that can be rendered, select a viewport on larger boards
+    render_max_cells: int = 25000000
+
+    # Profile a sampled fraction of the requests, and those with the `X-Profile-Token` header set to `profile_token`,
+    # empty to disable the header. The collapsed stacks of each route are appended to `profile_dir`
+    profile_sample_rate: float = 0.0
+    profile_token: str = ""
+    profile_dir: str = "profiles"
+    profile_interval: float = 0.001
+
+    # Logging, records are written to disk by a background thread when `log_queue` is on
+    log_file: str = "record.log"
+    log_level: str = "INFO"
+    # "text" or "json"
+    log_format: str = "text"
+    log_queue: bool = True
+    # The fraction of records below WARNING that are kept
+    log_sample_rate: float = 1.0
+    # The number of items kept when a large collection is logged
+    log_summary_limit: int = 10
+
 # Using cache to avoid loading setting configuration multiple times
 @lru_cache()
 def get_app_settings() -> APPSettings:
@@ -0,0 +1,96 @@
+from typing import Dict
+import sys
+import numpy as np
+
+
+def _is_index(key) -> bool:
+    return isinstance(key, (int, np.integer))
+
+
+class SparseBoard:
+
+    """ A board grid stored as a map from cell to value, the memory grows with the number of roles rather than dim² """
+
+    ndim = 2
+
+    def __init__(self, dim: int, dtype=np.int8):
+        self.dim = dim
+        self.shape = (dim, dim)
+        self.size = dim * dim
+        self.dtype = np.dtype(dtype)
+
+        # Row -> {column: value}, only the non-empty cells are kept
+        self._rows: Dict[int, Dict[int, int]] = {}
+        self._count = 0
+
+    def __repr__(self):
+        return f"SparseBoard(dim={self.dim}, occupied={self._count})"
+
+    @property
+    def nbytes(self) -> int:
+        # An estimate of the memory held by the maps
+        cell = sys.getsizeof(self.dim) * 2
+        return sys.getsizeof(self._rows) + sum(sys.getsizeof(cells) for cells in self._rows.values()) \
+            + cell * self._count
+
+    def count_nonzero(self) -> int:
+        return self._count
+
+    def __getitem__(self, key):
+        row, column = key
+        if _is_index(row) and _is_index(column):
+            cells = self._rows.get(int(row))
+            return cells.get(int(column), 0) if cells else 0
+
+        # A window of the grid is returned as a dense array
+        rows, columns = self._range(row), self._range(column)
+        window = np.zeros((len(rows), len(columns)), dtype=self.dtype)
+        for index, row_index in enumerate(rows):
+            for column_index, value in self._rows.get(row_index, {}).items():
+                if columns.start <= column_index < columns.stop:
+                    window[index, column_index - columns.start] = value
+        if _is_index(row):
+            window = window[0]
+        if _is_index(column):
+            window = window[..., 0]
+        return window
+
+    def __setitem__(self, key, value):
+        row, column = key
+        if _is_index(row) and _is_index(column):
+            self._set(int(row), int(column), value)
+            return
+        # Fancy assignment with sequences of rows and columns
+        for row_index, column_index in zip(row, column):
+            self._set(int(row_index), int(column_index), value)
+
+    def set_flat(self, cells: np.ndarray, value: int):
+        """
+        Write a value in cells given by their flat index
+        :param cells: the flat indices, row * dim + column
+        :param value: the value of the cells
+        """
+        rows, columns = np.divmod(cells, self.dim)
+        for row, column in zip(rows.tolist(), columns.tolist()):
+            self._set(row, column, value)
+
+    def _range(self, key) -> range:
+        if _is_index(key):
+            return range(int(key), int(key) + 1)
+        return range(*key.indices(self.dim))
+
+    def _set(self, row: int, column: int, value):
+        value = int(value)
+        cells = self._rows.get(row)
+        if value == 0:
+            if cells and column in cells:
+                del cells[column]
+                self._count -= 1
+                if not cells:
+                    del self._rows[row]
+            return
+        if cells is None:
+            cells = self._rows[row] = {}
+        if column not in cells:
+            self._count += 1
+        cells[column] = value
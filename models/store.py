@@ -0,0 +1,396 @@
+from typing import Callable, Optional, Dict, Iterator
+from collections import OrderedDict
+import threading
+import time
+import logging
+
+from models.game import Game
+from models.setting import APPSettings
+from services.serialize import dumps_game, loads_game
+
+logger = logging.getLogger(__name__)
+
+
+class GameStore:
+
+    """ Cache of the games by id, evicts the least recently used games beyond the limits """
+
+    def __init__(self, max_games: Optional[int] = None, max_bytes: Optional[int] = None,
+                 ttl: Optional[float] = None, clock=time.monotonic):
+        """
+        :param max_games: the maximum number of games, the default is unbounded
+        :param max_bytes: the maximum total size of the game boards in bytes, the default is unbounded
+        :param ttl: the number of seconds a game is kept without being used, the default is forever
+        :param clock: the time source of the idle time
+        """
+        self.max_games = max_games
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self._clock = clock
+
+        # Ordered from the least to the most recently used game
+        self._games: "OrderedDict[str, Game]" = OrderedDict()
+        self._last_used: Dict[str, float] = {}
+        self._bytes: Dict[str, int] = {}
+        self.total_bytes = 0
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        # Called with the id of every evicted game
+        self.on_evict: Optional[Callable[[str], None]] = None
+
+        # The sync route handlers run in a threadpool
+        self._lock = threading.RLock()
+
+    def __len__(self):
+        return len(self._games)
+
+    def __iter__(self) -> Iterator[str]:
+        with self._lock:
+            return iter(list(self._games))
+
+    def __contains__(self, game_id: str):
+        with self._lock:
+            self._expire()
+            return game_id in self._games
+
+    def __getitem__(self, game_id: str) -> Game:
+        game = self.get(game_id)
+        if game is None:
+            raise KeyError(game_id)
+        return game
+
+    def __setitem__(self, game_id: str, game: Game):
+        self.put(game_id, game)
+
+    def get(self, game_id: str) -> Optional[Game]:
+        """
+        Retrieve a game and mark it as recently used
+        :param game_id: a specified game id
+        :return: the game instance, None if it does not exist or was evicted
+        """
+        with self._lock:
+            self._expire()
+            game = self._games.get(game_id)
+            if game is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._touch(game_id)
+            return game
+
+    def peek(self, game_id: str) -> Optional[Game]:
+        """
+        Retrieve a game without marking it as used nor counting a hit
+        :param game_id: a specified game id
+        :return: the game instance, None if it does not exist
+        """
+        with self._lock:
+            return self._games.get(game_id)
+
+    def put(self, game_id: str, game: Game):
+        """
+        Store a game, the least recently used games are evicted to respect the limits
+        :param game_id: a specified game id
+        :param game: the game instance
+        """
+        nbytes = game.nbytes
+        if self.max_bytes is not None and nbytes > self.max_bytes:
+            logger.error("Game %s needs %s bytes, over the store limit of %s bytes", game_id, nbytes, self.max_bytes)
+            raise Exception("The game board is too big to be stored")
+
+        with self._lock:
+            self._discard(game_id)
+            self._games[game_id] = game
+            self._bytes[game_id] = nbytes
+            self.total_bytes += nbytes
+            self._touch(game_id)
+            self._expire()
+            while self.max_games is not None and len(self._games) > self.max_games:
+                self._evict()
+            while self.max_bytes is not None and self.total_bytes > self.max_bytes:
+                self._evict()
+
+    def save(self, game_id: str, game: Game):
+        """
+        Record the changes of a stored game, the store holds the instance so only its size is counted again.
+        A game which was removed, evicted or replaced meanwhile is left as it is
+        :param game_id: a specified game id
+        :param game: the game instance
+        """
+        with self._lock:
+            if self._games.get(game_id) is not game:
+                return
+            nbytes = game.nbytes
+            if nbytes == self._bytes[game_id]:
+                return
+            self.total_bytes += nbytes - self._bytes[game_id]
+            self._bytes[game_id] = nbytes
+            while self.max_bytes is not None and self.total_bytes > self.max_bytes:
+                self._evict()
+
+    def pop(self, game_id: str, *default) -> Game:
+        with self._lock:
+            if game_id not in self._games:
+                if default:
+                    return default[0]
+                raise KeyError(game_id)
+            game = self._games[game_id]
+            self._discard(game_id)
+            return game
+
+    def clear(self):
+        with self._lock:
+            self._games.clear()
+            self._last_used.clear()
+            self._bytes.clear()
+            self.total_bytes = 0
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "games": len(self._games),
+                "total_bytes": self.total_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "max_games": self.max_games,
+                "max_bytes": self.max_bytes,
+                "ttl": self.ttl,
+            }
+
+    def _touch(self, game_id: str):
+        self._games.move_to_end(game_id)
+        self._last_used[game_id] = self._clock()
+
+    def _discard(self, game_id: str):
+        if game_id in self._games:
+            del self._games[game_id]
+            del self._last_used[game_id]
+            self.total_bytes -= self._bytes.pop(game_id)
+
+    def _evict(self):
+        game_id = next(iter(self._games))
+        logger.info("Evict game %s", game_id)
+        self._discard(game_id)
+        self.evictions += 1
+        if self.on_evict is not None:
+            self.on_evict(game_id)
+
+    def _expire(self):
+        # The idle games are at the front of the LRU order
+        if self.ttl is None:
+            return
+        deadline = self._clock() - self.ttl
+        while self._games and self._last_used[next(iter(self._games))] < deadline:
+            self._evict()
+
+
+class GameConflict(Exception):
+
+    """ The game was changed by another worker since it was read """
+
+
+class RedisGameStore:
+
+    """ Games shared by all workers through a Redis compatible server, with a local cache of the games in use """
+
+    def __init__(self, client, ttl: Optional[float] = None, cache_size: int = 128, prefix: str = "game:"):
+        """
+        :param client: a redis.Redis compatible client
+        :param ttl: the number of seconds a game is kept without being used, the default is forever
+        :param cache_size: the maximum number of games kept in the local cache
+        :param prefix: the prefix of the keys of the games
+        """
+        self.client = client
+        self.ttl = ttl
+        self.cache_size = cache_size
+        self.prefix = prefix
+
+        # Game id -> (version, game), ordered from the least to the most recently used game
+        self._cache: "OrderedDict[str, tuple]" = OrderedDict()
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.conflicts = 0
+        self._lock = threading.RLock()
+
+    def _key(self, game_id: str) -> str:
+        return f"{self.prefix}{game_id}"
+
+    def __len__(self):
+        return sum(1 for _ in self.client.scan_iter(match=f"{self.prefix}*"))
+
+    def __iter__(self) -> Iterator[str]:
+        keys = self.client.scan_iter(match=f"{self.prefix}*")
+        return iter([(key.decode() if isinstance(key, bytes) else key)[len(self.prefix):] for key in keys])
+
+    def __contains__(self, game_id: str):
+        return bool(self.client.exists(self._key(game_id)))
+
+    def __getitem__(self, game_id: str) -> Game:
+        game = self.get(game_id)
+        if game is None:
+            raise KeyError(game_id)
+        return game
+
+    def __setitem__(self, game_id: str, game: Game):
+        self.put(game_id, game)
+
+    def get(self, game_id: str) -> Optional[Game]:
+        """
+        Retrieve a game, the local copy is used while nobody else changed the game
+        :param game_id: a specified game id
+        :return: the game instance, None if it does not exist or expired
+        """
+        key = self._key(game_id)
+        pipe = self.client.pipeline(transaction=False)
+        pipe.hget(key, "version")
+        if self.ttl is not None:
+            pipe.expire(key, int(self.ttl))
+        version = pipe.execute()[0]
+
+        with self._lock:
+            if version is None:
+                self._cache.pop(game_id, None)
+                self.misses += 1
+                return None
+            version = int(version)
+            cached = self._cache.get(game_id)
+            if cached is not None and cached[0] == version:
+                self.hits += 1
+                self._cache.move_to_end(game_id)
+                return cached[1]
+
+        # The game changed on another worker or isn't cached yet
+        data, version = self.client.hmget(key, "data", "version")
+        if data is None:
+            with self._lock:
+                self.misses += 1
+            return None
+        game = loads_game(data)
+        with self._lock:
+            self.misses += 1
+            self._cache_game(game_id, int(version), game)
+        return game
+
+    def peek(self, game_id: str) -> Optional[Game]:
+        return self.get(game_id)
+
+    def put(self, game_id: str, game: Game):
+        """
+        Store a game, fails if another worker changed it since this worker read it
+        :param game_id: a specified game id
+        :param game: the game instance
+        """
+        self._write(game_id, game, create=True)
+
+    def _write(self, game_id: str, game: Game, create: bool):
+        from redis.exceptions import WatchError
+
+        key = self._key(game_id)
+        with self._lock:
+            cached = self._cache.get(game_id)
+            expected = cached[0] if cached is not None and cached[1] is game else None
+        data = dumps_game(game)
+
+        with self.client.pipeline() as pipe:
+            try:
+                pipe.watch(key)
+                version = pipe.hget(key, "version")
+                version = int(version) if version is not None else None
+                if version is None and not create:
+                    # The game was removed meanwhile
+                    pipe.reset()
+                    return
+                if version != expected:
+                    raise GameConflict(f"Game ID '{game_id}' was changed by another worker")
+                pipe.multi()
+                pipe.hset(key, mapping={"data": data, "version": (version or 0) + 1})
+                if self.ttl is not None:
+                    pipe.expire(key, int(self.ttl))
+                pipe.execute()
+            except (GameConflict, WatchError) as e:
+                with self._lock:
+                    self.conflicts += 1
+                    # The local copy may hold changes which were not stored
+                    self._cache.pop(game_id, None)
+                logger.error("Game %s conflict on write", game_id)
+                raise GameConflict(f"Game ID '{game_id}' was changed by another worker") from e
+
+        with self._lock:
+            self._cache_game(game_id, (version or 0) + 1, game)
+
+    def save(self, game_id: str, game: Game):
+        """
+        Record the changes of a stored game, the other workers only see them once the game is written.
+        A game which was removed meanwhile is left out
+        :param game_id: a specified game id
+        :param game: the game instance
+        """
+        self._write(game_id, game, create=False)
+
+    def pop(self, game_id: str, *default) -> Game:
+        game = self.get(game_id)
+        with self._lock:
+            self._cache.pop(game_id, None)
+        self.client.delete(self._key(game_id))
+        if game is None:
+            if default:
+                return default[0]
+            raise KeyError(game_id)
+        return game
+
+    def clear(self):
+        keys = list(self.client.scan_iter(match=f"{self.prefix}*"))
+        if keys:
+            self.client.delete(*keys)
+        with self._lock:
+            self._cache.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "games": len(self),
+                "total_bytes": sum(game.nbytes for _, game in self._cache.values()),
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "conflicts": self.conflicts,
+                "cached_games": len(self._cache),
+                "max_games": None,
+                "max_bytes": None,
+                "ttl": self.ttl,
+            }
+
+    def _cache_game(self, game_id: str, version: int, game: Game):
+        self._cache[game_id] = (version, game)
+        self._cache.move_to_end(game_id)
+        while len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+            self.evictions += 1
+
+
+def create_game_store(settings: APPSettings):
+    """
+    Create the game store chosen by the settings
+    :param settings: the app settings
+    :return: a process local GameStore, or a RedisGameStore shared by all workers
+    """
+    if settings.store_backend == "redis":
+        # Only needed by multi-worker deployments, keep it out of the import path
+        import redis
+        return RedisGameStore(
+            redis.Redis.from_url(settings.redis_url),
+            ttl=settings.store_ttl,
+            cache_size=settings.store_cache_size,
+        )
+    if settings.store_backend != "memory":
+        raise Exception(f"Unsupported store backend '{settings.store_backend}'")
+    return GameStore(
+        max_games=settings.store_max_games,
+        max_bytes=settings.store_max_bytes,
+        ttl=settings.store_ttl,
+    )
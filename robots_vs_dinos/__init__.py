@@ -0,0 +1,4 @@
+""" Headless engine of the game, to run simulations without the API """
+from models.game import Game, MoveRecord
+from services.play import create_game, create_random_game
+from services.simulation import POLICIES, simulate, simulate_game, summarize_results, write_results
@@ -0,0 +1,38 @@
+from typing import List
+import argparse
+import json
+import sys
+
+from services.simulation import POLICIES, simulate, summarize_results, write_results
+
+
+def parse_args(argv: List[str]) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(prog="python -m robots_vs_dinos", description="Robots vs Dinosaurs, headless")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    run = commands.add_parser("simulate", help="Play many random games and write their statistics")
+    run.add_argument("--dim", type=int, default=50, help="grid dimension")
+    run.add_argument("--robots", type=int, default=10, help="the number of robots of each game")
+    run.add_argument("--dinos", type=int, default=10, help="the number of dinosaurs of each game")
+    run.add_argument("--policy", choices=sorted(POLICIES), default="greedy", help="how the robots are operated")
+    run.add_argument("--games", type=int, default=100, help="the number of games")
+    run.add_argument("--seed", type=int, default=0, help="the seed of the first game, the next ones follow")
+    run.add_argument("--max-ticks", type=int, default=10000, help="the largest number of ticks of a game")
+    run.add_argument("--workers", type=int, default=None, help="the number of processes, the default is every core")
+    run.add_argument("--output", default="simulation.csv", help="the statistics file, .csv or .parquet")
+    return parser.parse_args(argv)
+
+
+def main(argv: List[str] = None) -> int:
+    args = parse_args(sys.argv[1:] if argv is None else argv)
+    results = simulate(
+        args.games, args.dim, args.robots, args.dinos, policy=args.policy, seed=args.seed,
+        max_ticks=args.max_ticks, workers=args.workers,
+    )
+    write_results(results, args.output)
+    print(json.dumps(summarize_results(results), indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,173 @@
+from typing import Dict, Optional
+import asyncio
+import weakref
+import numpy as np
+
+from models.game import Game
+from services.play import _dispatch, BATCH_YIELD_EVERY
+from services.utils import COMMANDS, STEPS, TURN_RIGHT
+
+# The distance fields of the games, dropped with the games
+_FIELDS = weakref.WeakKeyDictionary()
+
+
+class DistanceField:
+
+    """ The number of steps from every cell to the nearest dinosaur, from a single BFS started at all of them.
+    The robots move all the time, they are not part of the field, a robot in the way is stepped around locally """
+
+    def __init__(self, dim: int, dinosaurs: np.ndarray):
+        """
+        :param dim: dimension of the grid
+        :param dinosaurs: the flat indices of the dinosaurs
+        """
+        self.dim = dim
+        dtype = np.int32 if dim * dim < np.iinfo(np.int32).max else np.int64
+        # -1 marks the cells which do not reach any dinosaur,
+        # `nearest` is the flat index of the dinosaur each cell is closest to
+        self.distance = np.full(dim * dim, -1, dtype=dtype)
+        self.nearest = np.full(dim * dim, -1, dtype=dtype)
+        self.sources = np.unique(np.asarray(dinosaurs, dtype=dtype))
+        self.distance[self.sources] = 0
+        self.nearest[self.sources] = self.sources
+        self._propagate(self.sources)
+
+    def _neighbors(self, cells: np.ndarray) -> (np.ndarray, np.ndarray):
+        # The cells next to each cell in the grid, along with the cell they are next to
+        dim, size = self.dim, self.dim * self.dim
+        column = cells % dim
+        edges = ((cells >= dim, -dim), (cells < size - dim, dim), (column > 0, -1), (column < dim - 1, 1))
+        neighbors = [cells[inside] + step for inside, step in edges]
+        parents = [cells[inside] for inside, _ in edges]
+        return np.concatenate(neighbors), np.concatenate(parents)
+
+    def _propagate(self, seeds: np.ndarray):
+        # Breadth-first search level by level from cells with a known distance, a seed joins the frontier at its level
+        if not len(seeds):
+            return
+        seeds = seeds[np.argsort(self.distance[seeds], kind="stable")]
+        levels = self.distance[seeds]
+        level, start = int(levels[0]), 0
+        frontier = seeds[:0]
+        while True:
+            end = int(np.searchsorted(levels, level, side="right"))
+            frontier, start = np.concatenate([frontier, seeds[start:end]]), end
+            if not len(frontier):
+                if start >= len(seeds):
+                    return
+                level = int(levels[start])
+                continue
+
+            cells, parents = self._neighbors(frontier)
+            unreached = self.distance[cells] == -1
+            cells, first = np.unique(cells[unreached], return_index=True)
+            self.distance[cells] = level + 1
+            self.nearest[cells] = self.nearest[parents[unreached][first]]
+            frontier, level = cells, level + 1
+
+    def remove(self, dinosaurs: np.ndarray):
+        """
+        Update the distances once dinosaurs are destroyed, only the cells they were the nearest to are searched again.
+        A path through the freed cells is not propagated to the other cells, their distance may stay an upper bound,
+        yet every cell keeps a neighbor one step closer
+        :param dinosaurs: the flat indices of the destroyed dinosaurs
+        """
+        if not len(dinosaurs):
+            return
+        stale = np.flatnonzero(np.isin(self.nearest, dinosaurs))
+        self.distance[stale] = -1
+        self.nearest[stale] = -1
+        self.sources = np.setdiff1d(self.sources, dinosaurs)
+
+        # The search restarts from the cells around the stale area, at their own distance
+        cells, _ = self._neighbors(stale)
+        seeds = np.unique(cells[self.distance[cells] >= 0])
+        self._propagate(seeds)
+
+    def at(self, position: (int, int)) -> int:
+        return int(self.distance[position[0] * self.dim + position[1]])
+
+
+def distance_field(game: Game) -> DistanceField:
+    """
+    The distance field of a game, updated with the dinosaurs destroyed since it was last used
+    :param game: game instance
+    :return: the distance field
+    """
+    if game.sparse:
+        raise Exception("The autopilot needs a dense board")
+    dinosaurs = np.array(
+        [row * game.dim + column for row, column in game.dinosaurs_position], dtype=np.int64
+    )
+    field = _FIELDS.get(game)
+    if field is None or field.dim != game.dim or len(np.setdiff1d(dinosaurs, field.sources)):
+        field = _FIELDS[game] = DistanceField(game.dim, dinosaurs)
+    else:
+        field.remove(np.setdiff1d(field.sources, dinosaurs))
+    return field
+
+
+def plan_command(game: Game, field: DistanceField, robot_id: str) -> Optional[str]:
+    """
+    The next command of a robot on its shortest path to a dinosaur
+    :param game: game instance
+    :param field: the distance field of the game
+    :param robot_id: the robot id
+    :return: the command, None when the robot cannot get closer
+    """
+    robot = game.robots[robot_id]
+    board = game.get_board()
+    neighbors = [(robot.row + row_step, robot.column + column_step) for row_step, column_step in STEPS]
+    inside = [game.is_in_grid(position) for position in neighbors]
+
+    # Attack as soon as a dinosaur is next to the robot
+    if any(ok and board[position] > 0 for ok, position in zip(inside, neighbors)):
+        return COMMANDS[4]
+
+    # The robot steps to the free neighbor closest to a dinosaur, around another robot in the way
+    distances = [
+        field.at(position) if ok and board[position] == 0 else -1 for ok, position in zip(inside, neighbors)
+    ]
+    reachable = [distance for distance in distances if distance >= 0]
+    if not reachable:
+        return None
+    closer = [code for code, distance in enumerate(distances) if distance == min(reachable)]
+
+    # Stepping forward or backward costs one command, a side step needs a turn first
+    ahead, behind = robot.direction, TURN_RIGHT[TURN_RIGHT[robot.direction]]
+    if ahead in closer:
+        return COMMANDS[0]
+    if behind in closer:
+        return COMMANDS[1]
+    return COMMANDS[2] if TURN_RIGHT[robot.direction] in closer else COMMANDS[3]
+
+
+async def run_autopilot(game: Game, rounds: int = 1) -> Dict:
+    """
+    Drive every robot toward its nearest reachable dinosaur, one command per robot in each round
+    :param game: game instance
+    :param rounds: the number of rounds
+    :return: the number of rounds run and of commands applied
+    """
+    applied, played = 0, 0
+    async with game.lock:
+        field = distance_field(game)
+        for played in range(1, rounds + 1):
+            moved = 0
+            for robot_id in list(game.robots):
+                command = plan_command(game, field, robot_id)
+                if command is None:
+                    continue
+                record = await _dispatch(game, robot_id, command)
+                if record.kills:
+                    # The next robots head for the dinosaurs left
+                    field.remove(np.array([row * game.dim + column for row, column in record.kills], dtype=np.int64))
+                moved += 1
+                if not (applied + moved) % BATCH_YIELD_EVERY:
+                    await asyncio.sleep(0)
+            applied += moved
+
+            # Stop once the game is over or no robot can get closer
+            if not moved or not game.dinosaurs_position:
+                break
+    return {"rounds": played, "applied": applied}
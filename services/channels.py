@@ -0,0 +1,122 @@
+from typing import Dict, Set, Tuple
+from collections import deque
+import asyncio
+import json
+import struct
+
+from models.game import MoveRecord
+from services.play import MOVE_HOOKS
+from services.utils import COMMANDS, DIRECTIONS
+
+# A binary command frame: the robot id and the command index, little-endian
+COMMAND_FRAME = struct.Struct("<qB")
+
+
+def encode_delta(record: MoveRecord) -> dict:
+    """
+    :param record: the outcome of a move
+    :return: the compact message of the move: count, robot, command, new position and direction, killed cells
+    """
+    return {
+        "m": record.move,
+        "r": record.robot_id,
+        "c": record.command,
+        "p": [record.row, record.column],
+        "d": DIRECTIONS[record.direction],
+        "k": [list(kill) for kill in record.kills],
+    }
+
+
+def decode_command(message: dict) -> Tuple[int, int]:
+    """
+    :param message: a websocket message, a [robot_id, command] JSON text or a packed binary frame
+    :return: the robot id and the command index
+    """
+    if message.get("bytes") is not None:
+        if len(message["bytes"]) != COMMAND_FRAME.size:
+            raise Exception(f"A binary frame is a packed robot id and command of {COMMAND_FRAME.size} bytes")
+        robot_id, command = COMMAND_FRAME.unpack(message["bytes"])
+    else:
+        frame = json.loads(message.get("text") or "null")
+        if not isinstance(frame, list) or len(frame) != 2:
+            raise Exception("A frame is a [robot_id, command] list")
+        robot_id, command = frame
+    if type(command) is not int or command not in range(len(COMMANDS)):
+        raise Exception(f"The command must be an index in {COMMANDS}")
+    return robot_id, command
+
+
+class Subscriber:
+
+    """ The pending messages of a connection, the oldest ones are dropped when the client does not keep up """
+
+    def __init__(self, game_id: str, queue_size: int = 256):
+        self.game_id = game_id
+        self.dropped = 0
+        self._messages = deque(maxlen=queue_size)
+        self._ready = asyncio.Event()
+
+    def __len__(self):
+        return len(self._messages)
+
+    def push(self, message: dict):
+        if len(self._messages) == self._messages.maxlen:
+            self.dropped += 1
+        self._messages.append(message)
+        self._ready.set()
+
+    async def get(self) -> dict:
+        """
+        Wait for the next message, a gap is reported first so the client knows to reload the game
+        :return: the message
+        """
+        while not self._messages:
+            self._ready.clear()
+            await self._ready.wait()
+        if self.dropped:
+            dropped, self.dropped = self.dropped, 0
+            return {"dropped": dropped}
+        return self._messages.popleft()
+
+
+class GameChannels:
+
+    """ The subscribers of the moves of every game, the moves are only encoded while someone listens """
+
+    def __init__(self, queue_size: int = 256):
+        """
+        :param queue_size: the number of pending messages of a subscriber
+        """
+        self.queue_size = queue_size
+        self._subscribers: Dict[str, Set[Subscriber]] = {}
+
+    def __len__(self):
+        return sum(len(subscribers) for subscribers in self._subscribers.values())
+
+    def subscribe(self, game_id: str) -> Subscriber:
+        if not self._subscribers:
+            MOVE_HOOKS.append(self.publish)
+        subscriber = Subscriber(game_id, self.queue_size)
+        self._subscribers.setdefault(game_id, set()).add(subscriber)
+        return subscriber
+
+    def unsubscribe(self, subscriber: Subscriber):
+        subscribers = self._subscribers.get(subscriber.game_id, set())
+        subscribers.discard(subscriber)
+        if not subscribers:
+            self._subscribers.pop(subscriber.game_id, None)
+        if not self._subscribers and self.publish in MOVE_HOOKS:
+            MOVE_HOOKS.remove(self.publish)
+
+    def publish(self, game_id: str, record: MoveRecord):
+        """
+        Send a move to the subscribers of its game, a move hook
+        :param game_id: the game id
+        :param record: the outcome of the move
+        """
+        subscribers = self._subscribers.get(game_id)
+        if not subscribers:
+            return
+        message = encode_delta(record)
+        for subscriber in subscribers:
+            subscriber.push(message)
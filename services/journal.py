@@ -0,0 +1,183 @@
+from typing import Dict, Iterator, List, Set
+import os
+import struct
+import logging
+import threading
+
+from models.game import Game, MoveRecord
+
+logger = logging.getLogger(__name__)
+
+# The extension of the journal files, one file per game named after its id
+JOURNAL_EXTENSION = ".journal"
+
+# move, robot id, command, row, column, direction, number of kills, followed by (row, column) per kill
+RECORD = struct.Struct("<qQBiiBH")
+KILL = struct.Struct("<ii")
+
+
+def pack_record(record: MoveRecord) -> bytes:
+    """
+    :param record: the outcome of a move
+    :return: the binary journal record
+    """
+    data = RECORD.pack(
+        record.move, int(record.robot_id), record.command, record.row, record.column, record.direction,
+        len(record.kills),
+    )
+    return data + b"".join(KILL.pack(*kill) for kill in record.kills)
+
+
+def read_journal(path: str) -> Iterator[MoveRecord]:
+    """
+    Read the records of a journal, a truncated last record is ignored
+    :param path: the path of the journal file
+    :return: the records in order
+    """
+    with open(path, "rb") as f:
+        data = f.read()
+    offset = 0
+    while offset + RECORD.size <= len(data):
+        move, robot_id, command, row, column, direction, count = RECORD.unpack_from(data, offset)
+        end = offset + RECORD.size + count * KILL.size
+        if end > len(data):
+            break
+        kills = tuple(KILL.unpack_from(data, offset + RECORD.size + n * KILL.size) for n in range(count))
+        yield MoveRecord(move, str(robot_id), command, row, column, direction, kills)
+        offset = end
+
+
+def replay_journal(game: Game, path: str) -> int:
+    """
+    Apply the journaled moves which are more recent than the game
+    :param game: the game instance, usually loaded from a snapshot
+    :param path: the path of the journal file
+    :return: the number of replayed moves
+    """
+    replayed = 0
+    if not os.path.exists(path):
+        return replayed
+    for record in read_journal(path):
+        if record.move > game.get_number_of_moves():
+            game.apply_record(record)
+            replayed += 1
+    return replayed
+
+
+class Journals:
+
+    """ Append-only journals of the moves, one per game, records are written to disk in groups by a writer thread """
+
+    def __init__(self, directory: str, group_size: int = 64, fsync: bool = False):
+        """
+        :param directory: the directory of the journal files
+        :param group_size: the number of pending records which triggers a write
+        :param fsync: force every write to the disk
+        """
+        self.directory = directory
+        self.group_size = group_size
+        self.fsync = fsync
+        self._pending: Dict[str, List[bytes]] = {}
+        self._removed: Set[str] = set()
+        self._count = 0
+
+        # The moves append from the event loop, the sync routes reset from the threadpool.
+        # `_lock` guards the pending records, `_write_lock` keeps the files in the order of the changes
+        self._lock = threading.Lock()
+        self._write_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._writer = None
+
+    def path(self, game_id: str) -> str:
+        return os.path.join(self.directory, f"{game_id}{JOURNAL_EXTENSION}")
+
+    def append(self, game_id: str, record: MoveRecord):
+        """
+        Append a record to the journal of a game, it is written with the next group
+        :param game_id: a specified game id
+        :param record: the outcome of a move
+        """
+        data = pack_record(record)
+        with self._lock:
+            self._pending.setdefault(game_id, []).append(data)
+            self._count += 1
+            full = self._count >= self.group_size
+        if full:
+            self._write_soon()
+
+    def flush(self):
+        """ Remove the reset journals, then write the pending records of every game """
+        with self._write_lock:
+            with self._lock:
+                pending, self._pending, self._count = self._pending, {}, 0
+                removed, self._removed = self._removed, set()
+            for game_id in removed:
+                if os.path.exists(self.path(game_id)):
+                    os.remove(self.path(game_id))
+            if not pending:
+                return
+            os.makedirs(self.directory, exist_ok=True)
+            for game_id, records in pending.items():
+                with open(self.path(game_id), "ab") as f:
+                    f.write(b"".join(records))
+                    if self.fsync:
+                        f.flush()
+                        os.fsync(f.fileno())
+
+    def reset(self, game_id: str):
+        """
+        Drop the journal of a game, e.g. once a snapshot covers all of its moves or the game is removed.
+        The file is removed by the next write, before the records appended after the reset
+        :param game_id: a specified game id
+        """
+        with self._lock:
+            self._count -= len(self._pending.pop(game_id, []))
+            self._removed.add(game_id)
+        self._write_soon()
+
+    def recover(self, game: Game) -> int:
+        """
+        Bring a game loaded from a snapshot up to date with its journal
+        :param game: the game instance
+        :return: the number of replayed moves
+        """
+        self.flush()
+        with self._write_lock:
+            return replay_journal(game, self.path(str(game.game_id)))
+
+    def start(self, interval: float = 1.0) -> "Journals":
+        """
+        Start the writer thread, it writes every interval and as soon as a group is full
+        :param interval: the number of seconds between two writes, only full groups are written when not positive
+        :return: the journals
+        """
+        self._stop.clear()
+        self._writer = threading.Thread(target=self._run, args=(interval,), name="journal-writer", daemon=True)
+        self._writer.start()
+        return self
+
+    def stop(self):
+        """ Stop the writer thread and write the pending records """
+        if self._writer is not None:
+            self._stop.set()
+            self._wake.set()
+            self._writer.join()
+            self._writer = None
+        self.flush()
+
+    def _write_soon(self):
+        # Without the writer thread, e.g. in scripts, the caller writes
+        if self._writer is None:
+            self.flush()
+        else:
+            self._wake.set()
+
+    def _run(self, interval: float):
+        while not self._stop.is_set():
+            self._wake.wait(interval if interval > 0 else None)
+            self._wake.clear()
+            try:
+                self.flush()
+            except Exception as e:
+                logger.error("Journal flush failed: %s", e)
@@ -0,0 +1,118 @@
+import atexit
+import json
+import queue
+import random
+import logging
+from logging.handlers import QueueHandler, QueueListener
+
+from models.setting import APPSettings
+
+# The background writer of the queue mode, only one per process
+_listener = None
+
+
+class JSONFormatter(logging.Formatter):
+
+    """ Format a record as one JSON line, a dict argument is kept as structured data """
+
+    def format(self, record: logging.LogRecord) -> str:
+        payload = {
+            "time": self.formatTime(record, self.datefmt),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        if isinstance(record.args, dict):
+            payload["data"] = record.args
+        if record.exc_info:
+            payload["exc_info"] = self.formatException(record.exc_info)
+        return json.dumps(payload, default=str)
+
+
+class SamplingFilter(logging.Filter):
+
+    """ Keep a fraction of the records below WARNING, warnings and errors are always kept """
+
+    def __init__(self, rate: float):
+        super().__init__()
+        self.rate = rate
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        return record.levelno >= logging.WARNING or self.rate >= 1 or random.random() < self.rate
+
+
+class DeferredQueueHandler(QueueHandler):
+
+    """ Enqueue records as they are, the message is only formatted by the background writer """
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # The queue stays in process, so the record doesn't need to be formatted and pickled
+        return record
+
+
+def summarize(payload: dict, limit: int = 10) -> dict:
+    """
+    Summarize a payload for logging, the large collections are replaced by their size and first items
+    :param payload: the payload to log
+    :param limit: the maximum number of items kept in a collection
+    :return: a shallow summary of the payload, the collections are copied as the record is formatted later
+    """
+    summary = {}
+    for key, value in payload.items():
+        if isinstance(value, (list, tuple, set, dict)):
+            items = list(value.items() if isinstance(value, dict) else value)
+            if len(items) > limit:
+                value = {"count": len(items), "head": items[:limit]}
+            else:
+                # The game keeps changing the live collection while the writer thread waits to format it
+                value = dict(items) if isinstance(value, dict) else type(value)(items)
+        summary[key] = value
+    return summary
+
+
+def setup_logging(settings: APPSettings) -> logging.Logger:
+    """
+    Configure the root logger from the app settings
+    :param settings: the app settings
+    :return: the root logger
+    """
+    global _listener
+    root = logging.getLogger()
+    root.setLevel(settings.log_level.upper())
+
+    stop_logging()
+    for handler in list(root.handlers):
+        if getattr(handler, "_app_handler", False):
+            root.removeHandler(handler)
+            handler.close()
+
+    if settings.log_format == "json":
+        formatter = JSONFormatter(datefmt='%Y-%m-%d %H:%M:%S')
+    else:
+        formatter = logging.Formatter('%(asctime)s %(levelname)-8s %(message)s', datefmt='%Y-%m-%d %H:%M:%S')
+    file_handler = logging.FileHandler(settings.log_file)
+    file_handler.setFormatter(formatter)
+
+    handler = file_handler
+    if settings.log_queue:
+        # Requests only enqueue records, the writer thread formats them and writes to disk
+        handler = DeferredQueueHandler(queue.SimpleQueue())
+        _listener = QueueListener(handler.queue, file_handler)
+        _listener.start()
+    if settings.log_sample_rate < 1:
+        handler.addFilter(SamplingFilter(settings.log_sample_rate))
+
+    handler._app_handler = True
+    root.addHandler(handler)
+    return root
+
+
+@atexit.register
+def stop_logging():
+    """ Flush the pending records and stop the background writer of the queue mode """
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        for handler in _listener.handlers:
+            handler.close()
+        _listener = None
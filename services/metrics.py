@@ -0,0 +1,167 @@
+from typing import Callable, Dict, List, Sequence, Tuple
+from bisect import bisect_left
+import time
+
+# The upper bounds in seconds of the latency buckets, from 100us to 10s
+LATENCY_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+# The content type of the Prometheus text format
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+def _labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    pairs = [f'{name}="{value}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class Counter:
+
+    """ A monotonic counter per set of label values, updated without a lock """
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        # A counter without labels is reported from the start
+        self._values: Dict[Tuple[str, ...], float] = {} if self.labelnames else {(): 0}
+
+    def inc(self, *labels: str, amount: float = 1):
+        # A single dict update under the GIL, a concurrent increment may rarely be lost
+        self._values[labels] = self._values.get(labels, 0) + amount
+
+    def value(self, *labels: str) -> float:
+        return self._values.get(labels, 0)
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} counter"]
+        for labels, value in list(self._values.items()):
+            lines.append(f"{self.name}{_labels(self.labelnames, labels)} {value}")
+        return lines
+
+
+class Gauge:
+
+    """ A value read when the metrics are collected """
+
+    def __init__(self, name: str, documentation: str, read: Callable[[], float]):
+        self.name = name
+        self.documentation = documentation
+        self.read = read
+
+    def render(self) -> List[str]:
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} gauge", f"{self.name} {self.read()}"]
+
+
+class Histogram:
+
+    """ Counts of observations per bucket, the buckets of a set of label values are allocated once """
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = LATENCY_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets)
+        # Per set of label values: the count of each bucket, the last one is +Inf, then the sum
+        self._series: Dict[Tuple[str, ...], List[float]] = {}
+
+    def labels(self, *labels: str) -> List[float]:
+        """
+        The series of a set of label values, keep it to observe without a lookup
+        :param labels: the label values
+        :return: the bucket counts followed by the sum
+        """
+        series = self._series.get(labels)
+        if series is None:
+            series = self._series.setdefault(labels, [0] * (len(self.buckets) + 2))
+        return series
+
+    def observe(self, value: float, *labels: str):
+        self.observe_series(self.labels(*labels), value)
+
+    def observe_series(self, series: List[float], value: float):
+        series[bisect_left(self.buckets, value)] += 1
+        series[-1] += value
+
+    def count(self, *labels: str) -> int:
+        return int(sum(self.labels(*labels)[:-1]))
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        bounds = [str(bound) for bound in self.buckets] + ["+Inf"]
+        for labels, series in list(self._series.items()):
+            series = list(series)
+            cumulative = 0
+            for bound, count in zip(bounds, series):
+                cumulative += count
+                le = f'le="{bound}"'
+                lines.append(f"{self.name}_bucket{_labels(self.labelnames, labels, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{_labels(self.labelnames, labels)} {series[-1]}")
+            lines.append(f"{self.name}_count{_labels(self.labelnames, labels)} {cumulative}")
+        return lines
+
+
+class Registry:
+
+    """ The metrics exposed by the service """
+
+    def __init__(self):
+        self.metrics = []
+
+    def register(self, metric):
+        self.metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        lines = []
+        for metric in self.metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+REQUEST_SECONDS = REGISTRY.register(Histogram(
+    "rvd_request_duration_seconds", "Time to serve a request, by route", ("method", "route", "status")
+))
+COMMAND_SECONDS = REGISTRY.register(Histogram(
+    "rvd_command_duration_seconds", "Time to apply a robot command in the engine", ("command",)
+))
+GAMES_STARTED = REGISTRY.register(Counter("rvd_games_started_total", "Games created"))
+GAMES_COMPLETED = REGISTRY.register(Counter("rvd_games_completed_total", "Games whose dinosaurs were all destroyed"))
+ERRORS = REGISTRY.register(Counter("rvd_errors_total", "Errors reported to the clients, by exception type", ("type",)))
+
+
+class MetricsMiddleware:
+
+    """ ASGI middleware timing every http request, labelled with the route template rather than the path """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status = [500]
+
+        async def send_status(message):
+            if message["type"] == "http.response.start":
+                status[0] = message["status"]
+            await send(message)
+
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_status)
+        except Exception as e:
+            ERRORS.inc(type(e).__name__)
+            raise
+        finally:
+            # The router sets the matched route in the scope, unmatched paths share a label
+            route = scope.get("route")
+            REQUEST_SECONDS.observe(
+                time.perf_counter() - started, scope["method"], getattr(route, "path", "unmatched"), str(status[0])
+            )
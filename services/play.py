@@ -1,19 +1,41 @@
-from typing import List, Dict
-from models.game import Game
-from services.utils import COMMANDS
+from typing import List, Dict, Tuple, Callable, Optional
+import asyncio
+import logging
+import time
+import numpy as np
+from models.game import Game, MoveRecord
+from services.metrics import COMMAND_SECONDS, GAMES_COMPLETED, GAMES_STARTED
+from services.utils import COMMANDS, DIRECTIONS
 
+logger = logging.getLogger(__name__)
 
-def create_random_game(dim: int, **kargs) -> Game:
+# How a batch of commands handles a failed step
+BATCH_ERROR_POLICIES = ("stop", "skip")
+
+# Callables run with (game id, record) after every successful move, e.g. to journal it
+MOVE_HOOKS: List[Callable[[str, MoveRecord], None]] = []
+
+# The timing series of every command, allocated once
+COMMAND_SERIES = {command: COMMAND_SECONDS.labels(command) for command in COMMANDS + ["tick"]}
+
+# A batch of commands yields to the event loop every this many steps, so the other games keep running
+BATCH_YIELD_EVERY = 256
+
+
+def create_random_game(dim: int, seed: int = None, **kargs) -> Game:
     """
-    Create a random game instance
+    Create a random game instance, all roles are placed with one vectorized draw
     :param dim: grid dimension
+    :param seed: the seed of the random placement, set it to reproduce a game
     :param kargs: robots_count, dinosaurs_count
     :return: the game instance
     """
     if not dim:
         raise TypeError("Dimension is necessary")
-    game = Game(dim)
-    game.set_random_game(**kargs)
+    entities = (kargs.get("robots_count") or 1) + (kargs.get("dinosaurs_count") or 1)
+    game = Game(dim, entities=entities)
+    game.set_random_game(seed=seed, **kargs)
+    GAMES_STARTED.inc()
     return game
 
 
@@ -27,7 +49,7 @@ def create_game(dim: int, robots: List[Dict], dinosaurs: List[tuple]) -> Game:
     """
     if not dim or not robots or not dinosaurs:
         raise TypeError("All variables are necessary")
-    game = Game(dim)
+    game = Game(dim, entities=len(robots) + len(dinosaurs))
     for row, col in dinosaurs:
         game.set_dinosaurs(row=row, column=col)
 
@@ -37,6 +59,7 @@ def create_game(dim: int, robots: List[Dict], dinosaurs: List[tuple]) -> Game:
         game.set_robots(row=row, column=col, direction=direction)
 
     game.initial_placement()
+    GAMES_STARTED.inc()
     return game
 
 
@@ -48,7 +71,16 @@ async def move_robot(game: Game, robot_id: str, command: str) -> Game:
     :param command: the commands to move the robot
     :return: the game instance
     """
+    # Moves within a game are applied one at a time, in arrival order
+    async with game.lock:
+        await _dispatch(game, robot_id, command)
+    return game
+
 
+async def _dispatch(game: Game, robot_id: str, command: str) -> MoveRecord:
+    history = game.history
+    kills = ()
+    started = time.perf_counter()
     if command == COMMANDS[0]:
         await game.move_robot_forward(robot_id)
 
@@ -62,9 +94,122 @@ async def move_robot(game: Game, robot_id: str, command: str) -> Game:
         await game.turn_robot_left(robot_id)
 
     elif command == COMMANDS[4]:
-        await game.attack(robot_id)
+        kills = tuple(await game.attack(robot_id))
 
     else:
         raise Exception("Unsupported command")
+    COMMAND_SECONDS.observe_series(COMMAND_SERIES[command], time.perf_counter() - started)
+    if kills and not game.dinosaurs_position:
+        GAMES_COMPLETED.inc()
 
-    return game
+    robot = game.robots[robot_id]
+    record = MoveRecord(
+        game.get_number_of_moves(), robot_id, COMMANDS.index(command), robot.row, robot.column, robot.direction, kills
+    )
+    if history is not None:
+        history.append(record, game.entities)
+    game.remember_moves([record])
+    _emit(game, [record])
+    return record
+
+
+def _emit(game: Game, records: List[MoveRecord]):
+    # Pass the applied moves to the hooks
+    for hook in MOVE_HOOKS:
+        for record in records:
+            # The move is applied already, a failing hook must not report it as failed
+            try:
+                hook(str(game.game_id), record)
+            except Exception as e:
+                logger.error("Move hook %s failed: %s", hook, e)
+
+
+def game_changes(game: Game, since: int, max_moves: int) -> Optional[Dict]:
+    """
+    The robots and the dinosaurs changed after a move number
+    :param game: game instance
+    :param since: the number of moves the client knows of
+    :param max_moves: the largest number of moves to describe, beyond it reloading the game is cheaper
+    :return: the new placement of the moved robots and the destroyed dinosaurs,
+        None when the client has to reload, e.g. the moves are neither recent nor in the history
+    """
+    records = game.recent_moves(since)
+    history = game.history
+    if records is None and history is not None:
+        records = history.since(since)
+    if records is None or len(records) > max_moves:
+        return None
+    robots, killed = {}, []
+    for record in records:
+        robots[record.robot_id] = {"coordinate": (record.row, record.column), "direction": DIRECTIONS[record.direction]}
+        killed.extend(record.kills)
+    return {"robots": robots, "killed": killed}
+
+
+def resolve_robot_id(game: Game, robot_id) -> str:
+    """
+    Find the robot to operate, fall back to the first robot if the id is unknown
+    :param game: game instance
+    :param robot_id: the requested robot id
+    :return: the robot id in the game
+    """
+    chose_robot = str(robot_id)
+    if chose_robot not in game.robots:
+        chose_robot = next(iter(game.robots))
+    return chose_robot
+
+
+async def run_commands(game: Game, steps: List[Tuple[int, int]], on_error: str = "stop") -> List[Dict]:
+    """
+    Operate robots following an ordered script of commands in a single pass
+    :param game: game instance
+    :param steps: ordered list of (robot id, command index)
+    :param on_error: "stop" to abort at the first failed step, "skip" to carry on with the next step
+    :return: the result of every executed step
+    """
+    if on_error not in BATCH_ERROR_POLICIES:
+        raise Exception(f"Unsupported error policy '{on_error}', choose one of {BATCH_ERROR_POLICIES}")
+
+    # The whole script holds the game, other moves on it wait until the script ends
+    async with game.lock:
+        return await _run_commands(game, steps, on_error)
+
+
+async def _run_commands(game: Game, steps: List[Tuple[int, int]], on_error: str) -> List[Dict]:
+    results = []
+    for step, (robot_id, command_index) in enumerate(steps):
+        if step and not step % BATCH_YIELD_EVERY:
+            await asyncio.sleep(0)
+        chose_robot = resolve_robot_id(game, robot_id)
+        result = {"step": step, "robot_id": chose_robot, "command": command_index, "ok": True}
+        try:
+            if command_index not in range(len(COMMANDS)):
+                raise Exception(f"Invalid command: {command_index}")
+            await _dispatch(game, chose_robot, COMMANDS[command_index])
+        except Exception as e:
+            result.update(ok=False, detail=str(e))
+            results.append(result)
+            if on_error == "stop":
+                break
+            continue
+        results.append(result)
+
+    return results
+
+
+async def run_tick(game: Game, commands) -> np.ndarray:
+    """
+    Apply a command to every robot at once
+    :param game: game instance
+    :param commands: a command index for all robots, or one per robot in the order of `robots`, -1 skips a robot
+    :return: the mask of the robots whose command was applied
+    """
+    async with game.lock:
+        remaining = len(game.dinosaurs_position)
+        started = time.perf_counter()
+        applied, records = game.tick(commands, records=bool(MOVE_HOOKS))
+        COMMAND_SECONDS.observe_series(COMMAND_SERIES["tick"], time.perf_counter() - started)
+        if remaining and not game.dinosaurs_position:
+            GAMES_COMPLETED.inc()
+        _emit(game, records)
+    return applied
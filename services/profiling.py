@@ -0,0 +1,224 @@
+from typing import Dict, List, Optional
+from collections import Counter
+from contextvars import ContextVar
+from functools import wraps
+import argparse
+import asyncio
+import hmac
+import importlib
+import os
+import random
+import sys
+import threading
+import time
+
+# The header an admin sends with the profiling token to profile a request
+PROFILE_HEADER = b"x-profile-token"
+
+# Set by the middleware for the requests selected for profiling
+_PROFILE_REQUEST: ContextVar[bool] = ContextVar("profile_request", default=False)
+
+# Serialize the writes of the collapsed stacks of concurrent requests
+_write_lock = threading.Lock()
+
+
+def _name(frame) -> str:
+    return f"{frame.f_globals.get('__name__', '?')}:{frame.f_code.co_name}"
+
+
+def collapse(frame, root=None) -> str:
+    """
+    :param frame: the innermost frame of a stack
+    :param root: the outermost frame to keep, the default is the bottom of the stack
+    :return: the stack in the collapsed format of flamegraph.pl, outermost first, "module:function" separated by ";"
+    """
+    names = []
+    while frame is not None:
+        names.append(_name(frame))
+        if frame is root:
+            break
+        frame = frame.f_back
+    return ";".join(reversed(names))
+
+
+def task_frames(task: asyncio.Task) -> List:
+    """
+    :param task: an asyncio task
+    :return: the frames of the coroutines the task awaits, outermost first, empty once the task is done
+    """
+    frames = []
+    coro = task.get_coro()
+    while coro is not None:
+        frame = getattr(coro, "cr_frame", None) or getattr(coro, "gi_frame", None)
+        if frame is None:
+            break
+        frames.append(frame)
+        coro = getattr(coro, "cr_await", None) or getattr(coro, "gi_yieldfrom", None)
+    return frames
+
+
+class StackSampler:
+
+    """ Sample the stack of a thread, or of an asyncio task, at a fixed interval from a background thread """
+
+    def __init__(self, thread_id: int, interval: float = 0.001, task: Optional[asyncio.Task] = None):
+        """
+        :param thread_id: the id of the thread to sample, the thread of the event loop for a task
+        :param interval: the number of seconds between two samples
+        :param task: only sample this task, the event loop thread runs the other requests too
+        """
+        self.thread_id = thread_id
+        self.interval = interval
+        self.task = task
+        self.stacks = Counter()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="stack-sampler", daemon=True)
+
+    def sample(self):
+        """ Count the current stack of the thread, or of the task """
+        frame = sys._current_frames().get(self.thread_id)
+        if self.task is None:
+            if frame is not None:
+                self.stacks[collapse(frame)] += 1
+            return
+
+        chain = task_frames(self.task)
+        if not chain:
+            return
+        # The task runs when its innermost coroutine is on the stack of the thread, otherwise it awaits
+        running = frame
+        while running is not None and running is not chain[-1]:
+            running = running.f_back
+        if running is not None:
+            self.stacks[collapse(frame, root=chain[0])] += 1
+        else:
+            self.stacks[";".join(map(_name, chain))] += 1
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.sample()
+
+    def start(self) -> "StackSampler":
+        self._thread.start()
+        return self
+
+    def stop(self) -> Counter:
+        self._stop.set()
+        self._thread.join()
+        return self.stacks
+
+
+def write_collapsed(stacks: Counter, path: str):
+    """
+    Append the stacks to a collapsed-stack file, flamegraph.pl sums the repeated stacks
+    :param stacks: the number of samples of every stack
+    :param path: the output file
+    """
+    if not stacks:
+        return
+    lines = "".join(f"{stack} {count}\n" for stack, count in stacks.items())
+    with _write_lock:
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with open(path, "a") as f:
+            f.write(lines)
+
+
+class ProfilingMiddleware:
+
+    """ ASGI middleware selecting the requests to profile, a sampled fraction or the ones with the admin token """
+
+    def __init__(self, app, settings):
+        """
+        :param app: the ASGI app
+        :param settings: the app settings, `profile_sample_rate` and `profile_token` are read on every request
+        """
+        self.app = app
+        self.settings = settings
+
+    def _selected(self, scope) -> bool:
+        token = self.settings.profile_token
+        if token:
+            for name, value in scope.get("headers", ()):
+                if name == PROFILE_HEADER and hmac.compare_digest(value, token.encode()):
+                    return True
+        rate = self.settings.profile_sample_rate
+        return rate > 0 and random.random() < rate
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not self._selected(scope):
+            await self.app(scope, receive, send)
+            return
+        reset = _PROFILE_REQUEST.set(True)
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            _PROFILE_REQUEST.reset(reset)
+
+
+def profiled(name: str, settings):
+    """
+    Profile an endpoint in the requests selected by the middleware, the thread running it is sampled
+    :param name: the name of the collapsed-stack file of the endpoint
+    :param settings: the app settings, `profile_dir` and `profile_interval` are read on every profiled request
+    :return: the decorator
+    """
+    def start(task: Optional[asyncio.Task] = None) -> Optional[StackSampler]:
+        if not _PROFILE_REQUEST.get():
+            return None
+        return StackSampler(threading.get_ident(), settings.profile_interval, task).start()
+
+    def finish(sampler: Optional[StackSampler]):
+        if sampler is not None:
+            write_collapsed(sampler.stop(), os.path.join(settings.profile_dir, f"{name}.collapsed"))
+
+    def decorate(endpoint):
+        # Sync endpoints run in the threadpool, their own thread is sampled.
+        # Async endpoints share the event loop thread, only the task of the request is sampled, its awaits included
+        if asyncio.iscoroutinefunction(endpoint):
+            @wraps(endpoint)
+            async def wrapper(*args, **kwargs):
+                sampler = start(asyncio.current_task())
+                try:
+                    return await endpoint(*args, **kwargs)
+                finally:
+                    finish(sampler)
+        else:
+            @wraps(endpoint)
+            def wrapper(*args, **kwargs):
+                sampler = start()
+                try:
+                    return endpoint(*args, **kwargs)
+                finally:
+                    finish(sampler)
+        return wrapper
+
+    return decorate
+
+
+def profile_startup(output: str, interval: float = 0.0005) -> Dict:
+    """
+    Profile the import of the app and the loading of the settings, in a fresh process
+    :param output: the collapsed-stack file
+    :param interval: the number of seconds between two samples
+    :return: the seconds spent in each step
+    """
+    if os.path.exists(output):
+        os.remove(output)
+    sampler = StackSampler(threading.get_ident(), interval).start()
+    started = time.perf_counter()
+    from models.setting import get_app_settings
+    get_app_settings.cache_clear()
+    get_app_settings()
+    settings_seconds = time.perf_counter() - started
+    importlib.import_module("main")
+    seconds = time.perf_counter() - started
+    write_collapsed(sampler.stop(), output)
+    return {"settings_seconds": settings_seconds, "import_seconds": seconds - settings_seconds}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(prog="python -m services.profiling", description="Profile the app startup")
+    parser.add_argument("--output", default="profiles/startup.collapsed", help="the collapsed-stack file")
+    parser.add_argument("--interval", type=float, default=0.0005, help="the number of seconds between two samples")
+    args = parser.parse_args()
+    print(profile_startup(args.output, args.interval))
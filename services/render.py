@@ -0,0 +1,78 @@
+from typing import Iterator, Optional
+from html import escape
+import numpy as np
+
+# The markup of the cells which are not a number on the board
+EMPTY_CELL = "      <td></td>\n"
+
+
+def clamp_viewport(dim: int, start: Optional[int] = None, end: Optional[int] = None) -> (int, int):
+    """
+    Clamp a window of rows or columns to the grid
+    :param dim: dimension of the grid
+    :param start: the first row or column, the default is 0
+    :param end: the row or column after the last one, the default is the grid edge
+    :return: the (start, end) of the window within the grid
+    """
+    start = min(max(start or 0, 0), dim)
+    end = dim if end is None else min(max(end, start), dim)
+    return start, end
+
+
+def render_board_html(game_id: str, board: np.ndarray, dim: int,
+                      rows: (int, int) = None, columns: (int, int) = None,
+                      origin: (int, int) = (0, 0)) -> Iterator[str]:
+    """
+    Render the game board as an HTML table, one chunk per table row
+    :param game_id: a specified game id
+    :param board: the game board presented by numpy 2d array
+    :param dim: dimension of the grid
+    :param rows: the (start, end) window of rows to render, the default is the whole grid
+    :param columns: the (start, end) window of columns to render, the default is the whole grid
+    :param origin: the (row, column) of board[0, 0] in the grid, when board is a copied window of the grid
+    :return: the chunks of the html table
+    """
+    row_start, row_end = rows or (0, dim)
+    column_start, column_end = columns or (0, dim)
+    row_origin, column_origin = origin
+
+    header = "".join(f'      <th style="min-width: 30px;">{column}</th>\n' for column in range(column_start, column_end))
+    yield (
+        f'<table border="1" class="dataframe table table-striped" id="{escape(str(game_id))}">\n'
+        "  <thead>\n"
+        '    <tr style="text-align: center;">\n'
+        '      <th style="min-width: 30px;"></th>\n'
+        f"{header}"
+        "    </tr>\n"
+        "  </thead>\n"
+        "  <tbody>\n"
+    )
+
+    # Cells hold a handful of distinct values, format each one once
+    cells = {0: EMPTY_CELL}
+    for row in range(row_start, row_end):
+        values = board[row - row_origin, column_start - column_origin:column_end - column_origin].tolist()
+        for value in set(values).difference(cells):
+            cells[value] = f"      <td>{value}</td>\n"
+        yield f"    <tr>\n      <th>{row}</th>\n{''.join(map(cells.__getitem__, values))}    </tr>\n"
+
+    yield (
+        "  </tbody>\n"
+        "</table>\n"
+        f"<p>{row_end - row_start} rows × {column_end - column_start} columns</p>"
+    )
+
+
+def create_html(game_id: str, board: np.ndarray, dim: int,
+                rows: (int, int) = None, columns: (int, int) = None, origin: (int, int) = (0, 0)) -> str:
+    """
+    Display game board in HTML format
+    :param game_id: a specified game id
+    :param board: the game board presented by numpy 2d array
+    :param dim: dimension of the grid
+    :param rows: the (start, end) window of rows to render, the default is the whole grid
+    :param columns: the (start, end) window of columns to render, the default is the whole grid
+    :param origin: the (row, column) of board[0, 0] in the grid, when board is a copied window of the grid
+    :return: html
+    """
+    return "".join(render_board_html(game_id, board, dim, rows=rows, columns=columns, origin=origin))
@@ -0,0 +1,118 @@
+from typing import Iterator, Tuple, Union
+import io
+import struct
+import numpy as np
+
+from models.game import Game
+from services.utils import DIRECTIONS
+
+# The leading bytes and the version of the binary game format
+MAGIC = b"RVDG"
+FORMAT_VERSION = 1
+
+# magic, format version, flags, board item size, dim, game id, moves, dinosaurs, robots
+HEADER = struct.Struct("<4sHBBqqqqq")
+# The header is padded so the board buffer which follows is aligned
+HEADER_SIZE = 64
+
+# Header flags
+SPARSE = 1
+HISTORY = 2
+
+# The types of the entity tables
+POSITION_DTYPE = np.dtype("<i4")
+ROBOT_ID_DTYPE = np.dtype("<u8")
+DIRECTION_DTYPE = np.dtype("i1")
+
+
+def dumps_game(game: Game) -> bytes:
+    """
+    Serialize a game in a compact binary format
+    :param game: the game instance
+    :return: the header, the raw board buffer (dense boards only) and the packed entity tables
+    """
+    robots = game.robots
+    board = game.get_board()
+    flags = (SPARSE if game.sparse else 0) | (HISTORY if game.keep_history else 0)
+    header = HEADER.pack(
+        MAGIC, FORMAT_VERSION, flags, board.dtype.itemsize, game.dim, game.game_id,
+        game.get_number_of_moves(), len(game.dinosaurs_position), len(robots),
+    )
+    chunks = [header.ljust(HEADER_SIZE, b"\0")]
+    if not game.sparse:
+        chunks.append(np.ascontiguousarray(board, dtype=board.dtype.newbyteorder("<")).tobytes())
+    chunks.append(np.array(game.dinosaurs_position, dtype=POSITION_DTYPE).reshape(-1, 2).tobytes())
+    chunks.append(np.fromiter(map(int, robots), dtype=ROBOT_ID_DTYPE, count=len(robots)).tobytes())
+    chunks.append(np.array(
+        [(robot.row, robot.column) for robot in robots.values()], dtype=POSITION_DTYPE
+    ).reshape(-1, 2).tobytes())
+    chunks.append(np.fromiter(
+        (robot.direction for robot in robots.values()), dtype=DIRECTION_DTYPE, count=len(robots)
+    ).tobytes())
+    return b"".join(chunks)
+
+
+def loads_game(data: Union[bytes, memoryview, np.ndarray], copy: bool = True) -> Game:
+    """
+    Rebuild a game from its binary format
+    :param data: the serialized game, any object supporting the buffer protocol
+    :param copy: copy the board buffer, otherwise the board is a view on `data`
+    :return: the game instance
+    """
+    buffer = memoryview(data).cast("B")
+    magic, version, flags, itemsize, dim, game_id, moves, dinosaurs, robots = HEADER.unpack_from(buffer)
+    if magic != MAGIC:
+        raise Exception("The data is not a serialized game")
+    if version != FORMAT_VERSION:
+        raise Exception(f"Unsupported game format version {version}")
+
+    # An empty sparse board costs nothing, a dense board is replaced by the buffer below
+    game = Game(dim, sparse=True)
+    game.sparse = bool(flags & SPARSE)
+    # The history itself stays in the memory of the worker which recorded it
+    game.keep_history = bool(flags & HISTORY)
+    game.game_id = game_id
+    game._moves = moves
+    offset = HEADER_SIZE
+
+    if not game.sparse:
+        dtype = np.dtype(f"<i{itemsize}")
+        board = np.frombuffer(buffer, dtype=dtype, count=dim * dim, offset=offset).reshape(dim, dim)
+        game._board = board.copy() if copy else board
+        offset += board.nbytes
+
+    def read(dtype: np.dtype, count: int) -> np.ndarray:
+        nonlocal offset
+        array = np.frombuffer(buffer, dtype=dtype, count=count, offset=offset)
+        offset += array.nbytes
+        return array
+
+    dinosaurs_position = read(POSITION_DTYPE, 2 * dinosaurs).reshape(-1, 2).tolist()
+    robot_ids = read(ROBOT_ID_DTYPE, robots).tolist()
+    robots_position = read(POSITION_DTYPE, 2 * robots).reshape(-1, 2).tolist()
+    directions = read(DIRECTION_DTYPE, robots).tolist()
+
+    game.entities.add_dinosaurs(map(tuple, dinosaurs_position))
+    for robot_id, position, direction in zip(robot_ids, robots_position, directions):
+        game.entities.add_robot(str(robot_id), tuple(position), DIRECTIONS[direction])
+    game._dinosaurs_count, game._robots_count = dinosaurs, robots
+    if game.sparse:
+        game.initial_placement()
+    return game
+
+
+def export_frames(frames: Iterator[np.ndarray], shape: Tuple[int, ...], dtype) -> Iterator[bytes]:
+    """
+    Stream a sequence of boards as a single .npy array, without holding them all in memory
+    :param frames: the boards in order
+    :param shape: the shape of the whole array, the number of boards first
+    :param dtype: the dtype of the boards
+    :return: the bytes of the .npy file, the header then one chunk per board
+    """
+    header = io.BytesIO()
+    np.lib.format.write_array_header_1_0(
+        header, {"descr": np.lib.format.dtype_to_descr(np.dtype(dtype)), "fortran_order": False, "shape": shape}
+    )
+    yield header.getvalue()
+    for frame in frames:
+        yield frame.tobytes()
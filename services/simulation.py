@@ -0,0 +1,147 @@
+from typing import Callable, Dict, List, Optional
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+import csv
+import os
+import time
+import numpy as np
+
+from models.game import Game
+from services.autopilot import distance_field, plan_command
+from services.utils import COMMANDS
+
+# The columns of the statistics of a game
+RESULT_FIELDS = [
+    "seed", "dim", "robots", "dinosaurs", "policy", "ticks", "moves", "kills", "kill_rate", "completed", "seconds",
+]
+
+
+def random_policy(game: Game, rng: np.random.Generator) -> np.ndarray:
+    # Any command for every robot
+    return rng.integers(0, len(COMMANDS), len(game.robots))
+
+
+def greedy_policy(game: Game, rng: np.random.Generator) -> np.ndarray:
+    # Every robot steps along its shortest path to the nearest dinosaur, -1 when it cannot get closer
+    field = distance_field(game)
+    commands = [plan_command(game, field, robot_id) for robot_id in game.robots]
+    return np.array([-1 if command is None else COMMANDS.index(command) for command in commands], dtype=np.int64)
+
+
+# The policies choose the command of every robot for the next tick
+POLICIES: Dict[str, Callable[[Game, np.random.Generator], np.ndarray]] = {
+    "random": random_policy,
+    "greedy": greedy_policy,
+}
+# The policies which choose the same commands from the same game
+DETERMINISTIC_POLICIES = {"greedy"}
+
+
+def simulate_game(dim: int, robots: int, dinosaurs: int, policy: str = "greedy", seed: int = 0,
+                  max_ticks: int = 10000) -> Dict:
+    """
+    Play a random game until every dinosaur is destroyed, the robots are stuck, or the ticks run out
+    :param dim: grid dimension
+    :param robots: the number of robots
+    :param dinosaurs: the number of dinosaurs
+    :param policy: the name of the policy in POLICIES
+    :param seed: the seed of the placement and of the policy
+    :param max_ticks: the largest number of ticks
+    :return: the statistics of the game, see RESULT_FIELDS
+    """
+    if policy not in POLICIES:
+        raise Exception(f"Unsupported policy '{policy}', choose one of {', '.join(POLICIES)}")
+    choose = POLICIES[policy]
+    started = time.perf_counter()
+    rng = np.random.default_rng(seed)
+    game = Game(dim, sparse=False)
+    game.set_random_game(robots_count=robots, dinosaurs_count=dinosaurs, seed=seed)
+
+    ticks = 0
+    while game.dinosaurs_position and ticks < max_ticks:
+        commands = choose(game, rng)
+        applied, _ = game.tick(commands)
+        ticks += 1
+        # A deterministic policy would repeat a tick where nothing happened
+        if not applied.any() and policy in DETERMINISTIC_POLICIES:
+            break
+
+    kills = dinosaurs - len(game.dinosaurs_position)
+    moves = game.get_number_of_moves()
+    return {
+        "seed": seed,
+        "dim": dim,
+        "robots": robots,
+        "dinosaurs": dinosaurs,
+        "policy": policy,
+        "ticks": ticks,
+        "moves": moves,
+        "kills": kills,
+        "kill_rate": kills / moves if moves else 0.0,
+        "completed": not game.dinosaurs_position,
+        "seconds": time.perf_counter() - started,
+    }
+
+
+def simulate(games: int, dim: int, robots: int, dinosaurs: int, policy: str = "greedy", seed: int = 0,
+             max_ticks: int = 10000, workers: Optional[int] = None) -> List[Dict]:
+    """
+    Play many games in a pool of processes, the game i is seeded with seed + i
+    :param games: the number of games
+    :param dim: grid dimension
+    :param robots: the number of robots of each game
+    :param dinosaurs: the number of dinosaurs of each game
+    :param policy: the name of the policy in POLICIES
+    :param seed: the seed of the first game
+    :param max_ticks: the largest number of ticks of a game
+    :param workers: the number of processes, the default is the number of cores
+    :return: the statistics of every game in order
+    """
+    play = partial(simulate_game, dim, robots, dinosaurs, policy, max_ticks=max_ticks)
+    seeds = range(seed, seed + games)
+    workers = workers or os.cpu_count() or 1
+    if workers == 1:
+        return [play(seed=game_seed) for game_seed in seeds]
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        return list(executor.map(_play, [play] * games, seeds, chunksize=max(1, games // (workers * 4))))
+
+
+def _play(play: Callable, seed: int) -> Dict:
+    return play(seed=seed)
+
+
+def summarize_results(results: List[Dict]) -> Dict:
+    """
+    :param results: the statistics of the games
+    :return: the completion rate, the mean moves to completion and the mean kill rate
+    """
+    completed = [result for result in results if result["completed"]]
+    return {
+        "games": len(results),
+        "completed": len(completed),
+        "completion_rate": len(completed) / len(results) if results else 0.0,
+        "mean_moves_to_completion": float(np.mean([result["moves"] for result in completed])) if completed else None,
+        "mean_kill_rate": float(np.mean([result["kill_rate"] for result in results])) if results else 0.0,
+    }
+
+
+def write_results(results: List[Dict], path: str):
+    """
+    Write the statistics of the games, as Parquet when the path ends with .parquet, otherwise as CSV
+    :param results: the statistics of the games
+    :param path: the output file
+    """
+    if path.endswith(".parquet"):
+        # Parquet is optional, pyarrow is only needed for this format
+        try:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+        except ImportError:
+            raise Exception("Writing Parquet needs pyarrow, install it or write a .csv file")
+        pq.write_table(pa.Table.from_pylist(results), path)
+        return
+
+    with open(path, "w", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=RESULT_FIELDS)
+        writer.writeheader()
+        writer.writerows(results)
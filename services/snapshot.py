@@ -0,0 +1,117 @@
+from typing import List
+import os
+import glob
+import asyncio
+import logging
+import numpy as np
+
+from models.game import Game
+from services.serialize import dumps_game, loads_game
+
+logger = logging.getLogger(__name__)
+
+# The extension of the snapshot files, one file per game named after its id
+SNAPSHOT_EXTENSION = ".game"
+
+
+def snapshot_path(directory: str, game_id: str) -> str:
+    return os.path.join(directory, f"{game_id}{SNAPSHOT_EXTENSION}")
+
+
+def write_snapshot(path: str, data: bytes):
+    """
+    Write a serialized game, the file is replaced at once so a crash never leaves half a snapshot
+    :param path: the path of the snapshot file
+    :param data: the serialized game
+    """
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    temporary = f"{path}.tmp"
+    with open(temporary, "wb") as f:
+        f.write(data)
+    os.replace(temporary, path)
+
+
+def save_snapshot(game: Game, directory: str) -> str:
+    """
+    Save a binary snapshot of a game
+    :param game: the game instance
+    :param directory: the directory of the snapshots
+    :return: the path of the snapshot file
+    """
+    path = snapshot_path(directory, str(game.game_id))
+    write_snapshot(path, dumps_game(game))
+    return path
+
+
+def load_snapshot(path: str, mmap: bool = True) -> Game:
+    """
+    Load a game from its binary snapshot
+    :param path: the path of the snapshot file
+    :param mmap: map the board buffer from the file instead of reading it, pages are copied on write only
+    :return: the game instance
+    """
+    if mmap:
+        return loads_game(np.memmap(path, mode="c"), copy=False)
+    with open(path, "rb") as f:
+        return loads_game(f.read())
+
+
+def load_snapshots(directory: str, mmap: bool = True) -> List[Game]:
+    """
+    Load every game snapshot of a directory
+    :param directory: the directory of the snapshots
+    :param mmap: map the board buffers from the files instead of reading them
+    :return: the game instances, the unreadable snapshots are skipped
+    """
+    games = []
+    for path in sorted(glob.glob(os.path.join(directory, f"*{SNAPSHOT_EXTENSION}"))):
+        try:
+            games.append(load_snapshot(path, mmap=mmap))
+        except Exception as e:
+            logger.error("Cannot load snapshot %s: %s", path, e)
+    return games
+
+
+async def checkpoint(store, directory: str, journals=None) -> int:
+    """
+    Save a snapshot of every game in a store
+    :param store: the game store
+    :param directory: the directory of the snapshots
+    :param journals: the move journals, those covered by the new snapshots are dropped
+    :return: the number of saved games
+    """
+    loop = asyncio.get_running_loop()
+    saved = 0
+    for game_id in list(store):
+        game = store.peek(game_id)
+        if game is None:
+            continue
+        # Serialize while no move is applied, then write the file outside of the event loop
+        async with game.lock:
+            data = dumps_game(game)
+            moves = game.get_number_of_moves()
+        await loop.run_in_executor(None, write_snapshot, snapshot_path(directory, game_id), data)
+        if journals is not None:
+            # The journal is kept when moves were applied meanwhile, the replay skips the saved ones
+            async with game.lock:
+                if game.get_number_of_moves() == moves:
+                    journals.reset(game_id)
+        saved += 1
+    return saved
+
+
+async def run_checkpoints(store, directory: str, interval: float, journals=None):
+    """
+    Save a snapshot of every game in a store periodically, until cancelled
+    :param store: the game store
+    :param directory: the directory of the snapshots
+    :param interval: the number of seconds between two checkpoints
+    :param journals: the move journals, those covered by the new snapshots are dropped
+    """
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            saved = await checkpoint(store, directory, journals)
+            logger.info("Checkpoint saved %s games", saved)
+        except Exception as e:
+            logger.error("Checkpoint failed: %s", e)
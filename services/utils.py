@@ -1,5 +1,4 @@
 import numpy as np
-import pandas as pd
 
 # The directions set, clockwise order
 DIRECTIONS = ["E", "S", "W", "N"]
@@ -11,52 +10,61 @@ DIRECTION_BASED_INDEX = {"E": 1, "S": 0, "W": 1, "N": 0}
 # Identity vector of each direction
 MOVING_VECTOR = {"E": 1, "S": 1, "W": -1, "N": -1}
 
+# Directions encoded by their index in the clockwise order, e.g. "E" -> 0
+DIRECTION_CODES = {direction: code for code, direction in enumerate(DIRECTIONS)}
+
+# The direction code after turning right or left, indexed by the current direction code
+TURN_RIGHT = [(code + 1) % len(DIRECTIONS) for code in range(len(DIRECTIONS))]
+TURN_LEFT = [(code - 1) % len(DIRECTIONS) for code in range(len(DIRECTIONS))]
+
+# The (row, column) step of a forward move, indexed by the direction code
+STEPS = [
+    (MOVING_VECTOR[direction] * (DIRECTION_BASED_INDEX[direction] == 0),
+     MOVING_VECTOR[direction] * (DIRECTION_BASED_INDEX[direction] == 1))
+    for direction in DIRECTIONS
+]
+
 # The commands set
 COMMANDS = ["move forward", "move backward", "turn right", "turn left", "attack"]
 
 
-def create_new_board(dim: int) -> np.ndarray:
+# The integer types a board can be stored in, from the smallest
+BOARD_DTYPES = [np.int8, np.int16, np.int32, np.int64]
+
+
+def smallest_dtype(*values: int) -> np.dtype:
     """
-    :param dim: dimension of the grid
-    :return: a zero-matrix composed by numpy 2d array
+    :param values: the values a board cell can hold
+    :return: the smallest integer type that holds all the values
     """
-    # create a clear board
-    if not dim:
-        raise TypeError("Dimension is necessary")
-    board = np.zeros((dim, dim), dtype=int)
-    return board
+    low, high = min(values), max(values)
+    for dtype in BOARD_DTYPES:
+        info = np.iinfo(dtype)
+        if info.min <= low and high <= info.max:
+            return np.dtype(dtype)
+    raise Exception(f"No integer type holds the values between {low} and {high}")
 
 
-def select_empty_position(board):
+def use_sparse_board(dim: int, entities: int, min_cells: int, max_density: float) -> bool:
     """
-    Select an empty postion to put entity on
-    :param board: board instance
-    :return: list of available choices
+    :param dim: dimension of the grid
+    :param entities: the expected number of roles on the grid
+    :param min_cells: grids with fewer cells are always dense
+    :param max_density: the maximum share of occupied cells of a sparse grid
+    :return: whether the grid should be stored sparse
     """
-    result = np.where(board == 0)
-    list_of_coordinate = list(zip(result[0], result[1]))
-    numpyint64_to_int = [(row.item(), col.item()) for row, col in list_of_coordinate]
-    return numpyint64_to_int
+    cells = dim * dim
+    return cells >= min_cells and entities <= cells * max_density
 
 
-def create_html(game_id: str, board: np.ndarray, dim: int):
+def create_new_board(dim: int, dtype=np.int8) -> np.ndarray:
     """
-    Display game board in HTML format via pandas
-    :param game_id: a specified game id
-    :param board: the game board presented by numpy 2d array
     :param dim: dimension of the grid
-    :return: html
+    :param dtype: the type of a cell, one byte by default as cells only hold a few small values
+    :return: a zero-matrix composed by numpy 2d array
     """
-    # create simple table in html format
-    columns = [f"{n}" for n in range(dim)]
-    df = pd.DataFrame(board, columns=columns)
-    df = df.replace(0, " ")
-    html = df.to_html(
-        table_id=game_id,
-        col_space=30,
-        border=1,
-        justify="center",
-        show_dimensions=True,
-        classes="table table-striped"
-    )
-    return html
+    # create a clear board
+    if not dim:
+        raise TypeError("Dimension is necessary")
+    board = np.zeros((dim, dim), dtype=dtype)
+    return board
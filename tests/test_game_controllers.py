@@ -1,7 +1,22 @@
+import io
+import os
+import tempfile
+from collections import Counter
+from unittest import mock
+import numpy as np
 from fastapi.testclient import TestClient
-from unittest.case import TestCase
+from unittest.case import TestCase, skipUnless
+
+try:
+    import fakeredis
+except ImportError:
+    fakeredis = None
 
 from main import app
+from models.setting import get_app_settings
+from models.store import RedisGameStore
+from services.channels import COMMAND_FRAME
+from services.profiling import StackSampler
 
 
 class TestGameControllers(TestCase):
@@ -93,6 +108,48 @@ class TestGameControllers(TestCase):
 
         print("<<< test pass >>>\n\n\n")
 
+    def test_display_game_viewport(self):
+
+        """ Test displaying a window of the game board, streamed when it is large """
+
+        print(f"<<< {self.test_display_game_viewport.__name__} start >>>")
+        game_id = self._create_game()
+        res = self.app.get(f"/games/{game_id}?row_start=0&row_end=5&col_start=1&col_end=4")
+        self._check_ok_res(res)
+        self.assertIn("<th>4</th>", res.text)
+        self.assertNotIn("<th>5</th>", res.text)
+        self.assertIn("5 rows × 3 columns", res.text)
+
+        settings = get_app_settings()
+        stream_cells = settings.render_stream_cells
+        settings.render_stream_cells = 10
+        try:
+            res = self.app.get(f"/games/{game_id}")
+        finally:
+            settings.render_stream_cells = stream_cells
+        self._check_ok_res(res)
+        self.assertIn("50 rows × 50 columns", res.text)
+        self.assertIn("<td>-1</td>", res.text)
+
+        print("<<< test pass >>>\n\n\n")
+
+    def test_display_huge_game(self):
+
+        """ Test a huge, mostly empty game is displayed through a viewport """
+
+        print(f"<<< {self.test_display_huge_game.__name__} start >>>")
+        res = self.app.post('/games/start', json={"grid_dim": 100000})
+        self._check_ok_res(res)
+        game_id = res.json()["game_id"]
+
+        res = self.app.get(f"/games/{game_id}")
+        self.assertEqual(res.status_code, 400)
+        res = self.app.get(f"/games/{game_id}?row_start=99990&col_start=99990")
+        self._check_ok_res(res)
+        self.assertIn("10 rows × 10 columns", res.text)
+
+        print("<<< test pass >>>\n\n\n")
+
     def test_display_game_not_found(self):
 
         """ Test the error caused by the game instance is missing """
@@ -126,6 +183,8 @@ class TestGameControllers(TestCase):
         self.assertIn("dinosaurs_position", res.json())
         self.assertIn("number_of_moves", res.json())
         self.assertIn("all_dinosaurs_has_been_terminated", res.json())
+        self.assertEqual(res.json()["new_position"]["direction"], "N")
+        self.assertIn(res.json()["new_position"]["coordinate"], ([34, 13], [11, 13]))
 
         print("<<< test pass >>>\n\n\n")
 
@@ -147,6 +206,181 @@ class TestGameControllers(TestCase):
 
         print("<<< test pass >>>\n\n\n")
 
+    def test_move_robots_batch(self):
+
+        """ Test running a script of commands in one request """
+
+        print(f"<<< {self.test_move_robots_batch.__name__} start >>>")
+        game_id = self._create_game()
+        payload = {
+            "steps": [{"robot_id": 0, "command": 2},
+                      {"robot_id": 0, "command": 2435},
+                      {"robot_id": 0, "command": 3}],
+            "on_error": "skip",
+            "verbose": True
+        }
+        res = self.app.put(f"/games/{game_id}/batch", json=payload)
+        self._check_ok_res(res)
+        self.assertEqual(res.json()["applied"], 2)
+        self.assertEqual(res.json()["failed"], 1)
+        self.assertIsNone(res.json()["stopped_at"])
+        self.assertEqual(len(res.json()["results"]), 3)
+        self.assertEqual(res.json()["number_of_moves"], 2)
+
+        payload["on_error"] = "stop"
+        payload["verbose"] = False
+        res = self.app.put(f"/games/{game_id}/batch", json=payload)
+        self._check_ok_res(res)
+        self.assertEqual(res.json()["applied"], 1)
+        self.assertEqual(res.json()["stopped_at"], 1)
+        self.assertEqual(len(res.json()["results"]), 1)
+        self.assertEqual(res.json()["number_of_moves"], 3)
+
+        print("<<< test pass >>>\n\n\n")
+
+    def test_move_robots_batch_wrong_policy(self):
+
+        """ Test the error caused by an unknown error policy """
+
+        print(f"<<< {self.test_move_robots_batch_wrong_policy.__name__} start >>>")
+        game_id = self._create_game()
+        payload = {"steps": [{"robot_id": 0, "command": 0}], "on_error": "retry"}
+        res = self.app.put(f"/games/{game_id}/batch", json=payload)
+        self.assertEqual(res.status_code, 400)
+
+        print("<<< test pass >>>\n\n\n")
+
+    def test_game_history(self):
+
+        """ Test displaying a past board and exporting the history """
+
+        print(f"<<< {self.test_game_history.__name__} start >>>")
+        res = self.app.get(f"/games/{self._create_game()}/history")
+        self.assertEqual(res.status_code, 400)
+
+        game_id = self._create_game(history=True)
+        before = self.app.get(f"/games/{game_id}").text
+        payload = {"steps": [{"robot_id": 0, "command": 2}] * 4 + [{"robot_id": 0, "command": 0}] * 3,
+                   "on_error": "skip"}
+        res = self.app.put(f"/games/{game_id}/batch", json=payload)
+        moves = res.json()["number_of_moves"]
+
+        res = self.app.get(f"/games/{game_id}/history", params={"at": 0})
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(res.text, before)
+        res = self.app.get(f"/games/{game_id}/history")
+        self.assertEqual(res.text, self.app.get(f"/games/{game_id}").text)
+        res = self.app.get(f"/games/{game_id}/history", params={"at": moves + 1})
+        self.assertEqual(res.status_code, 400)
+
+        res = self.app.get(f"/games/{game_id}/history/export")
+        self.assertEqual(res.status_code, 200)
+        frames = np.load(io.BytesIO(res.content))
+        self.assertEqual(frames.shape, (moves + 1, 50, 50))
+        self.assertEqual(res.headers["X-History-Start"], "0")
+
+        print("<<< test pass >>>\n\n\n")
+
+    def test_move_robot_changes(self):
+
+        """ Test returning the changes since a known move instead of the full positions """
+
+        print(f"<<< {self.test_move_robot_changes.__name__} start >>>")
+        payload = {
+            "grid_dim": 50, "robots": [{"coordinate": (35, 13), "direction": "N"}], "dinosaurs": [(2, 2)]
+        }
+        res = self.app.post("/games/start", json=payload)
+        game_id, version = res.json()["game_id"], res.json()["version"]
+        self.assertEqual(version, 0)
+
+        res = self.app.put(f"/games/{game_id}", json={"robot_id": 0, "command": 2}, params={"since": version})
+        self._check_ok_res(res)
+        self.assertNotIn("dinosaurs_position", res.json())
+        self.assertEqual(res.json()["version"], 1)
+        self.assertEqual(res.json()["changes"]["killed"], [])
+        self.assertEqual(list(res.json()["changes"]["robots"].values()), [res.json()["new_position"]])
+
+        payload = {"steps": [{"robot_id": 0, "command": 2}] * 3}
+        res = self.app.put(f"/games/{game_id}/batch", json=payload, headers={"X-Since-Move": "1"})
+        self.assertEqual(res.json()["since"], 1)
+        self.assertEqual(res.json()["version"], 4)
+        self.assertNotIn("robots_position", res.json())
+
+        res = self.app.post(f"/games/{game_id}/tick", json={"command": 3}, headers={"X-Since-Move": "4"})
+        self.assertEqual(res.json()["version"], 5)
+        self.assertEqual(len(res.json()["changes"]["robots"]), 1)
+        self.assertNotIn("robots_position", res.json())
+
+        # A version the game does not know of, the full positions are sent again
+        res = self.app.put(f"/games/{game_id}", json={"robot_id": 0, "command": 2}, params={"since": 10})
+        self.assertTrue(res.json()["resync"])
+        self.assertIn("dinosaurs_position", res.json())
+
+        print("<<< test pass >>>\n\n\n")
+
+    def test_tick(self):
+
+        """ Test operating every robot at once """
+
+        print(f"<<< {self.test_tick.__name__} start >>>")
+        game_id = self._create_game()
+        res = self.app.post(f"/games/{game_id}/tick", json={"command": 2})
+        self._check_ok_res(res)
+        self.assertEqual(res.json()["number_of_moves"], res.json()["applied"])
+        self.assertEqual(res.json()["version"], res.json()["number_of_moves"])
+        self.assertEqual(len(res.json()["robots_position"]), 2)
+
+        res = self.app.post(f"/games/{game_id}/tick", json={"commands": [2]})
+        self.assertEqual(res.status_code, 400)
+
+        print("<<< test pass >>>\n\n\n")
+
+    def test_autopilot(self):
+
+        """ Test driving the robots toward the dinosaurs """
+
+        print(f"<<< {self.test_autopilot.__name__} start >>>")
+        game_id = self._create_game()
+        res = self.app.post(f"/games/{game_id}/autopilot", json={"rounds": 3})
+        self._check_ok_res(res)
+        self.assertLessEqual(res.json()["rounds"], 3)
+        self.assertEqual(res.json()["number_of_moves"], res.json()["applied"])
+
+        res = self.app.post(f"/games/{game_id}/autopilot", json={"rounds": 0})
+        self.assertEqual(res.status_code, 400)
+
+        print("<<< test pass >>>\n\n\n")
+
+    def test_snapshot_restore_game(self):
+
+        """ Test saving a game snapshot and restoring it """
+
+        print(f"<<< {self.test_snapshot_restore_game.__name__} start >>>")
+        settings = get_app_settings()
+        snapshot_dir = settings.snapshot_dir
+        with tempfile.TemporaryDirectory() as directory:
+            settings.snapshot_dir = directory
+            try:
+                game_id = self._create_game()
+                res = self.app.post(f"/games/{game_id}/snapshot")
+                self._check_ok_res(res)
+                self.assertGreater(res.json()["bytes"], 50 * 50)
+
+                self.app.put(f"/games/{game_id}", json={"robot_id": 0, "command": 0})
+                self.app.delete(f"/games/{game_id}")
+                res = self.app.post(f"/games/{game_id}/restore")
+                self._check_ok_res(res)
+                self.assertEqual(res.json()["robots_position"][0]["coordinate"], [35, 13])
+
+                res = self.app.put(f"/games/{game_id}", json={"robot_id": 0, "command": 0})
+                self.assertEqual(res.json()["number_of_moves"], 1)
+                res = self.app.post("/games/65555/restore")
+                self.assertEqual(res.status_code, 404)
+            finally:
+                settings.snapshot_dir = snapshot_dir
+
+        print("<<< test pass >>>\n\n\n")
+
     def test_remove_game(self):
 
         """ Test removing a game by game id """
@@ -170,17 +404,154 @@ class TestGameControllers(TestCase):
 
         print("<<< test pass >>>\n\n\n")
 
+    def test_game_memory(self):
+
+        """ Test reporting the memory held by a game """
+
+        print(f"<<< {self.test_game_memory.__name__} start >>>")
+        game_id = self._create_game()
+        res = self.app.get(f"/games/{game_id}/memory")
+        self._check_ok_res(res)
+        self.assertEqual(res.json()["board_dtype"], "int8")
+        self.assertEqual(res.json()["board_bytes"], 50 * 50)
+        self.assertGreater(res.json()["total_bytes"], res.json()["board_bytes"])
+
+        print("<<< test pass >>>\n\n\n")
+
+    def test_metrics(self):
+
+        """ Test the metrics in the Prometheus text format """
+
+        print(f"<<< {self.test_metrics.__name__} start >>>")
+        game_id = self._create_game()
+        self.app.put(f"/games/{game_id}", json={"robot_id": 0, "command": 2})
+        res = self.app.get("/metrics")
+        self.assertEqual(res.status_code, 200)
+        self.assertTrue(res.headers["content-type"].startswith("text/plain"))
+        self.assertIn('rvd_request_duration_seconds_count{method="PUT",route="/games/{game_id}",status="200"}', res.text)
+        self.assertIn('rvd_command_duration_seconds_count{command="turn right"}', res.text)
+        self.assertIn("rvd_games 1", res.text)
+
+        print("<<< test pass >>>\n\n\n")
+
+    def test_profiling(self):
+
+        """ Test profiling the requests with the admin token """
+
+        print(f"<<< {self.test_profiling.__name__} start >>>")
+
+        class Sampler(StackSampler):
+            # One known sample per profiled request, the real sampler depends on the timing
+            def start(self):
+                return self
+
+            def stop(self):
+                return Counter({"main:request": 1})
+
+        settings = get_app_settings()
+        with tempfile.TemporaryDirectory() as directory, mock.patch("services.profiling.StackSampler", Sampler):
+            settings.profile_dir, settings.profile_token = directory, "secret"
+            try:
+                headers = {"X-Profile-Token": "secret"}
+                res = self.app.post("/games/start", json={"grid_dim": 50}, headers=headers)
+                game_id = res.json()["game_id"]
+                self.app.get(f"/games/{game_id}", headers={"X-Profile-Token": "wrong"})
+                self.app.put(f"/games/{game_id}", json={"robot_id": 0, "command": 2}, headers=headers)
+                files = sorted(os.listdir(directory))
+            finally:
+                settings.profile_dir, settings.profile_token = "profiles", ""
+
+            self.assertEqual(files, ["play_robots.collapsed", "start_game.collapsed"])
+            with open(os.path.join(directory, "start_game.collapsed")) as f:
+                self.assertEqual(f.read(), "main:request 1\n")
+
+        print("<<< test pass >>>\n\n\n")
+
+    def test_play_channel(self):
+
+        """ Test operating robots through the websocket and spectating the moves """
+
+        print(f"<<< {self.test_play_channel.__name__} start >>>")
+        game_id = self._create_game()
+        with self.app.websocket_connect(f"/games/{game_id}/ws") as player, \
+                self.app.websocket_connect(f"/games/{game_id}/ws") as spectator:
+            player.send_json([0, 2])
+            delta = player.receive_json()
+            self.assertEqual(delta["m"], 1)
+            self.assertEqual(delta["c"], 2)
+            self.assertEqual(spectator.receive_json(), delta)
+
+            # The moves from the http routes are pushed too
+            self.app.put(f"/games/{game_id}", json={"robot_id": 0, "command": 3})
+            self.assertEqual(spectator.receive_json()["m"], 2)
+            self.assertEqual(player.receive_json()["m"], 2)
+
+            # Invalid frames are reported, the connection stays open
+            for frame in ("[0, 9]", "not json", '{"robot_id": 0, "command": 2}', "[0, true]"):
+                player.send_text(frame)
+                self.assertIn("error", player.receive_json())
+            player.send_json([0, 2])
+            self.assertEqual(player.receive_json()["m"], 3)
+
+            # Binary frames pack the robot id and the command
+            player.send_bytes(COMMAND_FRAME.pack(0, 3))
+            self.assertEqual(player.receive_json()["c"], 3)
+            for frame in (b"\x00", COMMAND_FRAME.pack(0, 9)):
+                player.send_bytes(frame)
+                self.assertIn("error", player.receive_json())
+
+        with self.assertRaises(Exception):
+            with self.app.websocket_connect("/games/0/ws") as channel:
+                channel.receive_json()
+
+        print("<<< test pass >>>\n\n\n")
+
+    def test_store_stats(self):
+
+        """ Test the statistics of the game store """
+
+        print(f"<<< {self.test_store_stats.__name__} start >>>")
+        game_id = self._create_game()
+        self.app.get(f"/games/{game_id}")
+        res = self.app.get("/store/stats")
+        self._check_ok_res(res)
+        self.assertEqual(res.json()["games"], 1)
+        self.assertGreater(res.json()["total_bytes"], 0)
+        self.assertGreaterEqual(res.json()["hits"], 1)
+
+        print("<<< test pass >>>\n\n\n")
+
+    @skipUnless(fakeredis, "fakeredis is not installed")
+    def test_shared_store(self):
+
+        """ Test playing a game kept in the shared store """
+
+        print(f"<<< {self.test_shared_store.__name__} start >>>")
+        server = fakeredis.FakeServer()
+        with mock.patch("main.GAMES", RedisGameStore(fakeredis.FakeRedis(server=server))):
+            game_id = self._create_game()
+            res = self.app.put(f"/games/{game_id}", json={"robot_id": 0, "command": 0})
+            self._check_ok_res(res)
+            self._check_ok_res(self.app.get(f"/games/{game_id}"))
+
+        # Another worker reads the move
+        game = RedisGameStore(fakeredis.FakeRedis(server=server)).get(game_id)
+        self.assertEqual(game.get_number_of_moves(), 1)
+
+        print("<<< test pass >>>\n\n\n")
+
     def _check_ok_res(self, res):
         self.assertEqual(res.status_code, 200)
 
-    def _create_game(self):
+    def _create_game(self, **options):
         payload = {
             "grid_dim": 50,
             "robots_count": 0,
             "robots": [{"coordinate": (35, 13), "direction": "N"},
                        {"coordinate": (12, 13), "direction": "S"}],
             "dinosaurs_count": 0,
-            "dinosaurs": [(2, 2)]
+            "dinosaurs": [(2, 2)],
+            **options,
         }
 
         res = self.app.post('/games/start', json=payload)
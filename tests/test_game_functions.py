@@ -1,8 +1,38 @@
-from unittest.case import TestCase
+import json
+import os
+import random
+import asyncio
+import tempfile
+import logging
+import threading
+import numpy as np
+from unittest.case import TestCase, skipUnless
 from aiounittest import async_test
 
-from models.game import Game
-from services.play import create_random_game, create_game, move_robot
+try:
+    import fakeredis
+except ImportError:
+    fakeredis = None
+
+from models.game import Game, MoveRecord
+from models.cells import FreeCells
+from models.entities import Robot
+from models.store import GameStore, RedisGameStore, GameConflict
+from models.sparse import SparseBoard
+from models.setting import get_app_settings
+from services.play import create_random_game, create_game, move_robot, run_commands
+from services.utils import COMMANDS, TURN_RIGHT, create_new_board, smallest_dtype
+from services.render import create_html, clamp_viewport
+from services.logs import JSONFormatter, SamplingFilter, summarize
+from services.serialize import dumps_game, loads_game
+from services.snapshot import save_snapshot, load_snapshot, load_snapshots, checkpoint
+from services.autopilot import DistanceField, distance_field, plan_command, run_autopilot
+from services.simulation import simulate, simulate_game, write_results
+from services.metrics import Counter, Histogram, COMMAND_SECONDS
+from services.channels import GameChannels
+from services.profiling import StackSampler
+from services.journal import Journals, read_journal
+from services.play import MOVE_HOOKS, game_changes, run_tick
 
 
 class TestGameFunctions(TestCase):
@@ -272,3 +302,874 @@ class TestGameFunctions(TestCase):
         self.assertEqual(game._moves, 1)
 
         print("<<< test pass >>>\n\n\n")
+
+    @async_test
+    async def test_run_commands(self):
+
+        """ Test function: run_commands """
+
+        print(f"<<< {self.test_run_commands.__name__} start >>>")
+
+        robots = [{"coordinate": (0, 0), "direction": "E"}]
+        dinosaurs = [(0, 2)]
+        game = create_game(self.dim, robots, dinosaurs)
+        robot_id = list(game.robots.keys())[0]
+
+        # The second forward move is blocked by the dinosaur
+        steps = [(robot_id, 0), (robot_id, 0), (robot_id, 4)]
+        results = await run_commands(game, steps, on_error="stop")
+        self.assertEqual([result["ok"] for result in results], [True, False])
+        self.assertEqual(len(game.dinosaurs_position), 1)
+
+        results = await run_commands(game, steps[1:], on_error="skip")
+        self.assertEqual([result["ok"] for result in results], [False, True])
+        self.assertEqual(len(game.dinosaurs_position), 0)
+        self.assertEqual(game._moves, 2)
+
+        with self.assertRaises(Exception):
+            await run_commands(game, steps, on_error="retry")
+
+        print("<<< test pass >>>\n\n\n")
+
+    def test_occupied_position(self):
+
+        """ Test function error handling: two roles in the same position """
+
+        print(f"<<< {self.test_occupied_position.__name__} start >>>")
+
+        game = Game(self.dim)
+        game.set_dinosaurs(1, 1)
+        with self.assertRaises(Exception):
+            game.set_robots(1, 1)
+        with self.assertRaises(Exception):
+            game.set_dinosaurs(1, 1)
+
+        print("<<< test pass >>>\n\n\n")
+
+    def test_free_cells(self):
+
+        """ Test class: FreeCells """
+
+        print(f"<<< {self.test_free_cells.__name__} start >>>")
+
+        game = create_random_game(self.dim, robots_count=10, dinosaurs_count=self.dim*self.dim-10)
+        board = game.get_board()
+        self.assertEqual(int((board == 0).sum()), 0)
+        self.assertEqual(len(set(game.dinosaurs_position) | set(game.robots_position)), self.dim*self.dim)
+
+        free_cells = FreeCells(create_new_board(self.dim))
+        picked = {free_cells.pick() for _ in range(self.dim*self.dim)}
+        self.assertEqual(len(picked), self.dim*self.dim)
+        with self.assertRaises(Exception):
+            free_cells.pick()
+
+        free_cells.release((3, 4))
+        free_cells.release((3, 4))
+        self.assertEqual(len(free_cells), 1)
+        self.assertIn((3, 4), free_cells)
+        self.assertEqual(free_cells.pick(), (3, 4))
+
+        print("<<< test pass >>>\n\n\n")
+
+    def test_initiate_random_game_seed(self):
+
+        """ Test function: create_random_game with a seed """
+
+        print(f"<<< {self.test_initiate_random_game_seed.__name__} start >>>")
+
+        game1 = create_random_game(self.dim, seed=7, robots_count=20, dinosaurs_count=30)
+        game2 = create_random_game(self.dim, seed=7, robots_count=20, dinosaurs_count=30)
+        self.assertEqual(len(game1.robots), 20)
+        self.assertEqual(len(game1.dinosaurs_position), 30)
+        self.assertEqual(game1.robots, game2.robots)
+        self.assertEqual(game1.dinosaurs_position, game2.dinosaurs_position)
+        self.assertEqual(int((game1.get_board() == 1).sum()), 30)
+        self.assertEqual(int((game1.get_board() == -1).sum()), 20)
+
+        print("<<< test pass >>>\n\n\n")
+
+    @async_test
+    async def test_dump_board(self):
+
+        """ Test function: dump_board """
+
+        print(f"<<< {self.test_dump_board.__name__} start >>>")
+
+        settings = get_app_settings()
+        game = Game(self.dim)
+        game.set_robots(0, 0)
+        game.initial_placement()
+        robot_id = list(game.robots.keys())[0]
+
+        with self.assertLogs("models.game", level="DEBUG") as logs:
+            await game.turn_robot_right(robot_id)
+        self.assertEqual(len([line for line in logs.output if "Game board" in line]), 0)
+
+        settings.board_dump = True
+        try:
+            with self.assertLogs("models.game", level="DEBUG") as logs:
+                await game.turn_robot_right(robot_id)
+                # The second dump is within the rate limit
+                await game.turn_robot_right(robot_id)
+            self.assertEqual(len([line for line in logs.output if "Game board" in line]), 1)
+        finally:
+            settings.board_dump = False
+
+        print("<<< test pass >>>\n\n\n")
+
+    def test_structured_logging(self):
+
+        """ Test function: summarize, JSONFormatter and SamplingFilter """
+
+        print(f"<<< {self.test_structured_logging.__name__} start >>>")
+
+        res = {"game_id": "1", "dinosaurs_position": [(n, n) for n in range(100)]}
+        summary = summarize(res, limit=3)
+        self.assertEqual(summary["game_id"], "1")
+        self.assertEqual(summary["dinosaurs_position"], {"count": 100, "head": [(0, 0), (1, 1), (2, 2)]})
+        robots_position = [(0, 0)]
+        small = summarize({"robots_position": robots_position}, limit=3)
+        robots_position.append((1, 1))
+        self.assertEqual(small["robots_position"], [(0, 0)])
+
+        record = logging.LogRecord("main", logging.INFO, __file__, 1, "Game started: %s", (summary,), None)
+        line = json.loads(JSONFormatter().format(record))
+        self.assertEqual(line["level"], "INFO")
+        self.assertEqual(line["data"]["dinosaurs_position"]["count"], 100)
+
+        self.assertFalse(SamplingFilter(0).filter(record))
+        record.levelno = logging.ERROR
+        self.assertTrue(SamplingFilter(0).filter(record))
+
+        print("<<< test pass >>>\n\n\n")
+
+    @async_test
+    async def test_entity_store(self):
+
+        """ Test class: EntityStore keeps the positions up to date """
+
+        print(f"<<< {self.test_entity_store.__name__} start >>>")
+
+        game = Game(self.dim)
+        game.set_dinosaurs(0, 2)
+        game.set_robots(0, 0)
+        game.initial_placement()
+        robot_id = list(game.robots.keys())[0]
+        self.assertEqual(game.entities.robot_at((0, 0)), robot_id)
+        self.assertEqual(game.entities.dinosaur_at((0, 2)), 0)
+
+        await game.move_robot_forward(robot_id)
+        self.assertEqual(game.robots_position, [(0, 1)])
+        self.assertIsNone(game.entities.robot_at((0, 0)))
+        self.assertEqual(game.entities.robot_at((0, 1)), robot_id)
+
+        await game.attack(robot_id)
+        self.assertEqual(game.dinosaurs_position, [])
+        self.assertIsNone(game.entities.dinosaur_at((0, 2)))
+        self.assertIsNone(game.entities.get_dinosaur(0))
+
+        print("<<< test pass >>>\n\n\n")
+
+    def test_robot(self):
+
+        """ Test class: Robot """
+
+        print(f"<<< {self.test_robot.__name__} start >>>")
+
+        game = Game(self.dim)
+        game.set_robots(2, 3, direction="S")
+        robot = list(game.robots.values())[0]
+        self.assertIsInstance(robot, Robot)
+        self.assertEqual(robot.coordinate, (2, 3))
+        self.assertEqual(robot["direction"], "S")
+        self.assertEqual(robot.to_dict(), {"coordinate": (2, 3), "direction": "S"})
+        with self.assertRaises(AttributeError):
+            robot.speed = 1
+        with self.assertRaises(Exception):
+            game.set_robots(4, 4, direction="X")
+
+        print("<<< test pass >>>\n\n\n")
+
+    def test_create_html(self):
+
+        """ Test function: create_html """
+
+        print(f"<<< {self.test_create_html.__name__} start >>>")
+
+        board = create_new_board(2)
+        board[0, 1] = 1
+        board[1, 0] = -1
+        html = create_html("1", board, 2)
+        self.assertEqual(
+            html,
+            '<table border="1" class="dataframe table table-striped" id="1">\n'
+            '  <thead>\n'
+            '    <tr style="text-align: center;">\n'
+            '      <th style="min-width: 30px;"></th>\n'
+            '      <th style="min-width: 30px;">0</th>\n'
+            '      <th style="min-width: 30px;">1</th>\n'
+            '    </tr>\n'
+            '  </thead>\n'
+            '  <tbody>\n'
+            '    <tr>\n      <th>0</th>\n      <td></td>\n      <td>1</td>\n    </tr>\n'
+            '    <tr>\n      <th>1</th>\n      <td>-1</td>\n      <td></td>\n    </tr>\n'
+            '  </tbody>\n'
+            '</table>\n'
+            '<p>2 rows × 2 columns</p>'
+        )
+        self.assertEqual(clamp_viewport(10, -5, 20), (0, 10))
+        self.assertEqual(clamp_viewport(10, 4, 2), (4, 4))
+
+        print("<<< test pass >>>\n\n\n")
+
+    def test_game_store(self):
+
+        """ Test class: GameStore eviction and counters """
+
+        print(f"<<< {self.test_game_store.__name__} start >>>")
+
+        now = [0.0]
+        game_bytes = Game(self.dim).nbytes
+        store = GameStore(max_games=2, max_bytes=3 * game_bytes, ttl=10, clock=lambda: now[0])
+        store["1"] = Game(self.dim)
+        store["2"] = Game(self.dim)
+        self.assertIsNotNone(store.get("1"))
+
+        # "2" is the least recently used game
+        store["3"] = Game(self.dim)
+        self.assertEqual(sorted(store), ["1", "3"])
+        self.assertIsNone(store.get("2"))
+        self.assertEqual(store.total_bytes, 2 * game_bytes)
+
+        now[0] = 5.0
+        store.get("3")
+        now[0] = 12.0
+        self.assertNotIn("1", store)
+        self.assertIn("3", store)
+
+        with self.assertRaises(Exception):
+            store["big"] = Game(self.dim * 2)
+
+        # Saving a stored game only counts its size again, it is neither touched nor moved
+        game = store.peek("3")
+        store.save("3", game)
+        self.assertEqual(store.total_bytes, game_bytes)
+        self.assertIs(store.peek("3"), game)
+        # A removed or replaced game is not brought back
+        store.save("2", game)
+        self.assertNotIn("2", store)
+        store["3"] = Game(self.dim)
+        store.save("3", game)
+        self.assertIsNot(store.peek("3"), game)
+
+        self.assertEqual(store.stats()["hits"], 2)
+        self.assertEqual(store.stats()["misses"], 1)
+        self.assertEqual(store.stats()["evictions"], 2)
+
+        store.clear()
+        self.assertEqual(len(store), 0)
+        self.assertEqual(store.total_bytes, 0)
+
+        print("<<< test pass >>>\n\n\n")
+
+    def test_smallest_dtype(self):
+
+        """ Test function: smallest_dtype """
+
+        print(f"<<< {self.test_smallest_dtype.__name__} start >>>")
+
+        self.assertEqual(smallest_dtype(0, 1, -1), np.int8)
+        self.assertEqual(smallest_dtype(0, 300, -1), np.int16)
+        self.assertEqual(Game(self.dim).get_board().dtype, np.int8)
+
+        print("<<< test pass >>>\n\n\n")
+
+    @async_test
+    async def test_sparse_game(self):
+
+        """ Test class: SparseBoard behind a game on a huge grid """
+
+        print(f"<<< {self.test_sparse_game.__name__} start >>>")
+
+        dim = 100000
+        game = create_random_game(dim, seed=3, robots_count=5, dinosaurs_count=5)
+        self.assertTrue(game.sparse)
+        self.assertIsInstance(game.get_board(), SparseBoard)
+        self.assertEqual(game.get_board().count_nonzero(), 10)
+        self.assertLess(game.nbytes, 100000)
+        # Without the number of roles the density is unknown, the grid stays dense
+        self.assertFalse(Game(1000).sparse)
+        self.assertTrue(Game(1000, entities=10).sparse)
+
+        game = create_game(dim, [{"coordinate": (dim - 1, 0), "direction": "E"}], [(dim - 1, 2)])
+        self.assertTrue(game.sparse)
+        robot_id = list(game.robots.keys())[0]
+        await game.move_robot_forward(robot_id)
+        with self.assertRaises(Exception):
+            await game.move_robot_forward(robot_id)
+        await game.turn_robot_right(robot_id)
+        with self.assertRaises(Exception):
+            await game.move_robot_forward(robot_id)
+        await game.attack(robot_id)
+        self.assertEqual(game.dinosaurs_position, [])
+        self.assertEqual(game.get_board().count_nonzero(), 1)
+        self.assertEqual(game.get_board()[dim - 1, 0:3].tolist(), [0, -1, 0])
+
+        # Windows of a sparse board match the dense board
+        dense = create_new_board(self.dim)
+        sparse = SparseBoard(self.dim)
+        for position, value in (((1, 2), 1), ((4, 4), -1), ((9, 0), 1)):
+            dense[position] = value
+            sparse[position] = value
+        self.assertTrue((sparse[0:5, 1:6] == dense[0:5, 1:6]).all())
+        self.assertEqual(sparse[9, :].tolist(), dense[9, :].tolist())
+        self.assertEqual(create_html("1", sparse, self.dim), create_html("1", dense, self.dim))
+
+        print("<<< test pass >>>\n\n\n")
+
+    @async_test
+    async def test_concurrent_moves(self):
+
+        """ Test function: move_robot and run_commands keep the board consistent under concurrency """
+
+        print(f"<<< {self.test_concurrent_moves.__name__} start >>>")
+
+        game = create_random_game(self.dim, seed=11, robots_count=20, dinosaurs_count=30)
+        game.keep_history = True
+        robot_ids = list(game.robots.keys())
+        rng = random.Random(5)
+        steps = [(rng.choice(robot_ids), rng.randrange(len(COMMANDS))) for _ in range(2000)]
+
+        # A move issued while a batch is running waits for the whole batch
+        batch = asyncio.ensure_future(run_commands(game, steps, on_error="skip"))
+        await asyncio.sleep(0)
+        self.assertTrue(game.lock.locked())
+        await move_robot(game, robot_ids[0], COMMANDS[2])
+        self.assertTrue(batch.done())
+
+        async def play(count):
+            for _ in range(count):
+                try:
+                    await move_robot(game, rng.choice(robot_ids), COMMANDS[rng.randrange(len(COMMANDS))])
+                except Exception:
+                    pass
+                await asyncio.sleep(0)
+
+        await asyncio.gather(run_commands(game, steps, on_error="skip"), *[play(100) for _ in range(10)])
+
+        board = game.get_board()
+        self.assertEqual(len(set(game.robots_position)), len(robot_ids))
+        self.assertTrue(all(board[position] == -1 for position in game.robots_position))
+        self.assertTrue(all(board[position] == 1 for position in game.dinosaurs_position))
+        self.assertEqual(int((board != 0).sum()), len(robot_ids) + len(game.dinosaurs_position))
+
+        # A command which yields between reading the robot and turning it, the lock keeps the turns apart
+        async def turn_robot_right(robot_id):
+            direction = game.robots[robot_id].direction
+            await asyncio.sleep(0)
+            game.entities.turn_robot(robot_id, TURN_RIGHT[direction])
+            game._moves += 1
+
+        game.turn_robot_right = turn_robot_right
+        robot_id, start = robot_ids[0], game.version
+        direction = game.robots[robot_id].direction
+        await asyncio.gather(*[move_robot(game, robot_id, COMMANDS[2]) for _ in range(6)])
+        for record in game.history.since(start):
+            direction = TURN_RIGHT[direction]
+            self.assertEqual(record.direction, direction)
+        self.assertEqual(game.robots[robot_id].direction, direction)
+
+        print("<<< test pass >>>\n\n\n")
+
+    @skipUnless(fakeredis, "fakeredis is not installed")
+    def test_redis_game_store(self):
+
+        """ Test class: RedisGameStore shared by two workers """
+
+        print(f"<<< {self.test_redis_game_store.__name__} start >>>")
+
+        server = fakeredis.FakeServer()
+        worker1 = RedisGameStore(fakeredis.FakeRedis(server=server), ttl=60)
+        worker2 = RedisGameStore(fakeredis.FakeRedis(server=server), ttl=60)
+
+        game = create_random_game(self.dim, seed=2, robots_count=3, dinosaurs_count=4)
+        worker1["1"] = game
+        self.assertIs(worker1.get("1"), game)
+        self.assertIn("1", worker2)
+        self.assertEqual(list(worker2), ["1"])
+
+        # The second worker decodes the game and writes a change
+        copy = worker2.get("1")
+        self.assertEqual(copy.robots, game.robots)
+        self.assertTrue((copy.get_board() == game.get_board()).all())
+        copy._moves += 1
+        worker2["1"] = copy
+
+        # The first worker's copy is stale: writing it fails, reading it fetches the change
+        with self.assertRaises(GameConflict):
+            worker1["1"] = game
+        self.assertEqual(worker1.get("1").get_number_of_moves(), 1)
+        self.assertEqual(worker1.stats()["conflicts"], 1)
+
+        with self.assertRaises(GameConflict):
+            worker2["1"] = create_random_game(self.dim)
+
+        worker2.pop("1")
+        self.assertIsNone(worker1.get("1"))
+        # A removed game is not brought back
+        worker2.save("1", copy)
+        self.assertNotIn("1", worker1)
+
+        print("<<< test pass >>>\n\n\n")
+
+    def test_serialize_game(self):
+
+        """ Test function: dumps_game, loads_game """
+
+        print(f"<<< {self.test_serialize_game.__name__} start >>>")
+
+        for dim in (self.dim, 100000):
+            game = create_random_game(dim, seed=4, robots_count=6, dinosaurs_count=8)
+            data = dumps_game(game)
+            copy = loads_game(data)
+            self.assertEqual(copy.game_id, game.game_id)
+            self.assertEqual(copy.sparse, game.sparse)
+            self.assertEqual(copy.robots, game.robots)
+            self.assertEqual(copy.dinosaurs_position, game.dinosaurs_position)
+            self.assertEqual(copy.get_board()[0:self.dim, 0:self.dim].tolist(),
+                             game.get_board()[0:self.dim, 0:self.dim].tolist())
+            self.assertFalse(copy.keep_history)
+        game.keep_history = True
+        self.assertTrue(loads_game(dumps_game(game)).keep_history)
+
+        with self.assertRaises(Exception):
+            loads_game(b"x" * 64)
+
+        print("<<< test pass >>>\n\n\n")
+
+    @async_test
+    async def test_snapshot(self):
+
+        """ Test function: save_snapshot, load_snapshot, checkpoint """
+
+        print(f"<<< {self.test_snapshot.__name__} start >>>")
+
+        with tempfile.TemporaryDirectory() as directory:
+            game = create_random_game(self.dim, seed=6, robots_count=4, dinosaurs_count=5)
+            path = save_snapshot(game, directory)
+            copy = load_snapshot(path)
+            self.assertFalse(copy.get_board().flags.owndata)
+            self.assertEqual(copy.robots, game.robots)
+            self.assertTrue((copy.get_board() == game.get_board()).all())
+
+            # The board pages are copied on write, the snapshot is left untouched
+            robot_id = list(copy.robots.keys())[0]
+            await move_robot(copy, robot_id, COMMANDS[4])
+            self.assertEqual(load_snapshot(path, mmap=False).dinosaurs_position, game.dinosaurs_position)
+
+            store = GameStore()
+            store["1"] = create_random_game(self.dim)
+            store["2"] = create_random_game(self.dim)
+            self.assertEqual(await checkpoint(store, directory), 2)
+            self.assertEqual(len(load_snapshots(directory)), 3)
+
+        print("<<< test pass >>>\n\n\n")
+
+    @async_test
+    async def test_journal(self):
+
+        """ Test function: Journals, replay a journal on top of a snapshot """
+
+        print(f"<<< {self.test_journal.__name__} start >>>")
+
+        with tempfile.TemporaryDirectory() as directory:
+            game = create_random_game(self.dim, seed=7, robots_count=3, dinosaurs_count=20)
+            path = save_snapshot(game, directory)
+            journals = Journals(directory, group_size=8)
+            MOVE_HOOKS.append(journals.append)
+            try:
+                rng = np.random.default_rng(7)
+                for _ in range(200):
+                    robot_id = str(rng.choice(list(game.robots.keys())))
+                    try:
+                        await move_robot(game, robot_id, COMMANDS[rng.integers(5)])
+                    except Exception:
+                        pass
+            finally:
+                MOVE_HOOKS.remove(journals.append)
+            journals.flush()
+            records = list(read_journal(journals.path(str(game.game_id))))
+            self.assertEqual(len(records), game.get_number_of_moves())
+
+            # A torn last record is ignored
+            with open(journals.path(str(game.game_id)), "ab") as f:
+                f.write(b"\x01\x02\x03")
+
+            copy = load_snapshot(path)
+            self.assertEqual(journals.recover(copy), game.get_number_of_moves())
+            self.assertEqual(copy.get_number_of_moves(), game.get_number_of_moves())
+            self.assertEqual(copy.robots, game.robots)
+            self.assertEqual(sorted(copy.dinosaurs_position), sorted(game.dinosaurs_position))
+            self.assertTrue((copy.get_board() == game.get_board()).all())
+            # Recovering again replays nothing
+            self.assertEqual(journals.recover(copy), 0)
+
+            journals.reset(str(game.game_id))
+            self.assertEqual(journals.recover(load_snapshot(path)), 0)
+
+            # The writer thread writes full groups, a reset drops the records written before it only
+            journals.start(interval=0)
+            try:
+                game_id = str(game.game_id)
+                for move in range(1, 9):
+                    journals.append(game_id, MoveRecord(move, game_id, 2, 0, 0, 0))
+                journals.reset(game_id)
+                journals.append(game_id, MoveRecord(9, game_id, 2, 0, 0, 0))
+            finally:
+                journals.stop()
+            self.assertEqual([record.move for record in read_journal(journals.path(game_id))], [9])
+
+            # An evicted game loses its journal
+            store = GameStore(max_games=1)
+            store.on_evict = journals.reset
+            store[game_id] = game
+            store["other"] = Game(self.dim)
+            journals.flush()
+            self.assertFalse(os.path.exists(journals.path(game_id)))
+
+        print("<<< test pass >>>\n\n\n")
+
+    @async_test
+    async def test_history(self):
+
+        """ Test function: History, rebuild the boards from keyframes and records """
+
+        print(f"<<< {self.test_history.__name__} start >>>")
+
+        game = create_random_game(self.dim, seed=8, robots_count=3, dinosaurs_count=20)
+        game.keep_history = True
+        game.history.interval = 16
+        game.history.max_moves = 100
+        boards = {0: game.get_board().copy()}
+        rng = np.random.default_rng(8)
+        while game.get_number_of_moves() < 150:
+            robot_id = str(rng.choice(list(game.robots.keys())))
+            try:
+                await move_robot(game, robot_id, COMMANDS[rng.integers(5)])
+            except Exception:
+                continue
+            boards[game.get_number_of_moves()] = game.get_board().copy()
+
+        history = game.history
+        # Whole keyframe intervals are dropped beyond the limit
+        self.assertEqual(history.start, 64)
+        report = game.memory_report()
+        self.assertEqual(report["history_bytes"], history.nbytes)
+        self.assertGreater(report["recent_moves_bytes"], 0)
+        self.assertEqual(game.nbytes, game.get_board().nbytes + report["recent_moves_bytes"] + history.nbytes)
+        self.assertEqual(history.end, 150)
+        with self.assertRaises(ValueError):
+            history.state_at(63)
+        for move in (64, 70, 80, 100, 150):
+            board = history.board_at(move, (0, self.dim), (0, self.dim), np.int8, 1, -1)
+            self.assertTrue((board == boards[move]).all())
+        window = history.board_at(100, (2, 5), (3, 9), np.int8, 1, -1)
+        self.assertTrue((window == boards[100][2:5, 3:9]).all())
+        for move, frame in enumerate(history.frames(self.dim, np.int8, 1, -1), start=history.start):
+            self.assertTrue((frame == boards[move]).all())
+
+        # The number of keyframes is bounded too
+        history.max_keyframes = 2
+        await move_robot(game, next(iter(game.robots)), COMMANDS[2])
+        self.assertEqual(history.start, 128)
+        self.assertLess(history.nbytes, game.nbytes)
+
+        # The history is opt-in
+        self.assertIsNone(create_random_game(self.dim).history)
+
+        print("<<< test pass >>>\n\n\n")
+
+    @async_test
+    async def test_game_changes(self):
+
+        """ Test function: History.since, Game.recent_moves, game_changes """
+
+        print(f"<<< {self.test_game_changes.__name__} start >>>")
+
+        robots = [{"coordinate": (0, 0), "direction": "E"}, {"coordinate": (5, 5), "direction": "N"}]
+        game = create_game(self.dim, robots, [(0, 2), (4, 5)])
+        game.keep_history = True
+        first, second = game.robots
+        self.assertEqual(game.version, 0)
+        await move_robot(game, first, COMMANDS[0])
+        self.assertEqual(game.version, 1)
+        await move_robot(game, second, COMMANDS[4])
+        await move_robot(game, first, COMMANDS[2])
+
+        self.assertEqual(len(game.history.since(1)), 2)
+        self.assertEqual(game.history.since(3), [])
+        self.assertIsNone(game.history.since(4))
+        changes = game_changes(game, 1, 10)
+        self.assertEqual(changes["robots"], {
+            second: {"coordinate": (5, 5), "direction": "N"},
+            first: {"coordinate": (0, 1), "direction": "S"},
+        })
+        self.assertEqual(changes["killed"], [(4, 5)])
+        self.assertEqual(game_changes(game, 3, 10), {"robots": {}, "killed": []})
+        # Too many moves behind, the client reloads the game
+        self.assertIsNone(game_changes(game, 0, 2))
+
+        # Without history the recent moves describe the changes
+        game = create_game(self.dim, robots, [(0, 2), (4, 5)])
+        first, second = game.robots
+        self.assertIsNone(game.history)
+        await move_robot(game, first, COMMANDS[0])
+        await move_robot(game, second, COMMANDS[4])
+        self.assertEqual(game_changes(game, 0, 10)["robots"][first], {"coordinate": (0, 1), "direction": "E"})
+        self.assertEqual(game_changes(game, 1, 10)["killed"], [(4, 5)])
+        await run_tick(game, 2)
+        self.assertEqual([record.move for record in game.recent_moves(1)], [2, 3, 4])
+        self.assertIsNone(game.recent_moves(5))
+        # A move applied without a record, the recent moves no longer describe the game
+        await game.turn_robot_left(first)
+        self.assertIsNone(game_changes(game, 3, 10))
+        self.assertEqual(game_changes(game, 5, 10), {"robots": {}, "killed": []})
+        await move_robot(game, first, COMMANDS[2])
+        self.assertIsNone(game_changes(game, 4, 10))
+        self.assertEqual(len(game_changes(game, 5, 10)["robots"]), 1)
+
+        print("<<< test pass >>>\n\n\n")
+
+    @async_test
+    async def test_autopilot(self):
+
+        """ Test function: DistanceField, plan_command, run_autopilot """
+
+        print(f"<<< {self.test_autopilot.__name__} start >>>")
+
+        robots = [{"coordinate": (0, 0), "direction": "E"}]
+        dinosaurs = [(0, 4), (5, 0), (9, 9)]
+        game = create_game(self.dim, robots, dinosaurs)
+        field = distance_field(game)
+        self.assertEqual(field.at((0, 1)), 3)
+        self.assertEqual(field.at((0, 3)), 1)
+        self.assertEqual(field.at((9, 9)), 0)
+        self.assertEqual(plan_command(game, field, next(iter(game.robots))), COMMANDS[0])
+
+        # The field is kept with the game, only the cells next to the destroyed dinosaurs are searched again
+        game.entities.remove_dinosaur((0, 4))
+        game.entities.remove_dinosaur((5, 0))
+        self.assertIs(distance_field(game), field)
+        self.assertEqual(field.at((0, 0)), 18)
+        self.assertTrue((field.distance == DistanceField(self.dim, np.array([99])).distance).all())
+
+        # A robot in the way is stepped around, the robots of the wall move on too
+        robots = [{"coordinate": (0, 1), "direction": "E"}]
+        robots += [{"coordinate": (row, 2), "direction": "N"} for row in range(self.dim - 1)]
+        game = create_game(self.dim, robots, [(0, 4)])
+        field = distance_field(game)
+        self.assertEqual(field.at((0, 2)), 2)
+        self.assertEqual(plan_command(game, field, next(iter(game.robots))), COMMANDS[1])
+        await run_autopilot(game, rounds=100)
+        self.assertFalse(game.dinosaurs_position)
+
+        game = create_random_game(self.dim, seed=9, robots_count=3, dinosaurs_count=6)
+        result = await run_autopilot(game, rounds=500)
+        self.assertFalse(game.dinosaurs_position)
+        self.assertEqual(result["applied"], game.get_number_of_moves())
+        self.assertLess(result["rounds"], 500)
+
+        game = create_random_game(10 ** 4, robots_count=1, dinosaurs_count=1)
+        with self.assertRaises(Exception):
+            await run_autopilot(game)
+
+        print("<<< test pass >>>\n\n\n")
+
+    @async_test
+    async def test_tick(self):
+
+        """ Test function: Game.tick, run_tick """
+
+        print(f"<<< {self.test_tick.__name__} start >>>")
+
+        robots = [{"coordinate": (2, 2), "direction": "E"},
+                  {"coordinate": (2, 4), "direction": "W"},
+                  {"coordinate": (5, 5), "direction": "N"},
+                  {"coordinate": (7, 7), "direction": "S"},
+                  {"coordinate": (0, 9), "direction": "N"}]
+        dinosaurs = [(1, 5), (6, 4), (6, 7), (9, 9)]
+        game = create_game(self.dim, robots, dinosaurs)
+        game.keep_history = True
+        ids = list(game.robots)
+        history = game.history
+        before = game.get_board().copy()
+
+        # The first two robots claim the same cell, the fourth attacks, the last one leaves the grid
+        applied, records = game.tick([0, 0, 2, 4, 0], records=True)
+        self.assertEqual(applied.tolist(), [False, False, True, True, False])
+        self.assertEqual(game.get_number_of_moves(), 2)
+        self.assertEqual([record.robot_id for record in records], [ids[3], ids[2]])
+        self.assertEqual(records[0].kills, ((6, 7),))
+        self.assertEqual(sorted(game.dinosaurs_position), [(1, 5), (6, 4), (9, 9)])
+        self.assertEqual(game.robots[ids[2]].facing, "E")
+
+        applied = await run_tick(game, [1, 1, 0, 0, -1])
+        self.assertEqual(applied.tolist(), [True, True, True, True, False])
+        self.assertEqual(game.robots[ids[2]].coordinate, (5, 6))
+        self.assertEqual(game.robots[ids[3]].coordinate, (8, 7))
+        self.assertEqual(game.get_board()[5, 5], 0)
+        self.assertEqual(game.get_board()[5, 6], -1)
+
+        # The history replays the tick records one by one
+        self.assertTrue((history.board_at(0, (0, self.dim), (0, self.dim), np.int8, 1, -1) == before).all())
+        self.assertTrue((history.board_at(6, (0, self.dim), (0, self.dim), np.int8, 1, -1) == game.get_board()).all())
+
+        # Without a history nor a hook, no record is built
+        game.keep_history, game._history = False, None
+        applied, records = game.tick(2)
+        self.assertTrue(applied.all())
+        self.assertEqual(records, [])
+        # The recent moves are still kept
+        self.assertEqual([record.command for record in game.recent_moves(game.version - 5)], [2] * 5)
+
+        with self.assertRaises(Exception):
+            game.tick([0, 0])
+        with self.assertRaises(Exception):
+            game.tick(5)
+
+        # A target off the grid does not claim the cell its flat index aliases
+        game = create_game(self.dim, [{"coordinate": (2, 0), "direction": "W"},
+                                      {"coordinate": (1, 8), "direction": "E"}], [(5, 5)])
+        applied = await run_tick(game, 0)
+        self.assertEqual(applied.tolist(), [False, True])
+        self.assertEqual(game.robots[list(game.robots)[1]].coordinate, (1, 9))
+
+        print("<<< test pass >>>\n\n\n")
+
+    def test_simulation(self):
+
+        """ Test function: simulate_game, simulate, write_results """
+
+        print(f"<<< {self.test_simulation.__name__} start >>>")
+
+        result = simulate_game(self.dim, 3, 5, policy="greedy", seed=1)
+        self.assertTrue(result["completed"])
+        self.assertEqual(result["kills"], 5)
+        self.assertEqual(result["kill_rate"], 5 / result["moves"])
+        result = simulate_game(self.dim, 3, 5, policy="random", seed=1, max_ticks=10)
+        self.assertLessEqual(result["ticks"], 10)
+        with self.assertRaises(Exception):
+            simulate_game(self.dim, 3, 5, policy="unknown")
+
+        results = simulate(3, self.dim, 3, 5, seed=4, workers=2)
+        self.assertEqual([result["seed"] for result in results], [4, 5, 6])
+        self.assertEqual(results[0], {**simulate_game(self.dim, 3, 5, seed=4), "seconds": results[0]["seconds"]})
+        with tempfile.TemporaryDirectory() as directory:
+            path = f"{directory}/results.csv"
+            write_results(results, path)
+            with open(path) as f:
+                self.assertEqual(len(f.readlines()), 4)
+
+        print("<<< test pass >>>\n\n\n")
+
+    @async_test
+    async def test_metrics(self):
+
+        """ Test function: Counter, Histogram, the command timings """
+
+        print(f"<<< {self.test_metrics.__name__} start >>>")
+
+        histogram = Histogram("latency_seconds", "Latency", ("route",), buckets=(0.1, 1))
+        for value in (0.05, 0.1, 0.5, 3):
+            histogram.observe(value, "/games")
+        self.assertEqual(histogram.count("/games"), 4)
+        lines = histogram.render()
+        self.assertIn('latency_seconds_bucket{route="/games",le="0.1"} 2', lines)
+        self.assertIn('latency_seconds_bucket{route="/games",le="1"} 3', lines)
+        self.assertIn('latency_seconds_bucket{route="/games",le="+Inf"} 4', lines)
+        self.assertIn('latency_seconds_sum{route="/games"} 3.65', lines)
+
+        counter = Counter("errors_total", "Errors", ("type",))
+        counter.inc("KeyError")
+        counter.inc("KeyError", amount=2)
+        self.assertEqual(counter.value("KeyError"), 3)
+        self.assertIn('errors_total{type="KeyError"} 3', counter.render())
+
+        game = create_random_game(self.dim)
+        turns = COMMAND_SECONDS.count(COMMANDS[2])
+        await move_robot(game, next(iter(game.robots)), COMMANDS[2])
+        self.assertEqual(COMMAND_SECONDS.count(COMMANDS[2]), turns + 1)
+
+        print("<<< test pass >>>\n\n\n")
+
+    @async_test
+    async def test_stack_sampler(self):
+
+        """ Test class: StackSampler, the stacks of a thread and of an asyncio task """
+
+        print(f"<<< {self.test_stack_sampler.__name__} start >>>")
+
+        def blocked(event):
+            event.wait()
+
+        event = threading.Event()
+        thread = threading.Thread(target=blocked, args=(event,))
+        thread.start()
+        sampler = StackSampler(thread.ident)
+        sampler.sample()
+        event.set()
+        thread.join()
+        self.assertIn(f"threading:run;{__name__}:blocked;threading:wait", next(iter(sampler.stacks)))
+
+        # A task is sampled where it awaits, or where it runs, never another task of the loop
+        async def waiting(ready):
+            await ready.wait()
+
+        async def running():
+            sampler.sample()
+
+        ready = asyncio.Event()
+        task = asyncio.ensure_future(waiting(ready))
+        await asyncio.sleep(0)
+        sampler = StackSampler(threading.get_ident(), task=task)
+        sampler.sample()
+        ready.set()
+        await task
+        sampler.sample()
+        self.assertEqual(list(sampler.stacks), [f"{__name__}:waiting;asyncio.locks:wait"])
+
+        task = asyncio.ensure_future(running())
+        sampler = StackSampler(threading.get_ident(), task=task)
+        await task
+        self.assertEqual(list(sampler.stacks), [f"{__name__}:running;services.profiling:sample"])
+
+        print("<<< test pass >>>\n\n\n")
+
+    @async_test
+    async def test_game_channels(self):
+
+        """ Test function: GameChannels, Subscriber """
+
+        print(f"<<< {self.test_game_channels.__name__} start >>>")
+
+        channels = GameChannels(queue_size=2)
+        game = create_random_game(self.dim)
+        subscriber = channels.subscribe(str(game.game_id))
+        self.assertIn(channels.publish, MOVE_HOOKS)
+        robot_id = next(iter(game.robots))
+        for _ in range(3):
+            await move_robot(game, robot_id, COMMANDS[2])
+
+        # The oldest move is dropped, the gap comes first
+        self.assertEqual(len(subscriber), 2)
+        self.assertEqual(await subscriber.get(), {"dropped": 1})
+        self.assertEqual((await subscriber.get())["m"], 2)
+        self.assertEqual((await subscriber.get())["m"], 3)
+        with self.assertRaises(asyncio.TimeoutError):
+            await asyncio.wait_for(subscriber.get(), 0.01)
+
+        channels.unsubscribe(subscriber)
+        self.assertNotIn(channels.publish, MOVE_HOOKS)
+        self.assertEqual(len(channels), 0)
+
+        print("<<< test pass >>>\n\n\n")
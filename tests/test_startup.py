@@ -0,0 +1,42 @@
+import os
+import sys
+import json
+import subprocess
+from unittest.case import TestCase
+
+# The time budget to import the app, override it with the IMPORT_BUDGET_SECONDS variable on slow machines
+IMPORT_BUDGET_SECONDS = float(os.environ.get("IMPORT_BUDGET_SECONDS", 2.0))
+
+# Modules which must not be loaded when the app is imported
+DEFERRED_MODULES = ("pandas",)
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+class TestStartup(TestCase):
+
+    """ Cold start test """
+
+    def test_import_budget(self):
+
+        """ Test importing the app stays within the time budget and loads nothing heavy """
+
+        print(f"<<< {self.test_import_budget.__name__} start >>>")
+        code = (
+            "import sys, time, json\n"
+            "start = time.perf_counter()\n"
+            "import main\n"
+            "elapsed = time.perf_counter() - start\n"
+            "import services.logs\n"
+            "print(json.dumps({'elapsed': elapsed, 'modules': sorted(sys.modules),"
+            " 'logging_started': services.logs._listener is not None}))\n"
+        )
+        output = subprocess.check_output([sys.executable, "-c", code], cwd=ROOT)
+        result = json.loads(output.splitlines()[-1])
+
+        self.assertLess(result["elapsed"], IMPORT_BUDGET_SECONDS)
+        for module in DEFERRED_MODULES:
+            self.assertNotIn(module, result["modules"])
+        self.assertFalse(result["logging_started"])
+
+        print("<<< test pass >>>\n\n\n")